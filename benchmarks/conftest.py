@@ -0,0 +1,149 @@
+"""
+性能基准测试公共夹具
+
+运行：
+    pip install -r requirements-dev.txt
+    pytest benchmarks --benchmark-autosave
+
+数据集在整个测试会话中只生成一次（与 seed_scale_data 命令同一个生成器、同一个随机种子），
+LLM 与 Synology webhook 使用 loadtest 的本地桩服务（零延迟），计时只反映本地处理开销。
+每个基准同时断言 SQL 查询数预算，并把查询数和 tracemalloc 峰值内存记入 benchmark.extra_info。
+"""
+import tracemalloc
+
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+BENCH_USERS = 20
+BENCH_MESSAGES_PER_USER = 200
+BENCH_MEMORIES_PER_USER = 30
+BENCH_EMOTIONS_PER_USER = 50
+BENCH_TASKS_PER_USER = 10
+BENCH_SEED = 42
+BENCH_START_USER_ID = 700000000
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _stop_scheduler():
+    """应用启动时会拉起调度器，基准测试中由用例自行驱动任务执行"""
+    from core.scheduler import stop_scheduler
+    stop_scheduler()
+
+
+@pytest.fixture(scope='session')
+def django_db_setup(django_db_setup, django_db_blocker):
+    from core.services.seed_service import ScaleDataGenerator
+
+    with django_db_blocker.unblock():
+        generator = ScaleDataGenerator(
+            users=BENCH_USERS,
+            messages_per_user=BENCH_MESSAGES_PER_USER,
+            memories_per_user=BENCH_MEMORIES_PER_USER,
+            emotions_per_user=BENCH_EMOTIONS_PER_USER,
+            tasks_per_user=BENCH_TASKS_PER_USER,
+            seed=BENCH_SEED,
+            start_user_id=BENCH_START_USER_ID,
+        )
+        generator.load()
+        generator.rebuild_emotion_states()
+
+
+@pytest.fixture
+def seeded_users(db):
+    from core.models import ChatUser
+    return list(ChatUser.objects.filter(metadata__seed_scale_data=BENCH_SEED).order_by('id'))
+
+
+@pytest.fixture
+def seeded_user(seeded_users):
+    return seeded_users[0]
+
+
+@pytest.fixture
+def stub_backends():
+    """启动本地 LLM / webhook 桩服务并把配置指向它们"""
+    from core.services import ai_call_log_service, trace_service
+    from core.services.loadtest_service import LoadTestHarness, LogNormal, OpenAIStubServer, WebhookSinkServer
+
+    llm = OpenAIStubServer(LogNormal(0), LogNormal(40), memory_rate=0.2, seed=BENCH_SEED).start()
+    sink = WebhookSinkServer(LogNormal(0)).start()
+    with override_settings(
+        OPENAI_API_BASE=f'{llm.url}/v1',
+        OPENAI_API_KEY='benchmark',
+        WEBHOOK_URL=f'{sink.url}/webhook',
+        WEBHOOK_TOKEN='',
+        AI_CASSETTE_MODE='off',
+        # AI 调用记录和追踪 span 在生产中由调度器线程批量写入，不计入被测路径的查询数
+        AI_CALL_LOG_BATCH_SIZE=10 ** 6,
+        AI_CALL_LOG_FLUSH_SECONDS=10 ** 6,
+        TRACE_BATCH_SIZE=10 ** 6,
+        TRACE_FLUSH_SECONDS=10 ** 6,
+        TRACE_MAX_BUFFER=10 ** 6,
+    ):
+        LoadTestHarness._reset_singletons()
+        ai_call_log_service._ai_call_log_service_instance = None
+        trace_service._trace_service_instance = None
+        try:
+            yield llm, sink
+        finally:
+            LoadTestHarness._reset_singletons()
+            ai_call_log_service._ai_call_log_service_instance = None
+            trace_service._trace_service_instance = None
+            llm.stop()
+            sink.stop()
+
+
+class BudgetRunner:
+    """执行一次带查询计数和内存追踪的测量，断言预算后交给 pytest-benchmark 计时"""
+
+    def __init__(self, benchmark):
+        self.benchmark = benchmark
+
+    def measure(self, func, setup=None):
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as ctx:
+                result = func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return result, ctx.captured_queries, peak
+
+    def __call__(self, func, max_queries: int, max_peak_kib: float = None, setup=None, rounds: int = 20):
+        """
+        Args:
+            func: 被测函数（无参数）
+            max_queries: SQL 查询数上限
+            max_peak_kib: tracemalloc 峰值内存上限（KiB），None 表示只记录
+            setup: 每轮执行前调用（用于会消耗状态的被测函数，如执行回复任务）
+            rounds: 有 setup 时的计时轮数
+
+        Returns:
+            被测函数首次执行的返回值
+        """
+        result, queries, peak = self.measure(func, setup)
+
+        self.benchmark.extra_info['queries'] = len(queries)
+        self.benchmark.extra_info['peak_memory_kib'] = round(peak / 1024, 1)
+
+        assert len(queries) <= max_queries, (
+            f'SQL 查询数 {len(queries)} 超出预算 {max_queries}：\n'
+            + '\n'.join(q['sql'] for q in queries)
+        )
+        if max_peak_kib is not None:
+            assert peak / 1024 <= max_peak_kib, f'峰值内存 {peak / 1024:.1f} KiB 超出预算 {max_peak_kib} KiB'
+
+        if setup:
+            self.benchmark.pedantic(func, setup=setup, rounds=rounds)
+        else:
+            self.benchmark(func)
+        return result
+
+
+@pytest.fixture
+def budget(benchmark):
+    return BudgetRunner(benchmark)
@@ -0,0 +1,46 @@
+"""
+AIService 纯计算部分基准：_format_context / _extract_json（不应产生任何 SQL 查询）
+"""
+import json
+
+import pytest
+
+from core.services.ai_service import AIService
+from core.services.context_service import ContextService
+
+pytestmark = pytest.mark.django_db
+
+REPLY_JSON = json.dumps({'content': '好呀，晚上一起吃火锅吧', 'delay_minutes': 3}, ensure_ascii=False)
+
+EXTRACT_CASES = {
+    'plain': REPLY_JSON,
+    'fenced': f'好的，以下是结果：\n```json\n{REPLY_JSON}\n```',
+    'thinking': f'<think>{"用户想约晚饭，" * 200}</think>\n{REPLY_JSON}',
+    'python_dict': "{'content': '好呀', 'delay_minutes': 0}",
+    'embedded': f'根据上下文，我的回复是 {REPLY_JSON} 以上。',
+}
+
+
+@pytest.fixture
+def ai_service(stub_backends):
+    return AIService()
+
+
+@pytest.fixture
+def full_context(seeded_user):
+    service = ContextService()
+    context = service.get_user_message_context(seeded_user, seeded_user.nickname)
+    context['emotion'] = service.get_emotion_context(seeded_user)
+    return context
+
+
+def test_format_context(budget, ai_service, full_context):
+    text = budget(lambda: ai_service._format_context(full_context), max_queries=0, max_peak_kib=256)
+    assert '## 最近消息' in text
+
+
+@pytest.mark.parametrize('case', list(EXTRACT_CASES))
+def test_extract_json(budget, ai_service, case):
+    text = EXTRACT_CASES[case]
+    result = budget(lambda: ai_service._extract_json(text), max_queries=0, max_peak_kib=256)
+    assert 'content' in result
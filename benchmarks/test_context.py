@@ -0,0 +1,43 @@
+"""
+上下文构建基准：ContextService.get_user_message_context / get_emotion_context / get_message_merge_context
+"""
+import pytest
+
+from core.services.context_service import ContextService
+
+pytestmark = pytest.mark.django_db
+
+
+def test_user_message_context(budget, seeded_user):
+    service = ContextService()
+    context = budget(lambda: service.get_user_message_context(seeded_user, seeded_user.nickname), max_queries=10)
+    assert context['recent_messages']
+    assert context['memories']
+
+
+def test_emotion_context_from_state(budget, seeded_user):
+    service = ContextService()
+    context = budget(lambda: service.get_emotion_context(seeded_user), max_queries=1)
+    assert 'current_emotion' in context
+
+
+def test_emotion_context_rebuilds_missing_state(budget, seeded_user):
+    """没有物化情绪状态时现场重建"""
+    from core.models import EmotionState
+
+    def drop_state():
+        EmotionState.objects.filter(user=seeded_user).delete()
+
+    service = ContextService()
+    budget(lambda: service.get_emotion_context(seeded_user), max_queries=10, setup=drop_state)
+
+
+def test_emotion_context_long_window(budget, seeded_user):
+    """超出物化窗口时读取情绪汇总表（最新情绪、趋势、汇总检查点、汇总行、未汇总尾部）"""
+    service = ContextService()
+    budget(lambda: service.get_emotion_context(seeded_user, hours=24 * 7), max_queries=5)
+
+
+def test_message_merge_context(budget, seeded_user):
+    service = ContextService()
+    budget(lambda: service.get_message_merge_context(seeded_user), max_queries=3)
@@ -0,0 +1,74 @@
+"""
+消息链路基准：webhook 接入（handle_incoming_message + 回复决策 / 记忆检测 / 情绪分析）
+与回复任务的领取和发送（execute_pending_reply_tasks）
+
+回复任务的查询数预算按 "固定开销 + 每用户开销 × 用户数 + 每任务开销 × 任务数" 计算，
+出现 N+1 时查询数会超出线性预算而失败。
+"""
+from datetime import timedelta
+
+import pytest
+from django.test import Client
+from django.utils import timezone
+
+from core.scheduler import execute_pending_reply_tasks
+
+pytestmark = pytest.mark.django_db
+
+INGEST_MAX_QUERIES = 60
+
+# 领取：存在性检查 + 加锁查询 + 计数统计 + 批量改状态（含事务）
+DISPATCH_BASE_QUERIES = 8
+# 每用户：待回复计数更新、整合上下文（计划、情绪状态、提示词）、写发送记录和计数
+DISPATCH_PER_USER_QUERIES = 7
+# 每任务：标记完成（含 savepoint）
+DISPATCH_PER_TASK_QUERIES = 3
+
+
+def test_webhook_incoming(budget, stub_backends, seeded_user):
+    client = Client()
+
+    def ingest():
+        response = client.post('/api/webhook/incoming/', {
+            'user_id': seeded_user.user_id,
+            'username': seeded_user.username,
+            'text': '今天好累啊，晚饭吃什么好呢',
+        })
+        assert response.status_code == 200
+        return response
+
+    budget(ingest, max_queries=INGEST_MAX_QUERIES, rounds=10)
+
+
+@pytest.mark.parametrize('users,tasks_per_user', [(1, 1), (5, 1), (5, 3), (10, 2)])
+def test_execute_pending_reply_tasks(budget, stub_backends, seeded_users, users, tasks_per_user):
+    from core.models import ReplyTask
+
+    targets = seeded_users[:users]
+    _, sink = stub_backends
+
+    def create_due_tasks():
+        # 清掉种子数据里的待执行任务，只留本轮创建的到期任务
+        ReplyTask.objects.filter(status__in=['pending', 'executing']).update(status='cancelled')
+        now = timezone.now()
+        ReplyTask.objects.bulk_create([
+            ReplyTask(
+                user=user,
+                trigger_type='user',
+                content=f'第 {i + 1} 条回复',
+                scheduled_time=now - timedelta(seconds=i + 1),
+                status='pending',
+            )
+            for user in targets
+            for i in range(tasks_per_user)
+        ])
+
+    delivered_before = len(sink.received)
+    budget(
+        execute_pending_reply_tasks,
+        max_queries=(DISPATCH_BASE_QUERIES + DISPATCH_PER_USER_QUERIES * users
+                     + DISPATCH_PER_TASK_QUERIES * users * tasks_per_user),
+        setup=create_due_tasks,
+        rounds=5,
+    )
+    assert len(sink.received) - delivered_before >= users
@@ -1,7 +1,8 @@
+import json
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
-from django.db.models import Count
+from django.db.models import Count, Q
 from .models import (
     ChatUser,
     PromptLibrary,
@@ -9,7 +10,14 @@ from .models import (
     PlannedTask,
     ReplyTask,
     MessageRecord,
-    EmotionRecord
+    EmotionRecord,
+    EmotionState,
+    EmotionRollup,
+    RawPayload,
+    ConversationSummary,
+    JobCheckpoint,
+    AICallLog,
+    TraceSpan
 )
 
 
@@ -26,12 +34,108 @@ def truncate_text(text, max_length=50):
     return text
 
 
+def format_raw_payload(raw_payload):
+    """解压并格式化显示冷存储中的原始数据"""
+    if raw_payload is None:
+        return '-'
+    return format_html(
+        '<pre style="white-space: pre-wrap; max-width: 800px;">{}</pre>',
+        json.dumps(raw_payload.load(), ensure_ascii=False, indent=2)
+    )
+
+
+def format_duration(ms):
+    """毫秒数格式化为便于阅读的时长"""
+    if ms < 1000:
+        return f'{ms:.0f} ms'
+    if ms < 60000:
+        return f'{ms / 1000:.1f} s'
+    return f'{ms / 60000:.1f} min'
+
+
+def format_trace_timeline(trace_ids):
+    """按开始时间显示若干 trace 的全部 span：层级缩进、相对起点的偏移、耗时和甘特条"""
+    from .services.trace_service import get_trace_service
+
+    spans = get_trace_service().get_spans(trace_ids)
+    if not spans:
+        return '-'
+
+    depths = {}
+    for span in spans:
+        depths[span.span_id] = depths.get(span.parent_id, -1) + 1 if span.parent_id else 0
+
+    t0 = spans[0].started_at
+    total_ms = max(
+        (span.started_at - t0).total_seconds() * 1000 + span.duration_ms for span in spans
+    ) or 1
+
+    html_parts = ['<table style="width: 100%; border-collapse: collapse;">']
+    html_parts.append(
+        '<tr style="background: #f5f5f5;"><th style="padding: 4px 8px; text-align: left;">阶段</th>'
+        '<th style="padding: 4px 8px; text-align: right;">开始</th><th style="padding: 4px 8px; text-align: right;">耗时</th>'
+        '<th style="padding: 4px 8px; width: 40%;"></th><th style="padding: 4px 8px; text-align: left;">属性</th></tr>'
+    )
+    for span in spans:
+        offset_ms = (span.started_at - t0).total_seconds() * 1000
+        left = offset_ms / total_ms * 100
+        width = max(span.duration_ms / total_ms * 100, 0.3)
+        color = '#F44336' if span.attributes.get('error') else '#2196F3'
+        attributes = ', '.join(f'{k}={v}' for k, v in span.attributes.items() if v is not None)
+        html_parts.append(str(format_html(
+            '<tr><td style="padding: 4px 8px; padding-left: {}px;" title="{}">{}</td>'
+            '<td style="padding: 4px 8px; text-align: right;">+{}</td>'
+            '<td style="padding: 4px 8px; text-align: right;">{}</td>'
+            '<td style="padding: 4px 8px;"><div style="position: relative; height: 12px; background: #f0f0f0;">'
+            '<div style="position: absolute; left: {}%; width: {}%; height: 12px; background: {};"></div></div></td>'
+            '<td style="padding: 4px 8px; color: #666;">{}</td></tr>',
+            8 + depths[span.span_id] * 16, span.trace_id, span.name, format_duration(offset_ms),
+            format_duration(span.duration_ms), f'{min(left, 99.7):.2f}', f'{min(width, 100 - left):.2f}',
+            color, truncate_text(attributes, 120),
+        )))
+    html_parts.append('</table>')
+    return mark_safe(''.join(html_parts))
+
+
+def export_action(dataset, fmt, compress=False):
+    """
+    生成流式导出的管理后台动作（导出选中的记录；“全选”时导出当前筛选结果）
+
+    Args:
+        dataset: messages / memories / emotions
+        fmt: csv / jsonl
+        compress: 是否 gzip 压缩
+    """
+    def action(modeladmin, request, queryset):
+        from .services.export_service import get_export_service
+        return get_export_service().streaming_response(dataset, fmt, compress, queryset=queryset)
+
+    action.__name__ = f"export_{fmt}{'_gz' if compress else ''}"
+    label = f"{fmt.upper()}{'（gzip）' if compress else ''}"
+    return admin.action(description=f'导出选中的记录为 {label}')(action)
+
+
+class CountedDeleteMixin:
+    """删除记录（详情页删除和批量删除 delete_selected）时按用户扣减 ChatUser 的冗余计数器"""
+
+    counter_field = None
+    counter_filters = {}
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, type(obj).objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        ChatUser.delete_counted(queryset, self.counter_field, **self.counter_filters)
+
+
 @admin.register(ChatUser)
 class ChatUserAdmin(admin.ModelAdmin):
-    list_display = ('user_id', 'username', 'nickname', 'is_active', 'prompts_status', 'stats_display', 'created_at')
+    list_display = ('user_id', 'username', 'nickname', 'is_active', 'prompts_status', 'stats_display',
+                    'last_message_at', 'created_at')
     list_filter = ('is_active', 'created_at')
     search_fields = ('user_id', 'username', 'nickname')
-    readonly_fields = ('created_at', 'updated_at', 'stats_detail', 'prompts_detail')
+    readonly_fields = ('created_at', 'updated_at', 'stats_detail', 'prompts_detail',
+                       'message_count', 'memory_count', 'pending_reply_count', 'last_message_at', 'last_sent_at')
     list_editable = ('is_active', 'username', 'nickname')
     list_per_page = 20
 
@@ -44,7 +148,7 @@ class ChatUserAdmin(admin.ModelAdmin):
             'description': '使用下方"初始化默认提示词"操作为用户创建所有提示词'
         }),
         ('统计信息', {
-            'fields': ('stats_detail',),
+            'fields': ('stats_detail', 'last_message_at', 'last_sent_at'),
             'classes': ('collapse',)
         }),
         ('元数据', {
@@ -57,11 +161,20 @@ class ChatUserAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # 提示词统计在列表查询中一次聚合，其余统计读取冗余计数器
+        return super().get_queryset(request).annotate(
+            prompt_total=Count('prompts', distinct=True),
+            configured_prompt_categories=Count(
+                'prompts__category', filter=Q(prompts__is_active=True), distinct=True
+            ),
+        )
+
     def prompts_status(self, obj):
         """显示提示词配置状态"""
         from core.services.ai_service import DEFAULT_PROMPTS
         total_categories = len(DEFAULT_PROMPTS)
-        configured = obj.prompts.filter(is_active=True).values('category').distinct().count()
+        configured = obj.configured_prompt_categories
 
         if configured >= total_categories:
             return format_html('<span style="color: green;">✓ 已配置 ({}/{})</span>', configured, total_categories)
@@ -110,12 +223,9 @@ class ChatUserAdmin(admin.ModelAdmin):
 
     def stats_display(self, obj):
         """显示用户数据统计"""
-        prompts = obj.prompts.count()
-        memories = obj.memories.count()
-        messages = obj.messages.count()
         return format_html(
-            '<span title="提示词/记忆/消息">📝{} | 🧠{} | 💬{}</span>',
-            prompts, memories, messages
+            '<span title="提示词/记忆/消息/待回复">📝{} | 🧠{} | 💬{} | ⏳{}</span>',
+            obj.prompt_total, obj.memory_count, obj.message_count, obj.pending_reply_count
         )
     stats_display.short_description = '数据统计'
 
@@ -126,14 +236,14 @@ class ChatUserAdmin(admin.ModelAdmin):
             '提示词数量: <strong>{}</strong><br/>'
             '记忆数量: <strong>{}</strong><br/>'
             '计划任务数量: <strong>{}</strong><br/>'
-            '回复任务数量: <strong>{}</strong><br/>'
+            '待执行回复任务数量: <strong>{}</strong><br/>'
             '消息记录数量: <strong>{}</strong>'
             '</div>',
-            obj.prompts.count(),
-            obj.memories.count(),
+            obj.prompt_total,
+            obj.memory_count,
             obj.planned_tasks.count(),
-            obj.reply_tasks.count(),
-            obj.messages.count()
+            obj.pending_reply_count,
+            obj.message_count
         )
     stats_detail.short_description = '详细统计'
 
@@ -329,6 +439,8 @@ class PromptLibraryAdmin(admin.ModelAdmin):
         'autonomous_message': ['{date}', '{context}'],
         'hotspot_judge': ['{title}', '{content}'],
         'message_merge': ['{current_time}', '{messages}'],
+        'memory_consolidation': ['{memories}'],
+        'conversation_summary': ['{summary}', '{messages}'],
         'system': [],
         'template': [],
     }
@@ -605,11 +717,13 @@ class PromptLibraryAdmin(admin.ModelAdmin):
 
 
 @admin.register(MemoryLibrary)
-class MemoryLibraryAdmin(admin.ModelAdmin):
-    list_display = ('user', 'title', 'memory_type', 'strength_display', 'weight', 'forget_time', 'created_at')
+class MemoryLibraryAdmin(CountedDeleteMixin, admin.ModelAdmin):
+    counter_field = 'memory_count'
+
+    list_display = ('user', 'title', 'memory_type', 'strength_display', 'weight', 'retrieval_count', 'forget_time', 'created_at')
     list_filter = ('user', 'memory_type', 'strength', 'created_at')
     search_fields = ('title', 'content', 'user__username', 'user__nickname')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('retrieval_count', 'created_at', 'updated_at')
     list_editable = ('weight', 'memory_type', 'forget_time')
     list_per_page = 20
     date_hierarchy = 'created_at'
@@ -627,7 +741,7 @@ class MemoryLibraryAdmin(admin.ModelAdmin):
             'classes': ('wide',)
         }),
         ('记忆属性', {
-            'fields': ('strength', 'weight', 'forget_time'),
+            'fields': ('strength', 'weight', 'forget_time', 'retrieval_count'),
         }),
         ('元数据', {
             'fields': ('metadata',),
@@ -649,7 +763,12 @@ class MemoryLibraryAdmin(admin.ModelAdmin):
         )
     strength_display.short_description = '强度'
 
-    actions = ['strengthen_memories', 'clear_expired_memories']
+    actions = [
+        'strengthen_memories',
+        'clear_expired_memories',
+        export_action('memories', 'csv'),
+        export_action('memories', 'jsonl', compress=True),
+    ]
 
     @admin.action(description='强化选中的记忆 (+1)')
     def strengthen_memories(self, request, queryset):
@@ -660,7 +779,7 @@ class MemoryLibraryAdmin(admin.ModelAdmin):
     @admin.action(description='清除已过期的记忆')
     def clear_expired_memories(self, request, queryset):
         from django.utils import timezone
-        deleted = queryset.filter(forget_time__lt=timezone.now()).delete()[0]
+        deleted = ChatUser.delete_counted(queryset.filter(forget_time__lt=timezone.now()), 'memory_count')
         self.message_user(request, f'成功删除 {deleted} 条过期记忆')
 
 
@@ -725,11 +844,14 @@ class PlannedTaskAdmin(admin.ModelAdmin):
 
 
 @admin.register(ReplyTask)
-class ReplyTaskAdmin(admin.ModelAdmin):
+class ReplyTaskAdmin(CountedDeleteMixin, admin.ModelAdmin):
+    counter_field = 'pending_reply_count'
+    counter_filters = {'status': 'pending'}
+
     list_display = ('id', 'user', 'trigger_type', 'content_preview', 'scheduled_time', 'status_badge', 'status', 'retry_count')
     list_filter = ('user', 'trigger_type', 'status', 'scheduled_time')
     search_fields = ('content', 'user__username', 'user__nickname')
-    readonly_fields = ('created_at', 'updated_at', 'executed_at', 'retry_count')
+    readonly_fields = ('created_at', 'updated_at', 'executed_at', 'retry_count', 'raw_payload_display')
     list_editable = ('status', 'trigger_type', 'scheduled_time')
     list_per_page = 20
     date_hierarchy = 'scheduled_time'
@@ -754,7 +876,7 @@ class ReplyTaskAdmin(admin.ModelAdmin):
             'fields': ('scheduled_time', 'retry_count', 'error_message'),
         }),
         ('元数据', {
-            'fields': ('metadata',),
+            'fields': ('metadata', 'raw_payload_display'),
             'classes': ('collapse',)
         }),
         ('时间信息', {
@@ -767,6 +889,20 @@ class ReplyTaskAdmin(admin.ModelAdmin):
         return truncate_text(obj.content, 60)
     content_preview.short_description = '回复内容'
 
+    def raw_payload_display(self, obj):
+        return format_raw_payload(obj.raw_payload)
+    raw_payload_display.short_description = '触发消息原始数据'
+
+    def save_model(self, request, obj, form, change):
+        """编辑状态时同步用户的待回复任务计数（新建由 post_save 信号计数）"""
+        super().save_model(request, obj, form, change)
+        if change and 'status' in form.changed_data:
+            previous = form.initial.get('status')
+            ChatUser.update_counters(
+                obj.user_id,
+                pending_reply_count=(obj.status == 'pending') - (previous == 'pending')
+            )
+
     def status_badge(self, obj):
         colors = {
             'pending': '#2196F3',
@@ -787,21 +923,23 @@ class ReplyTaskAdmin(admin.ModelAdmin):
 
     @admin.action(description='重试失败的任务')
     def retry_failed_tasks(self, request, queryset):
-        updated = queryset.filter(status='failed').update(status='pending', retry_count=0)
+        updated = ReplyTask.update_status(queryset.filter(status='failed'), 'pending', retry_count=0)
         self.message_user(request, f'已重置 {updated} 个失败任务')
 
     @admin.action(description='取消待执行的任务')
     def cancel_pending_tasks(self, request, queryset):
-        updated = queryset.filter(status='pending').update(status='cancelled')
+        updated = ReplyTask.update_status(queryset.filter(status='pending'), 'cancelled')
         self.message_user(request, f'已取消 {updated} 个任务')
 
 
 @admin.register(MessageRecord)
-class MessageRecordAdmin(admin.ModelAdmin):
+class MessageRecordAdmin(CountedDeleteMixin, admin.ModelAdmin):
+    counter_field = 'message_count'
+
     list_display = ('id', 'user', 'message_type_badge', 'sender', 'receiver', 'content_preview', 'timestamp')
     list_filter = ('user', 'message_type', 'timestamp', 'sender')
     search_fields = ('content', 'sender', 'receiver', 'user__username', 'user__nickname')
-    readonly_fields = ('created_at', 'reply_task')
+    readonly_fields = ('created_at', 'reply_task', 'raw_payload_display', 'trace_timeline')
     list_per_page = 30
     date_hierarchy = 'timestamp'
     raw_id_fields = ('user',)
@@ -822,9 +960,12 @@ class MessageRecordAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('原始数据', {
-            'fields': ('raw_data', 'metadata'),
+            'fields': ('raw_data', 'raw_payload_display', 'metadata'),
             'classes': ('collapse',)
         }),
+        ('处理时间线', {
+            'fields': ('trace_timeline',),
+        }),
         ('时间信息', {
             'fields': ('created_at',),
             'classes': ('collapse',)
@@ -835,6 +976,15 @@ class MessageRecordAdmin(admin.ModelAdmin):
         return truncate_text(obj.content, 80)
     content_preview.short_description = '消息内容'
 
+    def trace_timeline(self, obj):
+        metadata = obj.metadata or {}
+        return format_trace_timeline(metadata.get('trace_ids') or [metadata.get('trace_id')])
+    trace_timeline.short_description = '各阶段耗时'
+
+    def raw_payload_display(self, obj):
+        return format_raw_payload(obj.raw_payload)
+    raw_payload_display.short_description = '原始请求'
+
     def message_type_badge(self, obj):
         colors = {
             'received': '#2196F3',
@@ -853,12 +1003,10 @@ class MessageRecordAdmin(admin.ModelAdmin):
         )
     message_type_badge.short_description = '类型'
 
-    actions = ['export_messages']
-
-    @admin.action(description='导出选中的消息')
-    def export_messages(self, request, queryset):
-        # 简单提示，实际可以实现 CSV 导出
-        self.message_user(request, f'选中了 {queryset.count()} 条消息')
+    actions = [
+        export_action('messages', 'csv'),
+        export_action('messages', 'jsonl', compress=True),
+    ]
 
 
 @admin.register(EmotionRecord)
@@ -941,7 +1089,11 @@ class EmotionRecordAdmin(admin.ModelAdmin):
         return truncate_text(obj.trigger_content, 50) if obj.trigger_content else '-'
     trigger_content_preview.short_description = '触发内容'
 
-    actions = ['clear_old_emotions']
+    actions = [
+        'clear_old_emotions',
+        export_action('emotions', 'csv'),
+        export_action('emotions', 'jsonl', compress=True),
+    ]
 
     @admin.action(description='清除7天前的情绪记录')
     def clear_old_emotions(self, request, queryset):
@@ -950,3 +1102,229 @@ class EmotionRecordAdmin(admin.ModelAdmin):
         cutoff = timezone.now() - timedelta(days=7)
         deleted = EmotionRecord.objects.filter(created_at__lt=cutoff).delete()[0]
         self.message_user(request, f'成功删除 {deleted} 条旧情绪记录')
+
+
+@admin.register(EmotionState)
+class EmotionStateAdmin(admin.ModelAdmin):
+    list_display = ('user', 'emotion_type', 'intensity', 'trigger_source', 'emotion_at', 'updated_at')
+    list_filter = ('emotion_type',)
+    search_fields = ('user__user_id', 'user__username', 'user__nickname')
+    readonly_fields = ('recent', 'window_buckets', 'updated_at')
+    raw_id_fields = ('user',)
+
+    actions = ['rebuild_states']
+
+    @admin.action(description='根据情绪记录重建选中的状态')
+    def rebuild_states(self, request, queryset):
+        for state in queryset.select_related('user'):
+            EmotionState.rebuild(state.user)
+        self.message_user(request, f'成功重建 {queryset.count()} 个情绪状态')
+
+
+@admin.register(EmotionRollup)
+class EmotionRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'period', 'bucket_start', 'count', 'avg_intensity', 'dominant_emotion', 'updated_at')
+    list_filter = ('period', 'dominant_emotion')
+    search_fields = ('user__user_id', 'user__username', 'user__nickname')
+    date_hierarchy = 'bucket_start'
+    readonly_fields = ('count', 'intensity_sum', 'avg_intensity', 'dominant_emotion', 'emotion_counts', 'updated_at')
+    raw_id_fields = ('user',)
+
+
+@admin.register(RawPayload)
+class RawPayloadAdmin(admin.ModelAdmin):
+    list_display = ('id', 'digest', 'size', 'created_at')
+    search_fields = ('digest',)
+    exclude = ('data',)
+    readonly_fields = ('digest', 'size', 'payload_display', 'created_at')
+
+    def payload_display(self, obj):
+        return format_raw_payload(obj)
+    payload_display.short_description = '原始数据'
+
+
+@admin.register(ConversationSummary)
+class ConversationSummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'summary_preview', 'summarized_count', 'last_message_id', 'updated_at')
+    search_fields = ('summary', 'user__username', 'user__nickname')
+    readonly_fields = ('last_message_id', 'summarized_count', 'created_at', 'updated_at')
+    raw_id_fields = ('user',)
+
+    def summary_preview(self, obj):
+        return truncate_text(obj.summary, 80)
+    summary_preview.short_description = '摘要内容'
+
+
+@admin.register(JobCheckpoint)
+class JobCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('name', 'state', 'updated_at')
+    search_fields = ('name',)
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(AICallLog)
+class AICallLogAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'caller', 'user', 'model', 'prompt_tokens', 'cached_tokens',
+                    'completion_tokens', 'latency_ms', 'status_badge')
+    list_filter = ('caller', 'model', 'parse_failed', 'created_at')
+    search_fields = ('caller', 'error', 'user__user_id', 'user__username', 'user__nickname')
+    date_hierarchy = 'created_at'
+    raw_id_fields = ('user',)
+    list_per_page = 50
+    change_list_template = 'admin/core/aicalllog/change_list.html'
+
+    # 列表页汇总表的列：(字段, 表头)
+    SUMMARY_COLUMNS = (
+        ('calls', '调用'),
+        ('errors', '失败'),
+        ('parse_failures', '解析失败'),
+        ('prompt_tokens', '输入 token'),
+        ('cached_tokens', '缓存 token'),
+        ('completion_tokens', '输出 token'),
+        ('avg_latency_ms', '平均 ms'),
+        ('p50_latency_ms', 'p50 ms'),
+        ('p95_latency_ms', 'p95 ms'),
+        ('max_latency_ms', '最长 ms'),
+        ('cost', '费用'),
+    )
+
+    def status_badge(self, obj):
+        if obj.error:
+            return format_html('<span style="color: red;" title="{}">✗ 失败</span>', obj.error)
+        if obj.parse_failed:
+            return format_html('<span style="color: orange;">⚠ 解析失败</span>')
+        return format_html('<span style="color: green;">✓</span>')
+    status_badge.short_description = '状态'
+
+    def changelist_view(self, request, extra_context=None):
+        """在列表上方显示当前筛选结果按调用方、按用户/天的汇总"""
+        response = super().changelist_view(request, extra_context)
+        if not hasattr(response, 'context_data'):
+            return response
+
+        from core.services.ai_call_log_service import get_ai_call_log_service
+
+        queryset = response.context_data['cl'].queryset
+        service = get_ai_call_log_service()
+        response.context_data['ai_call_summary'] = mark_safe(
+            self._summary_table('按调用方', ('caller',), service.summarize(queryset, group_by='caller'))
+            + self._summary_table('按用户 / 天', ('day', 'user__user_id'),
+                                  service.summarize(queryset, group_by='user_day', limit=30))
+        )
+        return response
+
+    def _summary_table(self, title, keys, rows):
+        cell = 'padding: 4px 8px; text-align: right;'
+        headers = [{'caller': '调用方', 'day': '日期', 'user__user_id': '用户'}[k] for k in keys]
+        headers += [label for _, label in self.SUMMARY_COLUMNS]
+
+        html_parts = [f'<h2>{title}</h2>', '<table style="margin-bottom: 20px; border-collapse: collapse;">']
+        html_parts.append('<tr style="background: #f5f5f5;">' + ''.join(
+            f'<th style="{cell}">{header}</th>' for header in headers
+        ) + '</tr>')
+        for row in rows:
+            values = [row[k] if row[k] is not None else '-' for k in keys]
+            values += ['-' if row[field] is None else row[field] for field, _ in self.SUMMARY_COLUMNS]
+            html_parts.append(str(format_html(
+                '<tr>' + ''.join(f'<td style="{cell}">{{}}</td>' for _ in values) + '</tr>', *values
+            )))
+        if not rows:
+            html_parts.append(f'<tr><td colspan="{len(headers)}" style="padding: 4px 8px;">暂无数据</td></tr>')
+        html_parts.append('</table>')
+        return ''.join(html_parts)
+
+
+@admin.register(TraceSpan)
+class TraceSpanAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'trace_link', 'name', 'duration_display', 'attributes_preview')
+    list_filter = ('name', 'started_at')
+    search_fields = ('trace_id',)
+    date_hierarchy = 'started_at'
+    readonly_fields = ('trace_id', 'span_id', 'parent_id', 'name', 'started_at', 'duration_ms', 'attributes',
+                       'timeline')
+    list_per_page = 50
+    change_list_template = 'admin/core/tracespan/change_list.html'
+
+    def trace_link(self, obj):
+        return format_html('<a href="?trace_id={}">{}</a>', obj.trace_id, obj.trace_id[:12])
+    trace_link.short_description = 'Trace'
+
+    def duration_display(self, obj):
+        return format_duration(obj.duration_ms)
+    duration_display.short_description = '耗时'
+    duration_display.admin_order_field = 'duration_ms'
+
+    def attributes_preview(self, obj):
+        return truncate_text(', '.join(f'{k}={v}' for k, v in obj.attributes.items()), 80)
+    attributes_preview.short_description = '属性'
+
+    def timeline(self, obj):
+        return format_trace_timeline([obj.trace_id])
+    timeline.short_description = '整条 trace 时间线'
+
+    # ==================== 性能剖析 ====================
+
+    def get_urls(self):
+        from django.urls import path
+
+        return [
+            path('profiling/', self.admin_site.admin_view(self.profiling_view), name='core_profiling'),
+            path('profiling/<str:name>/', self.admin_site.admin_view(self.profiling_download_view),
+                 name='core_profiling_download'),
+        ] + super().get_urls()
+
+    def profiling_view(self, request):
+        """性能剖析：临时开启 / 关闭剖析，下载最新的剖析文件"""
+        from datetime import datetime
+        from django.conf import settings
+        from django.contrib import messages
+        from django.core.exceptions import PermissionDenied
+        from django.shortcuts import redirect
+        from django.template.response import TemplateResponse
+        from django.utils import timezone
+        from core import profiling
+
+        if request.method == 'POST':
+            if not request.user.is_superuser:
+                raise PermissionDenied
+            if request.POST.get('action') == 'disable':
+                profiling.disable()
+                messages.success(request, '已关闭临时剖析')
+            else:
+                try:
+                    minutes = int(request.POST.get('minutes', 10))
+                    sample_rate = float(request.POST.get('sample_rate', 1.0))
+                except ValueError:
+                    messages.error(request, '时长和比例必须是数字')
+                    return redirect('admin:core_profiling')
+                minutes = max(1, min(minutes, 24 * 60))
+                sample_rate = max(0.0, min(sample_rate, 1.0))
+                profiling.enable(minutes, sample_rate)
+                messages.success(request, f'已开启剖析 {minutes} 分钟，比例 {sample_rate:g}')
+            return redirect('admin:core_profiling')
+
+        state = profiling.get_runtime_state()
+        until = state.get('until')
+        until = datetime.fromisoformat(until) if until else None
+        context = {
+            **self.admin_site.each_context(request),
+            'title': '性能剖析',
+            'opts': self.model._meta,
+            'runtime_until': until if until and until > timezone.now() else None,
+            'runtime_sample_rate': state.get('sample_rate'),
+            'env_enabled': getattr(settings, 'PROFILING_ENABLED', False),
+            'env_sample_rate': getattr(settings, 'PROFILING_SAMPLE_RATE', 0.1),
+            'mode': getattr(settings, 'PROFILING_MODE', 'sampling'),
+            'profiles_dir': getattr(settings, 'PROFILING_DIR', ''),
+            'profiles': profiling.list_profiles(),
+        }
+        return TemplateResponse(request, 'admin/core/profiling.html', context)
+
+    def profiling_download_view(self, request, name):
+        from django.http import FileResponse, Http404
+        from core import profiling
+
+        path = profiling.get_profile_path(name)
+        if path is None:
+            raise Http404('剖析文件不存在')
+        return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
@@ -35,9 +35,12 @@ class CoreConfig(AppConfig):
         """判断是否应该启动调度器"""
         import sys
 
-        # 管理命令不启动调度器
+        # 管理命令不启动调度器（压测命令自行驱动回复任务执行）
         if 'manage.py' in sys.argv[0] and any(
-            cmd in sys.argv for cmd in ['migrate', 'makemigrations', 'createsuperuser', 'collectstatic', 'check']
+            cmd in sys.argv for cmd in [
+                'migrate', 'makemigrations', 'createsuperuser', 'collectstatic', 'check',
+                'loadtest', 'replay_traffic', 'seed_scale_data', 'simulate_day',
+            ]
         ):
             return False
 
@@ -0,0 +1,93 @@
+# 缓冲批量写入
+# AI 调用记录、追踪 span 等高频、允许少量延迟的记录先放入内存缓冲，请求线程不等待数据库：
+# 缓冲达到 batch_size 条或距上次写入超过 flush_seconds 秒时，通过 run_in_background 提交后台批量写入；
+# 调度器另有定时任务 flush_buffered_writes 写入各缓冲中剩余的记录，停止调度器时也会写入一次。
+# 写入跟不上、缓冲达到 max_buffer 条时丢弃新记录（只记警告日志），不让内存无限增长。
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# 按名称登记的缓冲（服务单例重建时新缓冲替换旧的）
+_writers: Dict[str, 'BufferedBulkWriter'] = {}
+_writers_lock = threading.Lock()
+
+
+class BufferedBulkWriter:
+    """模型实例的内存缓冲，批量 bulk_create 写入"""
+
+    def __init__(self, name: str, label: str, batch_size: int, flush_seconds: float, max_buffer: int):
+        """
+        Args:
+            name: 缓冲名（后台写入任务 ID 的前缀）
+            label: 日志中的记录名称，如「AI 调用记录」
+            batch_size: 缓冲达到此条数时提交后台写入
+            flush_seconds: 距上次写入超过此秒数时提交后台写入
+            max_buffer: 缓冲上限，超出时丢弃新记录
+        """
+        self.name = name
+        self.label = label
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.dropped = 0
+
+        with _writers_lock:
+            _writers[name] = self
+
+    def add(self, instance):
+        """放入一个未保存的模型实例（不访问数据库）"""
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    logger.warning(f"{self.label}：缓冲已满（{self.max_buffer} 条），已丢弃 {self.dropped} 条")
+                return
+            self._buffer.append(instance)
+            due = len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_seconds
+
+        if due:
+            from core.scheduler import flush_buffered_writes, run_in_background
+            run_in_background(flush_buffered_writes, f'{self.name}_flush_now', self.name)
+
+    def flush(self) -> int:
+        """
+        批量写入缓冲中的记录
+
+        Returns:
+            int: 写入的条数
+        """
+        with self._lock:
+            entries, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+
+        if not entries:
+            return 0
+
+        try:
+            # 独立的 savepoint：同步写入（调度器未运行）时写入失败不影响调用方的事务
+            with transaction.atomic():
+                type(entries[0]).objects.bulk_create(entries, batch_size=500)
+        except Exception as e:
+            logger.error(f"写入{self.label}失败（{len(entries)} 条）: {e}")
+            return 0
+        return len(entries)
+
+
+def flush(name: Optional[str] = None) -> int:
+    """
+    写入指定缓冲（默认全部缓冲）中的记录
+
+    Returns:
+        int: 写入的条数
+    """
+    with _writers_lock:
+        writers = [_writers[name]] if name in _writers else [] if name else list(_writers.values())
+    return sum(writer.flush() for writer in writers)
@@ -0,0 +1,96 @@
+# 时钟
+# 调度器、上下文服务、AI 服务和模型统一通过本模块取当前时间，而不是直接调用 datetime.now() / timezone.now()，
+# 以便模拟运行时（simulate_day 命令）注入虚拟时钟，在几秒内推进一整天。
+#
+# now() 返回带时区的当前时间，对应 timezone.now()；
+# local_now() 返回 TIME_ZONE 时区下的不带时区的当前时间，对应部署环境（TZ 与 TIME_ZONE 一致）中的 datetime.now()。
+import threading
+from datetime import datetime, time, timedelta
+from typing import Optional
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+class SystemClock:
+    """系统时钟（默认）"""
+
+    def now(self) -> datetime:
+        return timezone.now()
+
+
+class SimulatedClock:
+    """虚拟时钟：时间只在调用 advance / set 时前进，可在多个线程间共享"""
+
+    def __init__(self, start: datetime):
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        self._now = start
+        self._lock = threading.Lock()
+
+    def now(self) -> datetime:
+        with self._lock:
+            return self._now
+
+    def set(self, value: datetime):
+        """跳到指定时间（不允许倒退）"""
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        with self._lock:
+            if value < self._now:
+                raise ValueError(f'虚拟时钟不能倒退：{value} < {self._now}')
+            self._now = value
+
+    def advance(self, delta: timedelta):
+        """前进指定时长"""
+        self.set(self.now() + delta)
+
+
+_clock = SystemClock()
+
+
+def get_clock():
+    """获取当前使用的时钟"""
+    return _clock
+
+
+def set_clock(clock):
+    """
+    替换当前使用的时钟
+
+    Args:
+        clock: 提供 now() 方法（返回带时区时间）的时钟对象，None 表示恢复系统时钟
+    """
+    global _clock
+    _clock = clock or SystemClock()
+
+
+def now() -> datetime:
+    """带时区的当前时间"""
+    return _clock.now()
+
+
+def local_now() -> datetime:
+    """TIME_ZONE 时区下不带时区的当前时间"""
+    return timezone.localtime(_clock.now()).replace(tzinfo=None)
+
+
+def parse_time(value: str) -> Optional[datetime]:
+    """
+    解析 ISO 8601 格式的时间（也接受日期，取当天零点），不带时区时按当前时区处理
+
+    Returns:
+        带时区的时间，格式无效时返回 None
+    """
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            parsed_date = parse_date(value)
+            if parsed_date is not None:
+                parsed = datetime.combine(parsed_date, time.min)
+    except ValueError:
+        return None
+
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
@@ -1 +1,12 @@
 # Management commands package
+from django.core.management.base import CommandError
+
+from core import clock
+
+
+def parse_time_arg(value):
+    """解析命令行中的时间参数（ISO 8601 时间或日期），不带时区时按当前时区处理"""
+    parsed = clock.parse_time(value)
+    if parsed is None:
+        raise CommandError(f'时间格式无效: {value}（应为 ISO 8601 时间或日期，如 2025-01-01）')
+    return parsed
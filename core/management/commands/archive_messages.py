@@ -0,0 +1,86 @@
+"""
+消息记录归档命令
+将超出保留期的 message_record 月分区导出为 gzip 压缩的 JSONL，然后从分区表摘除
+"""
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = '归档消息记录：导出并摘除超出保留期的月分区（仅 PostgreSQL 分区表）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months',
+            type=int,
+            default=getattr(settings, 'MESSAGE_ARCHIVE_KEEP_MONTHS', 6),
+            help='保留最近几个月的分区（不含当前月），默认读取 MESSAGE_ARCHIVE_KEEP_MONTHS',
+        )
+        parser.add_argument(
+            '--output-dir',
+            type=str,
+            default=getattr(settings, 'MESSAGE_ARCHIVE_DIR', str(settings.BASE_DIR / 'archive')),
+            help='导出目录，默认读取 MESSAGE_ARCHIVE_DIR',
+        )
+        parser.add_argument(
+            '--keep-table',
+            action='store_true',
+            help='只摘除分区，不删除分区表（可再挂载回父表；挂载回去之前该月的消息无法写入）',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='只列出将被归档的分区',
+        )
+
+    def handle(self, *args, **options):
+        from core.services.partition_service import get_partition_service
+
+        partition_service = get_partition_service()
+        if not partition_service.is_partitioned():
+            raise CommandError('message_record 不是分区表（需要 PostgreSQL 并执行迁移 0009_partition_message_record）')
+
+        keep_months = options['keep_months']
+        if keep_months < 0:
+            raise CommandError('--keep-months 不能为负数')
+
+        output_dir = Path(options['output_dir'])
+        expired = partition_service.get_expired_partitions(keep_months)
+
+        if not expired:
+            self.stdout.write(self.style.SUCCESS(f'没有超出保留期（{keep_months} 个月）的分区'))
+            return
+
+        self.stdout.write(f'将归档 {len(expired)} 个分区到 {output_dir}：')
+        for partition in expired:
+            self.stdout.write(f"  - {partition['name']} ({partition['start']:%Y-%m})")
+
+        if options['dry_run']:
+            return
+
+        total = 0
+        for partition in expired:
+            try:
+                exported = partition_service.archive_partition(
+                    partition['name'],
+                    output_dir,
+                    drop=not options['keep_table']
+                )
+            except Exception as e:
+                raise CommandError(f"归档分区 {partition['name']} 失败: {e}")
+
+            total += exported
+            self.stdout.write(f"  已归档 {partition['name']}: {exported} 条")
+
+        # 摘除分区后消息数等冗余计数器需要按剩余数据重新计算
+        from core.models import ChatUser
+        drifted = ChatUser.reconcile_counters()
+        self.stdout.write(f'已校正 {len(drifted)} 个用户的消息计数')
+
+        if not options['keep_table']:
+            from core.models import RawPayload
+            deleted = RawPayload.delete_unreferenced()
+            self.stdout.write(f'已删除 {deleted} 条不再被引用的原始数据')
+
+        self.stdout.write(self.style.SUCCESS(f'\n归档完成，共导出 {total} 条消息记录'))
@@ -0,0 +1,91 @@
+"""
+数据导出命令
+将消息记录、记忆或情绪记录流式导出为 CSV / JSONL（可选 gzip 压缩），可按用户和时间范围过滤
+"""
+import sys
+from pathlib import Path
+from django.core.management.base import BaseCommand
+
+from core.management import parse_time_arg
+
+
+class Command(BaseCommand):
+    help = '流式导出消息记录 / 记忆 / 情绪记录为 CSV 或 JSONL（可选 gzip 压缩）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'dataset',
+            choices=['messages', 'memories', 'emotions'],
+            help='导出的数据集',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            default='csv',
+            help='导出格式，默认 csv',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='gzip 压缩输出',
+        )
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='users',
+            help='只导出指定用户（通过 user_id，可重复指定）',
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='起始时间（含），如 2025-01-01 或 2025-01-01T08:00:00+08:00',
+        )
+        parser.add_argument(
+            '--until',
+            type=str,
+            help='结束时间（不含）',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='输出文件路径，"-" 表示标准输出；默认在当前目录按数据集和时间生成文件名',
+        )
+
+    def handle(self, *args, **options):
+        from core.services.export_service import get_export_service
+
+        export_service = get_export_service()
+        dataset = options['dataset']
+        fmt = options['format']
+        compress = options['gzip']
+
+        since = parse_time_arg(options['since']) if options.get('since') else None
+        until = parse_time_arg(options['until']) if options.get('until') else None
+
+        chunks = export_service.export(
+            dataset, fmt, compress,
+            user_ids=options.get('users'),
+            since=since,
+            until=until,
+        )
+
+        output = options.get('output') or export_service.get_filename(dataset, fmt, compress)
+
+        if output == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        output_path = Path(output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output_path.with_name(output_path.name + '.tmp')
+
+        written = 0
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+
+        tmp_path.replace(output_path)
+        self.stdout.write(self.style.SUCCESS(f'已导出到 {output_path}（{written} 字节）'))
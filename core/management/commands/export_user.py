@@ -0,0 +1,53 @@
+"""
+用户数据导出命令
+将单个用户的提示词、记忆、计划任务、回复任务、消息记录、情绪记录导出为归档文件（用 import_user 导入）
+"""
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = '导出单个用户的全部数据为归档文件（PostgreSQL 上使用 COPY）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'user_id',
+            type=str,
+            help='要导出的用户（user_id）',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='归档文件路径，默认 user_<user_id>_<时间>.zip',
+        )
+
+    def handle(self, *args, **options):
+        from core.models import ChatUser
+        from core.services.user_transfer_service import get_user_transfer_service
+
+        try:
+            user = ChatUser.objects.get(user_id=options['user_id'])
+        except ChatUser.DoesNotExist:
+            raise CommandError(f"用户 {options['user_id']} 不存在")
+
+        output = Path(options.get('output') or f"user_{user.user_id}_{timezone.localtime():%Y%m%d_%H%M%S}.zip")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output.with_name(output.name + '.tmp')
+
+        def progress(table, rows):
+            self.stdout.write(f'  {table}: {rows} 行')
+
+        self.stdout.write(f'导出用户 "{user}" ({user.user_id}) 到 {output}：')
+        started = time.monotonic()
+        try:
+            get_user_transfer_service().export_user(user, tmp_path, progress=progress)
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        tmp_path.replace(output)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n导出完成，用时 {time.monotonic() - started:.1f} 秒，文件大小 {output.stat().st_size} 字节'
+        ))
@@ -0,0 +1,55 @@
+"""
+用户数据导入命令
+导入 export_user 生成的归档：所有记录分配新 ID 并改写相互引用，在一个事务中完成
+"""
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = '导入 export_user 生成的用户归档（PostgreSQL 上使用 COPY）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'archive',
+            type=str,
+            help='归档文件路径',
+        )
+        parser.add_argument(
+            '--user-id',
+            type=str,
+            help='以指定的 user_id 导入（默认使用归档中的 user_id，已存在时报错）',
+        )
+
+    def handle(self, *args, **options):
+        from core.services.user_transfer_service import get_user_transfer_service
+
+        archive = Path(options['archive'])
+        if not archive.exists():
+            raise CommandError(f'归档文件不存在: {archive}')
+
+        transfer_service = get_user_transfer_service()
+
+        try:
+            manifest = transfer_service.read_manifest(archive)
+        except (ValueError, KeyError) as e:
+            raise CommandError(f'归档无效: {e}')
+
+        self.stdout.write(
+            f"导入用户 {options.get('user_id') or manifest['user_id']}"
+            f"（归档导出于 {manifest['exported_at']}）："
+        )
+
+        def progress(table, rows):
+            self.stdout.write(f'  {table}: {rows} 行')
+
+        started = time.monotonic()
+        try:
+            user, counts = transfer_service.import_user(archive, user_id=options.get('user_id'), progress=progress)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n用户 "{user}" 导入完成，共 {sum(counts.values())} 行，用时 {time.monotonic() - started:.1f} 秒'
+        ))
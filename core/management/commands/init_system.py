@@ -219,7 +219,8 @@ class Command(BaseCommand):
         ]
 
         if force:
-            MemoryLibrary.objects.filter(user=user).delete()
+            deleted = MemoryLibrary.objects.filter(user=user).delete()[0]
+            ChatUser.update_counters(user.id, memory_count=-deleted)
 
         memory_count = 0
         for memory_data in example_memories:
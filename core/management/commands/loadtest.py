@@ -0,0 +1,158 @@
+"""
+压测命令
+启动本地 OpenAI 兼容桩服务和 Synology Chat webhook 接收端，模拟 N 个用户按目标速率
+经由真实的 webhook_incoming 接口发消息，统计接入延迟、发送延迟、每条消息的 LLM 调用数和 SQL 查询数。
+压测在临时数据库中进行，不写入当前数据库，也不会被正在运行的服务的调度器取走回复任务
+"""
+import json
+import random
+import time
+import uuid
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+
+SAMPLE_TEXTS = [
+    '在吗', '今天好累啊', '晚饭吃什么好呢', '刚下班', '周末有什么安排吗',
+    '我有点想你了', '今天天气真不错', '你在干嘛呀', '明天要考试了好紧张', '晚安',
+]
+
+
+class Command(BaseCommand):
+    help = '使用本地 LLM / Webhook 桩服务压测消息接入与回复链路'
+
+    def add_arguments(self, parser):
+        from core.services.loadtest_service import add_stub_arguments
+
+        parser.add_argument('--users', type=int, default=10, help='模拟用户数，默认 10')
+        parser.add_argument('--messages', type=int, default=200, help='发送消息总数，默认 200')
+        parser.add_argument('--rate', type=float, default=5.0, help='目标发送速率（条/秒），默认 5')
+        add_stub_arguments(parser)
+        parser.add_argument('--keep-db', action='store_true', help='保留临时数据库（默认结束后删除）')
+        parser.add_argument('--json', type=str, dest='json_output', help='将压测报告以 JSON 写入该文件')
+
+    def handle(self, *args, **options):
+        from core.services.loadtest_service import build_harness, scratch_database
+
+        if options['users'] <= 0 or options['messages'] <= 0 or options['rate'] <= 0:
+            raise CommandError('--users / --messages / --rate 必须大于 0')
+
+        rng = random.Random(options['seed'])
+        run_id = uuid.uuid4().hex[:8]
+
+        with scratch_database(keepdb=options['keep_db']) as db_name:
+            harness = build_harness(options)
+            users = self._create_users(run_id, options['users'])
+            user_ids = [user.user_id for user in users]
+            self.stdout.write(
+                f'压测 {run_id}（临时数据库 {db_name}）: {len(users)} 个用户, '
+                f'{options["messages"]} 条消息, 目标 {options["rate"]} 条/秒'
+            )
+
+            harness.start()
+            try:
+                started = time.monotonic()
+                interval = 1.0 / options['rate']
+                schedule = []
+                for i in range(options['messages']):
+                    user = rng.choice(users)
+                    schedule.append((i * interval, user.user_id, user.username, rng.choice(SAMPLE_TEXTS)))
+                harness.run_schedule(schedule, concurrency=options['concurrency'])
+                send_seconds = time.monotonic() - started
+
+                self.stdout.write('发送完毕，等待回复发出...')
+                drained = harness.drain(user_ids, options['drain_timeout'])
+                total_seconds = time.monotonic() - started
+            finally:
+                harness.stop()
+
+            report = self._build_report(harness, options, send_seconds, total_seconds, drained, user_ids)
+
+        self._print_report(report)
+
+        if options.get('json_output'):
+            path = Path(options['json_output'])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+            self.stdout.write(f'报告已写入 {path}')
+
+    def _create_users(self, run_id, count):
+        """创建已完成初始化的压测用户（数字 user_id，与 Synology 一致）"""
+        from core.models import ChatUser
+
+        base = 900000000 + random.randrange(0, 90000000, 10000)
+        users = [
+            ChatUser(
+                user_id=str(base + i),
+                username=f'loadtest_{run_id}_{i}',
+                nickname=f'压测用户{i}',
+                is_initialized=True,
+                metadata={'loadtest': run_id},
+            )
+            for i in range(count)
+        ]
+        ChatUser.objects.bulk_create(users)
+        return list(ChatUser.objects.filter(metadata__loadtest=run_id).order_by('id'))
+
+    def _build_report(self, harness, options, send_seconds, total_seconds, drained, user_ids):
+        from core.models import ReplyTask
+        from core.services.loadtest_service import percentiles
+
+        ingest_ms = [elapsed for _, _, elapsed, _ in harness.ingests]
+        failed = sum(1 for *_, ok in harness.ingests if not ok)
+        sent = len(harness.ingests)
+        queries, query_seconds = harness.queries.snapshot()
+        task_status = {
+            row['status']: row['n'] for row in
+            ReplyTask.objects.filter(user__user_id__in=user_ids).values('status').annotate(n=Count('id'))
+        }
+
+        return {
+            'config': {
+                key: options[key] for key in (
+                    'users', 'messages', 'rate', 'concurrency', 'llm_latency_ms', 'llm_latency_sigma',
+                    'llm_tokens', 'llm_tokens_sigma', 'memory_rate', 'webhook_latency_ms',
+                    'executor_interval', 'seed',
+                )
+            },
+            'messages_sent': sent,
+            'ingest_failed': failed,
+            'achieved_rate': round(sent / send_seconds, 2) if send_seconds else None,
+            'duration_seconds': round(total_seconds, 1),
+            'drained': drained,
+            'replies_delivered': len(harness.sink.received),
+            'reply_tasks': task_status,
+            'ingest_latency_ms': percentiles(ingest_ms),
+            'schedule_lag_ms': percentiles(harness.schedule_lag),
+            'time_to_send_ms': percentiles(harness.time_to_send()),
+            'llm_calls': harness.llm.calls,
+            'llm_calls_by_kind': dict(harness.llm.calls_by_kind),
+            'llm_calls_per_message': round(harness.llm.calls / sent, 2) if sent else None,
+            'llm_tokens': {
+                'prompt': harness.llm.prompt_tokens,
+                'completion': harness.llm.completion_tokens_total,
+            },
+            'db_queries': queries,
+            'db_queries_per_message': round(queries / sent, 1) if sent else None,
+            'db_time_per_message_ms': round(query_seconds * 1000 / sent, 1) if sent else None,
+        }
+
+    def _print_report(self, report):
+        def fmt(p):
+            return ' / '.join('-' if p[k] is None else f'{p[k]:.0f}' for k in ('p50', 'p95', 'p99'))
+
+        self.stdout.write(self.style.SUCCESS('\n=== 压测报告 ===\n'))
+        self.stdout.write(f"发送消息: {report['messages_sent']}（失败 {report['ingest_failed']}），"
+                          f"实际速率 {report['achieved_rate']} 条/秒，总耗时 {report['duration_seconds']} 秒")
+        self.stdout.write(f"回复发出: {report['replies_delivered']}，回复任务 {report['reply_tasks']}")
+        if not report['drained']:
+            self.stdout.write(self.style.WARNING('等待超时：仍有回复任务未执行完毕'))
+        self.stdout.write('\n延迟（毫秒，p50 / p95 / p99）：')
+        self.stdout.write(f"  接入耗时: {fmt(report['ingest_latency_ms'])}")
+        self.stdout.write(f"  排队延迟: {fmt(report['schedule_lag_ms'])}")
+        self.stdout.write(f"  发送延迟: {fmt(report['time_to_send_ms'])}")
+        self.stdout.write('\n每条消息：')
+        self.stdout.write(f"  LLM 调用: {report['llm_calls_per_message']}（{report['llm_calls_by_kind']}）")
+        self.stdout.write(f"  SQL 查询: {report['db_queries_per_message']}，耗时 {report['db_time_per_message_ms']} 毫秒")
+        self.stdout.write('\n')
@@ -0,0 +1,47 @@
+"""
+冗余计数器校正命令
+按实际数据重新计算 ChatUser 的消息数、记忆数、待回复任务数和最近收发时间，修复漂移
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = '校正用户冗余计数器（消息数、记忆数、待回复任务数、最近收发时间）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='只校正指定用户（通过 user_id）',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='只显示漂移情况，不写入',
+        )
+
+    def handle(self, *args, **options):
+        from core.models import ChatUser
+
+        queryset = ChatUser.objects.all()
+        if options.get('user'):
+            queryset = queryset.filter(user_id=options['user'])
+            if not queryset.exists():
+                raise CommandError(f"用户 {options['user']} 不存在")
+
+        dry_run = options['dry_run']
+        drifted = ChatUser.reconcile_counters(queryset, dry_run=dry_run)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('所有用户的计数器均与实际数据一致'))
+            return
+
+        for user, changes in drifted:
+            self.stdout.write(f'{user} ({user.user_id}):')
+            for field, (recorded, actual) in changes.items():
+                self.stdout.write(f'  {field}: {recorded} -> {actual}')
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'\n{len(drifted)} 个用户的计数器存在漂移（未写入）'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'\n已校正 {len(drifted)} 个用户的计数器'))
@@ -0,0 +1,253 @@
+"""
+生产流量回放命令
+读取一段时间内收到的消息记录，在临时数据库中按原始时间间隔（可加速）经由真实的 webhook_incoming
+接口重新注入，LLM 和 Synology webhook 使用本地桩服务，按时间窗口报告队列深度、回复延迟和数据库负载
+"""
+import json
+import threading
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.management import parse_time_arg
+
+
+class Command(BaseCommand):
+    help = '在临时数据库中按原始节奏（可加速）回放历史接收消息，报告队列深度、回复延迟和数据库负载'
+
+    def add_arguments(self, parser):
+        from core.services.loadtest_service import add_stub_arguments
+
+        parser.add_argument('--since', type=str, required=True, help='回放起始时间（含），如 2025-01-01 或 2025-01-01T08:00:00+08:00')
+        parser.add_argument('--until', type=str, help='回放结束时间（不含），默认至今')
+        parser.add_argument('--speed', type=float, default=1.0, help='回放倍速，如 1 / 10 / 100，默认 1')
+        parser.add_argument('--max-idle', type=float, default=None,
+                            help='原始消息间隔超过此秒数时压缩为此秒数（跳过深夜等空闲时段），默认不压缩')
+        parser.add_argument('--limit', type=int, default=None, help='最多回放的消息数')
+        parser.add_argument('--sample-interval', type=float, default=5.0, help='指标采样间隔（秒，按实际时间），默认 5')
+        add_stub_arguments(parser)
+        parser.add_argument('--keep-db', action='store_true', help='保留临时数据库（默认结束后删除）')
+        parser.add_argument('--json', type=str, dest='json_output', help='将回放报告以 JSON 写入该文件')
+
+    def handle(self, *args, **options):
+        from core.services.loadtest_service import build_harness, scratch_database
+
+        if options['speed'] <= 0:
+            raise CommandError('--speed 必须大于 0')
+
+        since = parse_time_arg(options['since'])
+        until = parse_time_arg(options['until']) if options.get('until') else None
+
+        # 先从当前数据库读出要回放的消息，再切换到临时数据库
+        messages, users = self._load_messages(since, until, options['limit'])
+        if not messages:
+            raise CommandError('指定时间范围内没有接收消息')
+
+        schedule = self._build_schedule(messages, options['speed'], options['max_idle'])
+        self.stdout.write(
+            f"回放 {len(messages)} 条消息（{len(users)} 个用户），原始时长 "
+            f"{(messages[-1][3] - messages[0][3]).total_seconds():.0f} 秒，"
+            f"{options['speed']}x 回放约需 {schedule[-1][0]:.0f} 秒"
+        )
+
+        with scratch_database(keepdb=options['keep_db']) as db_name:
+            self.stdout.write(f"临时数据库: {db_name}")
+            self._create_users(users)
+            harness = build_harness(options)
+            sampler = _Sampler(harness, options['sample_interval'])
+
+            harness.start()
+            try:
+                started = time.monotonic()
+                sampler.start(started)
+                harness.run_schedule(schedule, concurrency=options['concurrency'])
+                inject_seconds = time.monotonic() - started
+
+                self.stdout.write('注入完毕，等待回复发出...')
+                drained = harness.drain(timeout=options['drain_timeout'])
+                total_seconds = time.monotonic() - started
+            finally:
+                sampler.stop()
+                harness.stop()
+
+            report = self._build_report(harness, sampler, options, messages, inject_seconds, total_seconds, drained)
+
+        self._print_report(report)
+
+        if options.get('json_output'):
+            path = Path(options['json_output'])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+            self.stdout.write(f'报告已写入 {path}')
+
+    def _load_messages(self, since, until, limit):
+        """读取接收消息 (user_id, username, content, timestamp) 和涉及的用户"""
+        from core.models import ChatUser, MessageRecord
+
+        queryset = MessageRecord.objects.filter(message_type='received', timestamp__gte=since)
+        if until:
+            queryset = queryset.filter(timestamp__lt=until)
+        queryset = queryset.order_by('timestamp', 'id').values_list(
+            'user__user_id', 'sender', 'content', 'timestamp',
+        )
+        if limit:
+            queryset = queryset[:limit]
+
+        messages = list(queryset.iterator(chunk_size=2000))
+        users = list(
+            ChatUser.objects.filter(user_id__in={m[0] for m in messages})
+            .values('user_id', 'username', 'nickname')
+        )
+        return messages, users
+
+    def _build_schedule(self, messages, speed, max_idle):
+        """按原始时间间隔（除以倍速，空闲时段按 max_idle 压缩）排定注入时刻"""
+        schedule = []
+        offset = 0.0
+        previous = messages[0][3]
+        for user_id, sender, content, timestamp in messages:
+            gap = (timestamp - previous).total_seconds()
+            if max_idle is not None:
+                gap = min(gap, max_idle)
+            offset += gap / speed
+            previous = timestamp
+            schedule.append((offset, user_id, sender, content))
+        return schedule
+
+    def _create_users(self, users):
+        """在临时数据库中创建已完成初始化的用户，使回放消息走正常回复流程"""
+        from core.models import ChatUser
+
+        ChatUser.objects.bulk_create([
+            ChatUser(
+                user_id=u['user_id'],
+                username=u['username'],
+                nickname=u['nickname'],
+                is_initialized=True,
+                metadata={'replay_traffic': True},
+            )
+            for u in users
+        ])
+
+    def _build_report(self, harness, sampler, options, messages, inject_seconds, total_seconds, drained):
+        from core.services.loadtest_service import percentiles
+
+        injected = len(harness.ingests)
+        queries, query_seconds = harness.queries.snapshot()
+        return {
+            'config': {
+                key: options[key] for key in (
+                    'since', 'until', 'speed', 'max_idle', 'limit', 'concurrency',
+                    'llm_latency_ms', 'llm_latency_sigma', 'llm_tokens', 'llm_tokens_sigma',
+                    'memory_rate', 'webhook_latency_ms', 'executor_interval', 'seed',
+                )
+            },
+            'source_window': [messages[0][3].isoformat(), messages[-1][3].isoformat()],
+            'messages_injected': injected,
+            'ingest_failed': sum(1 for *_, ok in harness.ingests if not ok),
+            'inject_seconds': round(inject_seconds, 1),
+            'duration_seconds': round(total_seconds, 1),
+            'drained': drained,
+            'replies_delivered': len(harness.sink.received),
+            'ingest_latency_ms': percentiles([elapsed for _, _, elapsed, _ in harness.ingests]),
+            'schedule_lag_ms': percentiles(harness.schedule_lag),
+            'reply_lag_ms': percentiles(harness.time_to_send()),
+            'llm_calls_per_message': round(harness.llm.calls / injected, 2) if injected else None,
+            'db_queries_per_message': round(queries / injected, 1) if injected else None,
+            'db_time_per_message_ms': round(query_seconds * 1000 / injected, 1) if injected else None,
+            'timeline': sampler.samples,
+        }
+
+    def _print_report(self, report):
+        def fmt(p):
+            return ' / '.join('-' if p[k] is None else f'{p[k]:.0f}' for k in ('p50', 'p95', 'p99'))
+
+        self.stdout.write(self.style.SUCCESS('\n=== 流量回放报告 ===\n'))
+        self.stdout.write(f"原始时间窗口: {report['source_window'][0]} ~ {report['source_window'][1]}")
+        self.stdout.write(f"注入消息: {report['messages_injected']}（失败 {report['ingest_failed']}），"
+                          f"注入耗时 {report['inject_seconds']} 秒，总耗时 {report['duration_seconds']} 秒")
+        self.stdout.write(f"回复发出: {report['replies_delivered']}")
+        if not report['drained']:
+            self.stdout.write(self.style.WARNING('等待超时：仍有回复任务未执行完毕'))
+
+        self.stdout.write('\n延迟（毫秒，p50 / p95 / p99）：')
+        self.stdout.write(f"  接入耗时: {fmt(report['ingest_latency_ms'])}")
+        self.stdout.write(f"  排队延迟: {fmt(report['schedule_lag_ms'])}")
+        self.stdout.write(f"  回复延迟: {fmt(report['reply_lag_ms'])}")
+        self.stdout.write(f"\n每条消息: LLM 调用 {report['llm_calls_per_message']}，"
+                          f"SQL 查询 {report['db_queries_per_message']}，耗时 {report['db_time_per_message_ms']} 毫秒")
+
+        self.stdout.write('\n时间线：')
+        self.stdout.write(f"{'秒':>7} {'已注入':>7} {'积压':>6} {'待回复':>6} {'最久逾期(s)':>11} "
+                          f"{'发出':>5} {'回复p95(ms)':>11} {'查询/s':>8} {'DB ms/s':>8}")
+        for s in report['timeline']:
+            p95 = '-' if s['reply_lag_p95_ms'] is None else f"{s['reply_lag_p95_ms']:.0f}"
+            self.stdout.write(
+                f"{s['elapsed']:>7.1f} {s['injected']:>7} {s['ingest_backlog']:>6} {s['pending_replies']:>6} "
+                f"{s['oldest_overdue_seconds']:>11.1f} {s['replies_delivered']:>5} {p95:>11} "
+                f"{s['queries_per_second']:>8.0f} {s['db_ms_per_second']:>8.0f}"
+            )
+        self.stdout.write('\n')
+
+
+class _Sampler:
+    """按固定间隔采样队列深度、回复延迟和数据库负载"""
+
+    def __init__(self, harness, interval):
+        self.harness = harness
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self, started):
+        self._started = started
+        self._last = (started, 0, 0.0)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stop_event.wait(self.interval):
+                self.sample()
+            self.sample()
+        finally:
+            connection.close()
+
+    def sample(self):
+        from django.db.models import Min
+        from django.utils import timezone
+        from core.models import ReplyTask
+        from core.services.loadtest_service import percentiles
+
+        now = time.monotonic()
+        last_time, last_queries, last_db_seconds = self._last
+        queries, db_seconds = self.harness.queries.snapshot()
+        window = max(now - last_time, 1e-6)
+
+        pending = ReplyTask.objects.filter(status__in=['pending', 'executing'])
+        oldest_due = pending.filter(scheduled_time__lte=timezone.now()).aggregate(t=Min('scheduled_time'))['t']
+        lags = [lag for arrived, lag in self.harness.reply_lags() if last_time < arrived <= now]
+
+        with self.harness.lock:
+            injected = len(self.harness.ingests)
+            backlog = self.harness.in_flight
+
+        self.samples.append({
+            'elapsed': round(now - self._started, 1),
+            'injected': injected,
+            'ingest_backlog': backlog,
+            'pending_replies': pending.count(),
+            'oldest_overdue_seconds': round((timezone.now() - oldest_due).total_seconds(), 1) if oldest_due else 0.0,
+            'replies_delivered': len(lags),
+            'reply_lag_p95_ms': percentiles(lags, points=(95,))['p95'],
+            'queries_per_second': round((queries - last_queries) / window, 1),
+            'db_ms_per_second': round((db_seconds - last_db_seconds) * 1000 / window, 1),
+        })
+        self._last = (now, queries, db_seconds)
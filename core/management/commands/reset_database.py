@@ -2,13 +2,30 @@
 数据库重置命令
 用于清除所有业务数据并重新创建数据表
 """
+import time
+from django.apps import apps
 from django.core.management.base import BaseCommand, CommandError
-from django.db import connection
+from django.core.management.color import no_style
+from django.db import connection, transaction
 
 
 class Command(BaseCommand):
     help = '重置数据库：清除所有业务数据或完全重建数据表'
 
+    # 按用户删除的表（按外键依赖排序：引用方在前）
+    USER_TABLES = [
+        ('message_record', '消息记录'),
+        ('reply_task', '回复任务'),
+        ('planned_task', '计划任务'),
+        ('memory_library', '记忆'),
+        ('prompt_library', '提示词'),
+        ('emotion_record', '情绪记录'),
+        ('emotion_rollup', '情绪汇总'),
+        ('emotion_state', '情绪状态'),
+        ('conversation_summary', '对话摘要'),
+        ('ai_call_log', 'AI 调用记录'),
+    ]
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--hard',
@@ -25,6 +42,12 @@ class Command(BaseCommand):
             type=str,
             help='只重置指定用户的数据（通过 user_id）',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='按用户重置时每批删除的行数，默认 5000',
+        )
         parser.add_argument(
             '--yes',
             action='store_true',
@@ -47,18 +70,15 @@ class Command(BaseCommand):
             return
 
         if user_id:
-            self._reset_user_data(user_id, skip_confirm)
+            self._reset_user_data(user_id, skip_confirm, options['batch_size'])
         elif soft_reset:
             self._soft_reset(skip_confirm)
         elif hard_reset:
             self._hard_reset(skip_confirm)
 
-    def _reset_user_data(self, user_id: str, skip_confirm: bool):
-        """重置指定用户的数据"""
-        from core.models import (
-            ChatUser, PromptLibrary, MemoryLibrary,
-            PlannedTask, ReplyTask, MessageRecord
-        )
+    def _reset_user_data(self, user_id: str, skip_confirm: bool, batch_size: int):
+        """重置指定用户的数据：分批执行原生 DELETE，每批单独提交，避免长事务和逐行加载"""
+        from core.models import ChatUser
 
         try:
             user = ChatUser.objects.get(user_id=user_id)
@@ -69,67 +89,98 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING(
                 f'\n即将删除用户 "{user}" (ID: {user_id}) 的所有数据：\n'
                 f'  - 提示词: {user.prompts.count()} 条\n'
-                f'  - 记忆: {user.memories.count()} 条\n'
+                f'  - 记忆: {user.memory_count} 条\n'
                 f'  - 计划任务: {user.planned_tasks.count()} 条\n'
                 f'  - 回复任务: {user.reply_tasks.count()} 条\n'
-                f'  - 消息记录: {user.messages.count()} 条\n'
+                f'  - 消息记录: {user.message_count} 条\n'
+                f'  - 情绪记录: {user.emotions.count()} 条\n'
             ))
             confirm = input('确认删除？输入 "yes" 继续: ')
             if confirm != 'yes':
                 self.stdout.write(self.style.NOTICE('操作已取消'))
                 return
 
-        # 删除用户相关数据
-        deleted_counts = {
-            '提示词': user.prompts.all().delete()[0],
-            '记忆': user.memories.all().delete()[0],
-            '计划任务': user.planned_tasks.all().delete()[0],
-            '回复任务': user.reply_tasks.all().delete()[0],
-            '消息记录': user.messages.all().delete()[0],
-        }
+        started = time.monotonic()
+        deleted_counts = {}
+        for table, name in self.USER_TABLES:
+            deleted_counts[name] = self._delete_in_batches(table, name, user.pk, batch_size)
+
+        ChatUser.objects.filter(pk=user.pk).update(
+            message_count=0,
+            memory_count=0,
+            pending_reply_count=0,
+            last_message_at=None,
+            last_sent_at=None
+        )
+
+        from core.models import RawPayload
+        deleted_counts['原始数据'] = RawPayload.delete_unreferenced(batch_size=batch_size)
 
-        self.stdout.write(self.style.SUCCESS(f'\n用户 "{user}" 的数据已清除：'))
+        self.stdout.write(self.style.SUCCESS(
+            f'\n用户 "{user}" 的数据已清除（用时 {time.monotonic() - started:.1f} 秒）：'
+        ))
         for name, count in deleted_counts.items():
             self.stdout.write(f'  - {name}: {count} 条')
 
-    def _soft_reset(self, skip_confirm: bool):
-        """软重置：只清除业务数据"""
-        from core.models import (
-            ChatUser, PromptLibrary, MemoryLibrary,
-            PlannedTask, ReplyTask, MessageRecord
+    def _delete_in_batches(self, table: str, name: str, user_pk: int, batch_size: int) -> int:
+        """按主键分批删除某张表中属于该用户的行，返回删除总数"""
+        pk_column = 'user_id' if table == 'emotion_state' else 'id'
+        sql = (
+            f'DELETE FROM {table} WHERE {pk_column} IN '
+            f'(SELECT {pk_column} FROM {table} WHERE user_id = %s LIMIT %s)'
         )
 
-        # 统计现有数据
-        counts = {
-            '聊天用户': ChatUser.objects.count(),
-            '提示词库': PromptLibrary.objects.count(),
-            '记忆库': MemoryLibrary.objects.count(),
-            '计划任务': PlannedTask.objects.count(),
-            '回复任务': ReplyTask.objects.count(),
-            '消息记录': MessageRecord.objects.count(),
-        }
+        total = 0
+        with connection.cursor() as cursor:
+            while True:
+                with transaction.atomic():
+                    cursor.execute(sql, [user_pk, batch_size])
+                    deleted = cursor.rowcount
+                total += deleted
+                if deleted:
+                    self.stdout.write(f'  {name}: 已删除 {total} 条')
+                if deleted < batch_size:
+                    return total
+
+    def _core_tables(self) -> list:
+        """core 应用的全部数据表"""
+        return [model._meta.db_table for model in apps.get_app_config('core').get_models()]
+
+    def _soft_reset(self, skip_confirm: bool):
+        """
+        软重置：清空所有业务数据（含情绪、汇总、检查点等派生数据）
+
+        使用数据库的清空语句（PostgreSQL 为 TRUNCATE ... RESTART IDENTITY CASCADE），
+        不逐行加载和级联删除，耗时与数据量基本无关。
+        """
+        from core.services.stats_service import get_stats_service
+
+        tables = self._core_tables()
 
         if not skip_confirm:
-            self.stdout.write(self.style.WARNING(
-                '\n即将清除以下数据：'
-            ))
-            for name, count in counts.items():
-                self.stdout.write(f'  - {name}: {count} 条')
+            stats_service = get_stats_service()
+            self.stdout.write(self.style.WARNING('\n即将清空以下数据表：'))
+            with connection.cursor() as cursor:
+                for table in tables:
+                    estimate = stats_service.estimate_rows(table)
+                    if estimate is not None:
+                        self.stdout.write(f'  - {table}: 约 {estimate} 条')
+                    else:
+                        cursor.execute(f'SELECT COUNT(*) FROM {table}')
+                        self.stdout.write(f'  - {table}: {cursor.fetchone()[0]} 条')
 
             confirm = input('\n确认清除所有数据？输入 "yes" 继续: ')
             if confirm != 'yes':
                 self.stdout.write(self.style.NOTICE('操作已取消'))
                 return
 
-        # 按顺序删除数据（注意外键约束）
-        MessageRecord.objects.all().delete()
-        ReplyTask.objects.all().delete()
-        PlannedTask.objects.all().delete()
-        MemoryLibrary.objects.all().delete()
-        PromptLibrary.objects.all().delete()
-        ChatUser.objects.all().delete()
+        started = time.monotonic()
+        sql_list = connection.ops.sql_flush(no_style(), tables, reset_sequences=True, allow_cascade=True)
+        connection.ops.execute_sql_flush(sql_list)
 
-        self.stdout.write(self.style.SUCCESS('\n所有业务数据已清除！'))
+        self.stdout.write(self.style.SUCCESS(
+            f'\n所有业务数据已清除（{len(tables)} 张表，用时 {time.monotonic() - started:.1f} 秒）！'
+        ))
         self.stdout.write('数据表结构保持不变，可以直接开始使用。')
 
     def _hard_reset(self, skip_confirm: bool):
@@ -150,14 +201,7 @@ class Command(BaseCommand):
         self.stdout.write('开始硬重置...\n')
 
         # 获取要删除的表
-        tables = [
-            'message_record',
-            'reply_task',
-            'planned_task',
-            'memory_library',
-            'prompt_library',
-            'chat_user',
-        ]
+        tables = self._core_tables()
 
         with connection.cursor() as cursor:
             # 删除数据表
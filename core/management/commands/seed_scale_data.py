@@ -0,0 +1,64 @@
+"""
+压测数据生成命令
+按固定随机种子生成 N 个用户及其提示词、消息、记忆、情绪记录和计划/回复任务（PostgreSQL 上使用 COPY 批量写入）
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = '按固定随机种子批量生成压测数据（用户、提示词、消息、记忆、情绪记录、计划/回复任务）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='用户数，默认 1000')
+        parser.add_argument('--messages', type=int, default=200, help='每个用户的消息数，默认 200')
+        parser.add_argument('--memories', type=int, default=20, help='每个用户的记忆数，默认 20')
+        parser.add_argument('--emotions', type=int, default=50, help='每个用户的情绪记录数，默认 50')
+        parser.add_argument('--tasks', type=int, default=10, help='每个用户的计划任务数和回复任务数，默认各 10')
+        parser.add_argument('--days', type=int, default=30, help='数据覆盖最近多少天，默认 30')
+        parser.add_argument('--seed', type=int, default=42, help='随机种子，默认 42（相同参数生成相同数据）')
+        parser.add_argument('--start-user-id', type=int, default=800000000,
+                            help='生成用户的起始 user_id，默认 800000000')
+        parser.add_argument('--skip-emotion-state', action='store_true',
+                            help='不重建物化情绪状态（用户数很多时可节省时间，情绪上下文会回退为实时聚合）')
+
+    def handle(self, *args, **options):
+        from core.services.seed_service import ScaleDataGenerator
+
+        if options['users'] <= 0 or options['days'] <= 0:
+            raise CommandError('--users / --days 必须大于 0')
+
+        generator = ScaleDataGenerator(
+            users=options['users'],
+            messages_per_user=options['messages'],
+            memories_per_user=options['memories'],
+            emotions_per_user=options['emotions'],
+            tasks_per_user=options['tasks'],
+            days=options['days'],
+            seed=options['seed'],
+            start_user_id=options['start_user_id'],
+        )
+
+        started = time.monotonic()
+
+        def progress(table, rows):
+            self.stdout.write(f'  {table}: {rows} 行（{time.monotonic() - started:.0f} 秒）')
+
+        self.stdout.write(f"生成 {options['users']} 个用户的数据（seed={options['seed']}）...")
+        try:
+            counts = generator.load(progress=progress)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not options['skip_emotion_state']:
+            self.stdout.write('重建情绪状态...')
+            generator.rebuild_emotion_states(progress=lambda n: self.stdout.write(f'  {n} 个用户'))
+
+        total = sum(counts.values())
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'\n完成：共写入 {total} 行，用时 {elapsed:.0f} 秒（{total / max(elapsed, 1e-6):.0f} 行/秒）'
+        ))
+        for table, rows in counts.items():
+            self.stdout.write(f'  {table}: {rows}')
+        self.stdout.write('\n提示：PostgreSQL 上建议随后执行 ANALYZE 以更新统计信息')
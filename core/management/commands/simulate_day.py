@@ -0,0 +1,139 @@
+"""
+全天调度模拟命令
+在临时数据库中用虚拟时钟推进一整天：按生产配置触发全部定时任务，N 个用户按日内分布发消息，
+LLM 和 Synology webhook 使用本地桩服务，报告每次调度的工作量、回复发送延迟和队列长度
+"""
+import json
+import random
+from datetime import timedelta
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.management import parse_time_arg
+
+
+class Command(BaseCommand):
+    help = '用虚拟时钟在几秒内模拟一整天的定时任务和用户消息，报告每次调度的工作量、发送延迟和队列长度'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='模拟用户数，默认 20')
+        parser.add_argument('--messages', type=int, default=20, help='每个用户在模拟时段内发送的消息数，默认 20')
+        parser.add_argument('--start', type=str, help='虚拟起始时间，如 2025-01-01 或 2025-01-01T08:00:00，默认今天 00:00')
+        parser.add_argument('--hours', type=int, default=24, help='模拟时长（小时），默认 24')
+        parser.add_argument('--reply-delay-max', type=int, default=10,
+                            help='桩服务给出的回复延迟上限（分钟，0~上限均匀取值），默认 10')
+        parser.add_argument('--daily-items', type=int, default=3, help='桩服务为每个用户生成的每日计划/自主消息条数，默认 3')
+        parser.add_argument('--memory-rate', type=float, default=0.1, help='记忆检测命中概率，默认 0.1')
+        parser.add_argument('--llm-latency-ms', type=float, default=0, help='LLM 响应延迟（毫秒，真实时间），默认 0')
+        parser.add_argument('--seed', type=int, default=None, help='随机种子')
+        parser.add_argument('--keep-db', action='store_true', help='保留临时数据库（默认结束后删除）')
+        parser.add_argument('--json', type=str, dest='json_output', help='将模拟报告（含每次调度明细）以 JSON 写入该文件')
+
+    def handle(self, *args, **options):
+        from core.services.loadtest_service import (
+            LoadTestHarness, LogNormal, OpenAIStubServer, WebhookSinkServer, scratch_database,
+        )
+        from core.services.simulation_service import SchedulerSimulation
+
+        if options['users'] <= 0 or options['hours'] <= 0 or options['messages'] < 0:
+            raise CommandError('--users / --hours 必须大于 0，--messages 不能为负数')
+
+        if options.get('start'):
+            start = parse_time_arg(options['start'])
+        else:
+            start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        rng = random.Random(options['seed'])
+        llm = OpenAIStubServer(
+            latency_ms=LogNormal(options['llm_latency_ms']),
+            completion_tokens=LogNormal(60, 0.5, random.Random(rng.random())),
+            memory_rate=options['memory_rate'],
+            delay_minutes=options['reply_delay_max'],
+            daily_items=options['daily_items'],
+            seed=rng.random(),
+        )
+        sink = WebhookSinkServer(latency_ms=LogNormal(0))
+        harness = LoadTestHarness(llm, sink, executor_interval=None)
+
+        self.stdout.write(
+            f"模拟 {options['users']} 个用户 × {options['messages']} 条消息，"
+            f"虚拟时间 {timezone.localtime(start):%Y-%m-%d %H:%M} 起 {options['hours']} 小时"
+        )
+
+        with scratch_database(keepdb=options['keep_db']) as db_name:
+            self.stdout.write(f'临时数据库: {db_name}')
+            users = self._create_users(options['users'], start)
+
+            harness.start()
+            try:
+                simulation = SchedulerSimulation(
+                    harness, users, start, hours=options['hours'],
+                    messages_per_user=options['messages'], seed=rng.random(),
+                )
+                report = simulation.run(
+                    progress=lambda hour: self.stdout.write(f'  虚拟时间 {hour:%m-%d %H:00}', ending='\r')
+                )
+            finally:
+                harness.stop()
+
+        self.stdout.write('')
+        self._print_report(report)
+
+        if options.get('json_output'):
+            path = Path(options['json_output'])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+            self.stdout.write(f'报告已写入 {path}')
+
+    def _create_users(self, count, start):
+        """在临时数据库中创建已完成初始化、近期活跃的用户"""
+        from core.models import ChatUser
+
+        ChatUser.objects.bulk_create([
+            ChatUser(
+                user_id=str(600000000 + i),
+                username=f'simulate_{i}',
+                nickname=f'模拟用户{i}',
+                is_initialized=True,
+                last_message_at=start - timedelta(days=1),
+                metadata={'simulate_day': True},
+            )
+            for i in range(count)
+        ])
+        return list(ChatUser.objects.filter(metadata__simulate_day=True).order_by('id'))
+
+    def _print_report(self, report):
+        def fmt(p):
+            return ' / '.join('-' if p[k] is None else f'{p[k]:.0f}' for k in ('p50', 'p95', 'p99'))
+
+        self.stdout.write(self.style.SUCCESS('\n=== 全天调度模拟报告 ===\n'))
+        self.stdout.write(f"虚拟时段: {report['window'][0]} ~ {report['window'][1]}，实际耗时 {report['wall_seconds']} 秒")
+        self.stdout.write(f"注入消息: {report['messages_injected']}，发出消息: {report['replies_sent']}，"
+                          f"LLM 调用: {report['llm_calls']}（{report['llm_calls_by_kind']}）")
+        self.stdout.write(f"计划任务: {report['planned_tasks']}，回复任务: {report['reply_tasks']}")
+        self.stdout.write(f"自主消息: 生成 {report['autonomous_created']}，因用户回复被推迟 {report['autonomous_rescheduled']}")
+
+        self.stdout.write('\n发送延迟（秒，实际发送 - 计划时间，p50 / p95 / p99；负数为被整合提前发送）：')
+        for kind, p in report['send_lag_seconds'].items():
+            self.stdout.write(f'  {kind}: {fmt(p)}')
+        self.stdout.write(f"  提前发送: {report['sent_early']}")
+        self.stdout.write(f"队列: 最多待发送 {report['max_pending']}，最多已到期未发送 {report['max_overdue']}")
+
+        self.stdout.write('\n定时任务：')
+        self.stdout.write(f"{'任务':<28} {'次数':>5} {'总耗时ms':>9} {'最长ms':>8} {'查询':>7} {'LLM':>5}")
+        for job_id, s in report['jobs'].items():
+            self.stdout.write(
+                f"{job_id:<28} {s['runs']:>5} {s['wall_ms']:>9.0f} {s['max_wall_ms']:>8.0f} {s['queries']:>7} {s['llm_calls']:>5}"
+            )
+
+        self.stdout.write('\n按小时：')
+        self.stdout.write(f"{'小时':<14} {'消息':>5} {'调度':>5} {'发出':>5} {'LLM':>5} {'查询':>7} "
+                          f"{'DB ms':>7} {'耗时ms':>8} {'单次最长':>8} {'待发送':>6} {'已到期':>6}")
+        for h in report['hourly']:
+            self.stdout.write(
+                f"{h['hour']:<14} {h['messages']:>5} {h['job_runs']:>5} {h['sent']:>5} {h['llm_calls']:>5} "
+                f"{h['queries']:>7} {h['db_ms']:>7.0f} {h['wall_ms']:>8.0f} {h['max_tick_ms']:>8.0f} "
+                f"{h['max_pending']:>6} {h['max_overdue']:>6}"
+            )
+        self.stdout.write('\n')
@@ -1,49 +1,55 @@
 from django.core.management.base import BaseCommand
-from core.models import ReplyTask, PlannedTask, MemoryLibrary, MessageRecord
 
 
 class Command(BaseCommand):
     help = '显示系统状态统计信息'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--exact',
+            action='store_true',
+            help='当场精确统计（默认读取定时刷新的统计快照，大表可能为估算值）',
+        )
+
     def handle(self, *args, **options):
+        from core.services.stats_service import get_stats_service
+
+        stats = get_stats_service().get_snapshot(exact=options['exact'])
+
+        def fmt(section, key):
+            value = stats[section].get(key)
+            if section in stats['estimated']:
+                return f'约 {value}' if value is not None else '-（估算模式，使用 --exact 查看）'
+            return value or 0
+
         self.stdout.write(self.style.SUCCESS('\n=== RuoChat系统状态 ===\n'))
+        self.stdout.write(f"统计时间: {stats['generated_at']}{'（精确）' if stats['exact'] else ''}\n")
 
         # 回复任务统计
-        pending_tasks = ReplyTask.objects.filter(status='pending').count()
-        completed_tasks = ReplyTask.objects.filter(status='completed').count()
-        failed_tasks = ReplyTask.objects.filter(status='failed').count()
-
         self.stdout.write('回复任务：')
-        self.stdout.write(f'  待执行: {pending_tasks}')
-        self.stdout.write(f'  已完成: {completed_tasks}')
-        self.stdout.write(f'  失败: {failed_tasks}')
+        self.stdout.write(f"  待执行: {fmt('reply_tasks', 'pending')}")
+        self.stdout.write(f"  已完成: {fmt('reply_tasks', 'completed')}")
+        self.stdout.write(f"  失败: {fmt('reply_tasks', 'failed')}")
 
         # 计划任务统计
-        planned_pending = PlannedTask.objects.filter(status='pending').count()
-        planned_completed = PlannedTask.objects.filter(status='completed').count()
-
         self.stdout.write('\n计划任务：')
-        self.stdout.write(f'  待执行: {planned_pending}')
-        self.stdout.write(f'  已完成: {planned_completed}')
+        self.stdout.write(f"  待执行: {fmt('planned_tasks', 'pending')}")
+        self.stdout.write(f"  已完成: {fmt('planned_tasks', 'completed')}")
 
         # 记忆库统计
-        total_memories = MemoryLibrary.objects.count()
-        hotspot_memories = MemoryLibrary.objects.filter(memory_type='hotspot').count()
-        user_memories = MemoryLibrary.objects.filter(memory_type='user_memory').count()
-
         self.stdout.write('\n记忆库：')
-        self.stdout.write(f'  总记忆数: {total_memories}')
-        self.stdout.write(f'  热点记忆: {hotspot_memories}')
-        self.stdout.write(f'  用户记忆: {user_memories}')
+        self.stdout.write(f"  总记忆数: {fmt('memories', 'total')}")
+        self.stdout.write(f"  热点记忆: {fmt('memories', 'hotspot')}")
+        self.stdout.write(f"  用户记忆: {fmt('memories', 'user_memory')}")
 
         # 消息记录统计
-        total_messages = MessageRecord.objects.count()
-        received_messages = MessageRecord.objects.filter(message_type='received').count()
-        sent_messages = MessageRecord.objects.filter(message_type='sent').count()
-
         self.stdout.write('\n消息记录：')
-        self.stdout.write(f'  总消息数: {total_messages}')
-        self.stdout.write(f'  接收消息: {received_messages}')
-        self.stdout.write(f'  发送消息: {sent_messages}')
+        self.stdout.write(f"  总消息数: {fmt('messages', 'total')}")
+        self.stdout.write(f"  接收消息: {fmt('messages', 'received')}")
+        self.stdout.write(f"  发送消息: {fmt('messages', 'sent')}")
+
+        # 情绪记录统计
+        self.stdout.write('\n情绪记录：')
+        self.stdout.write(f"  总记录数: {fmt('emotions', 'total')}")
 
         self.stdout.write('\n')
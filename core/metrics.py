@@ -0,0 +1,253 @@
+# Prometheus 指标
+# 由 /metrics 接口以 Prometheus 文本格式输出：
+#   - webhook 接收耗时、LLM 调用耗时与 token（按调用方）、webhook 发送耗时（按状态码）；
+#   - 定时任务执行耗时、重叠（上一次尚未结束而跳过）和错过执行次数；
+#   - 每个请求 / 每次定时任务执行的数据库查询数和耗时（由 core.querystats 记录）；
+#   - 回复任务队列：待发送/执行中数量、最早到期任务的延迟。队列指标在抓取时读取进程内缓存，
+#     缓存超过 METRICS_CACHE_SECONDS 秒才重新查询（一条 GROUP BY），频繁抓取不会压垮数据库。
+#
+# gunicorn 多 worker 部署时设置环境变量 PROMETHEUS_MULTIPROC_DIR（指向每次启动前清空的目录），
+# 各 worker 的计数器和直方图会写入该目录并在抓取时合并；未设置时只输出处理本次抓取的进程的数据。
+import logging
+import os
+import re
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.utils import timezone
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from core import clock
+
+logger = logging.getLogger(__name__)
+
+# 请求耗时分桶（秒）
+REQUEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+WEBHOOK_INGEST_SECONDS = Histogram(
+    'ruochat_webhook_ingest_seconds', 'webhook 接收消息的处理耗时', ['status'],
+    buckets=REQUEST_BUCKETS,
+)
+WEBHOOK_SEND_SECONDS = Histogram(
+    'ruochat_webhook_send_seconds', '向 Synology Chat 发送 webhook 的耗时（status 为 HTTP 状态码或 error）', ['status'],
+    buckets=REQUEST_BUCKETS,
+)
+LLM_CALL_SECONDS = Histogram(
+    'ruochat_llm_call_seconds', 'LLM 调用耗时', ['caller', 'outcome'],
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120),
+)
+LLM_TOKENS = Counter(
+    'ruochat_llm_tokens', 'LLM 调用 token 用量（cached 为输入中命中提示词缓存的部分）', ['caller', 'kind'],
+)
+SCHEDULER_JOB_SECONDS = Histogram(
+    'ruochat_scheduler_job_seconds', '定时任务执行耗时', ['job', 'outcome'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900),
+)
+SCHEDULER_JOB_OVERLAPS = Counter(
+    'ruochat_scheduler_job_overlaps', '上一次执行尚未结束、本次被跳过的次数', ['job'],
+)
+SCHEDULER_JOB_MISFIRES = Counter(
+    'ruochat_scheduler_job_misfires', '超过容错时间而错过执行的次数', ['job'],
+)
+DB_QUERIES = Histogram(
+    'ruochat_db_queries', '每个请求 / 每次定时任务执行的数据库查询数（name 为视图名或任务函数名）', ['kind', 'name'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000),
+)
+DB_SECONDS = Histogram(
+    'ruochat_db_seconds', '每个请求 / 每次定时任务执行的数据库总耗时', ['kind', 'name'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 5, 10, 60),
+)
+DB_BUDGET_EXCEEDED = Counter(
+    'ruochat_db_budget_exceeded', '查询数或数据库耗时超出 QUERY_BUDGET_* 预算的次数', ['kind', 'name'],
+)
+
+
+def observe_response(histogram):
+    """视图装饰器：按响应状态码记录视图耗时"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            started = time.monotonic()
+            status = 500
+            try:
+                response = view(request, *args, **kwargs)
+                status = response.status_code
+                return response
+            finally:
+                histogram.labels(status=str(status)).observe(time.monotonic() - started)
+        return wrapper
+    return decorator
+
+
+class _ClosingStream:
+    """包装流式响应的内容：迭代完或响应关闭时（以先到者为准）执行一次 callback"""
+
+    def __init__(self, content, callback):
+        self._content = content
+        self._iterator = iter(content)
+        self._callback = callback
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if hasattr(self._content, 'close'):
+                self._content.close()
+        finally:
+            self._callback()
+
+
+def call_on_close(response, callback):
+    """
+    响应结束后执行 callback
+
+    普通响应立即执行；流式响应（如 NDJSON / CSV 导出）的查询发生在视图返回之后的内容迭代中，
+    在内容迭代完或响应关闭时才执行，统计和剖析才能覆盖整个响应。
+    """
+    if not response.streaming:
+        callback()
+        return
+    response.streaming_content = _ClosingStream(response.streaming_content, callback)
+
+
+def observe_llm_call(caller: str, seconds: float, outcome: str, usage: dict = None):
+    """
+    记录一次 LLM 调用
+
+    Args:
+        caller: 调用方
+        seconds: 耗时（秒）
+        outcome: success / error / parse_error
+        usage: OpenAI 返回的 usage 字典
+    """
+    LLM_CALL_SECONDS.labels(caller=caller, outcome=outcome).observe(seconds)
+    if usage:
+        details = usage.get('prompt_tokens_details') or {}
+        LLM_TOKENS.labels(caller=caller, kind='prompt').inc(usage.get('prompt_tokens') or 0)
+        LLM_TOKENS.labels(caller=caller, kind='completion').inc(usage.get('completion_tokens') or 0)
+        LLM_TOKENS.labels(caller=caller, kind='cached').inc(details.get('cached_tokens') or 0)
+
+
+def watch_scheduler(scheduler):
+    """监听调度器事件，记录定时任务的重叠和错过执行（执行耗时由 scheduler 中的任务包装记录）"""
+    from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+
+    def job_name(job_id):
+        # 按任务函数名聚合：后台一次性任务的 ID 含用户 ID，直接作为标签会无限增长
+        job = scheduler.get_job(job_id)
+        if job is not None:
+            return getattr(job.func, '__name__', job_id)
+        return re.sub(r'_\d+$', '', job_id)
+
+    def listener(event):
+        if event.code == EVENT_JOB_MAX_INSTANCES:
+            SCHEDULER_JOB_OVERLAPS.labels(job=job_name(event.job_id)).inc()
+        elif event.code == EVENT_JOB_MISSED:
+            SCHEDULER_JOB_MISFIRES.labels(job=job_name(event.job_id)).inc()
+
+    scheduler.add_listener(listener, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
+
+
+class ReplyQueueCollector:
+    """回复任务队列指标：抓取时读取缓存，过期后用一条 GROUP BY 查询刷新"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._refreshed_at = None
+
+    def _query(self) -> dict:
+        from django.db.models import Count, Min
+        from core.models import ReplyTask
+
+        snapshot = {'pending': 0, 'executing': 0, 'oldest_due_lag': 0.0}
+        rows = (
+            ReplyTask.objects.filter(status__in=['pending', 'executing'])
+            .order_by().values('status')
+            .annotate(count=Count('id'), oldest=Min('scheduled_time'))
+        )
+        now = clock.now()
+        for row in rows:
+            snapshot[row['status']] = row['count']
+            if row['status'] == 'pending' and row['oldest'] is not None:
+                oldest = row['oldest']
+                if timezone.is_naive(oldest):
+                    oldest = timezone.make_aware(oldest)
+                snapshot['oldest_due_lag'] = max(0.0, (now - oldest).total_seconds())
+        return snapshot
+
+    def get_snapshot(self) -> dict:
+        max_age = getattr(settings, 'METRICS_CACHE_SECONDS', 15)
+        with self._lock:
+            if self._refreshed_at is None or time.monotonic() - self._refreshed_at >= max_age:
+                try:
+                    self._snapshot = self._query()
+                except Exception as e:
+                    logger.warning(f"查询回复任务队列指标失败: {e}")
+                # 查询失败时也等到下个周期再重试，沿用上一次的数据
+                self._refreshed_at = time.monotonic()
+            return self._snapshot
+
+    @staticmethod
+    def _families():
+        return (
+            GaugeMetricFamily('ruochat_reply_tasks', '待发送 / 执行中的回复任务数', labels=['status']),
+            GaugeMetricFamily(
+                'ruochat_reply_task_oldest_due_lag_seconds', '最早到期的待发送回复任务已超过计划时间的秒数（未到期为 0）',
+                labels=[],
+            ),
+        )
+
+    def describe(self):
+        # 注册时只需要指标名，避免 REGISTRY.register 触发数据库查询
+        return self._families()
+
+    def collect(self):
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return
+
+        tasks, lag = self._families()
+        for status in ('pending', 'executing'):
+            tasks.add_metric([status], snapshot[status])
+        lag.add_metric([], snapshot['oldest_due_lag'])
+        yield tasks
+        yield lag
+
+
+reply_queue_collector = ReplyQueueCollector()
+REGISTRY.register(reply_queue_collector)
+
+
+def render():
+    """
+    生成 Prometheus 文本格式的全部指标
+
+    Returns:
+        tuple: (内容, Content-Type)
+    """
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(reply_queue_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
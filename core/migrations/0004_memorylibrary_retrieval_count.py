@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_chatuser_is_initialized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memorylibrary',
+            name='retrieval_count',
+            field=models.IntegerField(default=0, help_text='被检索进上下文的次数，用于LFU淘汰', verbose_name='检索次数'),
+        ),
+        migrations.AlterField(
+            model_name='promptlibrary',
+            name='category',
+            field=models.CharField(choices=[('character', '人物设定'), ('system', '系统提示词'), ('template', '回复模板'), ('reply_decision', '回复决策'), ('memory_detection', '记忆检测'), ('daily_planning', '每日计划'), ('autonomous_message', '自主消息'), ('hotspot_judge', '热点判断'), ('emotion_analysis', '情绪分析'), ('message_merge', '消息合并')], db_index=True, max_length=50, verbose_name='类别'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_memorylibrary_retrieval_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='任务名称')),
+                ('state', models.JSONField(blank=True, default=dict, verbose_name='进度状态')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '任务检查点',
+                'verbose_name_plural': '任务检查点',
+                'db_table': 'job_checkpoint',
+            },
+        ),
+        migrations.AlterField(
+            model_name='promptlibrary',
+            name='category',
+            field=models.CharField(choices=[('character', '人物设定'), ('system', '系统提示词'), ('template', '回复模板'), ('reply_decision', '回复决策'), ('memory_detection', '记忆检测'), ('daily_planning', '每日计划'), ('autonomous_message', '自主消息'), ('hotspot_judge', '热点判断'), ('emotion_analysis', '情绪分析'), ('message_merge', '消息合并'), ('memory_consolidation', '记忆整合')], db_index=True, max_length=50, verbose_name='类别'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_jobcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='promptlibrary',
+            name='category',
+            field=models.CharField(choices=[('character', '人物设定'), ('system', '系统提示词'), ('template', '回复模板'), ('reply_decision', '回复决策'), ('memory_detection', '记忆检测'), ('daily_planning', '每日计划'), ('autonomous_message', '自主消息'), ('hotspot_judge', '热点判断'), ('emotion_analysis', '情绪分析'), ('message_merge', '消息合并'), ('memory_consolidation', '记忆整合'), ('conversation_summary', '对话摘要')], db_index=True, max_length=50, verbose_name='类别'),
+        ),
+        migrations.CreateModel(
+            name='ConversationSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('summary', models.TextField(blank=True, verbose_name='摘要内容')),
+                ('last_message_id', models.BigIntegerField(default=0, help_text='ID不大于此值的消息已折叠进摘要', verbose_name='已摘要至消息ID')),
+                ('summarized_count', models.IntegerField(default=0, verbose_name='已摘要消息数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_summary', to='core.chatuser', verbose_name='所属用户')),
+            ],
+            options={
+                'verbose_name': '对话摘要',
+                'verbose_name_plural': '对话摘要',
+                'db_table': 'conversation_summary',
+            },
+        ),
+    ]
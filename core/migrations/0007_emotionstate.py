@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_conversationsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmotionState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='emotion_state', serialize=False, to='core.chatuser', verbose_name='所属用户')),
+                ('emotion_type', models.CharField(blank=True, choices=[('happy', '开心'), ('sad', '悲伤'), ('angry', '愤怒'), ('anxious', '焦虑'), ('calm', '平静'), ('excited', '兴奋'), ('tired', '疲倦'), ('neutral', '中性'), ('worried', '担忧'), ('grateful', '感激')], max_length=20, verbose_name='当前情绪')),
+                ('intensity', models.IntegerField(default=0, verbose_name='当前强度')),
+                ('description', models.TextField(blank=True, verbose_name='当前情绪描述')),
+                ('trigger_source', models.CharField(blank=True, choices=[('user_message', '用户消息'), ('system', '系统判断'), ('time_decay', '时间衰减'), ('daily_init', '每日初始化')], max_length=20, verbose_name='触发来源')),
+                ('emotion_at', models.DateTimeField(blank=True, null=True, verbose_name='情绪时间')),
+                ('recent', models.JSONField(blank=True, default=list, help_text='最近若干条情绪记录（环形缓冲区）', verbose_name='近期情绪')),
+                ('window_buckets', models.JSONField(blank=True, default=dict, help_text='按小时分桶的各情绪次数与强度和：{小时: {情绪: [次数, 强度和]}}', verbose_name='窗口统计')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '情绪状态',
+                'verbose_name_plural': '情绪状态',
+                'db_table': 'emotion_state',
+            },
+        ),
+    ]
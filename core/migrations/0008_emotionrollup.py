@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_emotionstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmotionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', '小时'), ('day', '天')], max_length=10, verbose_name='汇总粒度')),
+                ('bucket_start', models.DateTimeField(verbose_name='时段开始')),
+                ('count', models.IntegerField(default=0, verbose_name='记录数')),
+                ('intensity_sum', models.IntegerField(default=0, verbose_name='强度和')),
+                ('avg_intensity', models.FloatField(default=0, verbose_name='平均强度')),
+                ('dominant_emotion', models.CharField(blank=True, choices=[('happy', '开心'), ('sad', '悲伤'), ('angry', '愤怒'), ('anxious', '焦虑'), ('calm', '平静'), ('excited', '兴奋'), ('tired', '疲倦'), ('neutral', '中性'), ('worried', '担忧'), ('grateful', '感激')], max_length=20, verbose_name='主导情绪')),
+                ('emotion_counts', models.JSONField(blank=True, default=dict, help_text='{情绪: [次数, 强度和]}', verbose_name='各情绪统计')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emotion_rollups', to='core.chatuser', verbose_name='所属用户')),
+            ],
+            options={
+                'verbose_name': '情绪汇总',
+                'verbose_name_plural': '情绪汇总',
+                'db_table': 'emotion_rollup',
+                'ordering': ['-bucket_start'],
+                'indexes': [models.Index(fields=['period', '-bucket_start'], name='emotion_rol_period_a548a0_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='emotionrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'period', 'bucket_start'), name='unique_user_emotion_rollup'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+"""
+将 message_record 转换为按 timestamp 的按月范围分区表（仅 PostgreSQL）
+
+- 主键改为 (id, timestamp)（分区键必须包含在主键中），id 改由普通序列生成
+- 为已有数据覆盖的每个月以及之后 3 个月创建分区，不建默认分区，
+  以便 “ORDER BY timestamp DESC LIMIT N” 可以按分区顺序扫描、只触及最近的分区
+- 原表上的索引和外键按原名称重建，与 Django 迁移状态保持一致
+
+其他数据库（如本地 SQLite）跳过；回滚不会把分区表还原为普通表（两者对 ORM 完全兼容）。
+"""
+from datetime import datetime
+
+from django.db import migrations
+from django.utils import timezone
+
+PARENT = 'message_record'
+LEGACY = 'message_record_legacy'
+MONTHS_AHEAD = 3
+
+
+def _month_start(dt, offset=0):
+    local = timezone.localtime(dt)
+    month_index = local.year * 12 + local.month - 1 + offset
+    return timezone.make_aware(datetime(month_index // 12, month_index % 12 + 1, 1))
+
+
+def partition_message_record(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [PARENT])
+        if cursor.fetchone():
+            return
+
+        # 1. 记录原表的索引、外键定义和数据范围
+        cursor.execute("""
+            SELECT indexdef FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename = %s AND indexname <> %s
+        """, [PARENT, f'{PARENT}_pkey'])
+        index_defs = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute("""
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = to_regclass(%s) AND contype = 'f'
+        """, [PARENT])
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(f'SELECT MIN("timestamp"), MAX("timestamp"), COALESCE(MAX(id), 0) FROM {PARENT}')
+        min_timestamp, max_timestamp, max_id = cursor.fetchone()
+
+        # 2. 原表改名，建立同结构的分区父表
+        cursor.execute(f'ALTER TABLE {PARENT} RENAME TO {LEGACY}')
+        cursor.execute(f'ALTER INDEX {PARENT}_pkey RENAME TO {LEGACY}_pkey')
+        cursor.execute(f'CREATE TABLE {PARENT} (LIKE {LEGACY} INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")')
+        cursor.execute(f'ALTER TABLE {PARENT} ADD CONSTRAINT {PARENT}_pkey PRIMARY KEY (id, "timestamp")')
+
+        # 3. 按月建分区
+        now = timezone.now()
+        month = _month_start(min_timestamp or now)
+        last_month = _month_start(max(max_timestamp or now, now), MONTHS_AHEAD)
+        while month <= last_month:
+            cursor.execute(
+                f'CREATE TABLE {PARENT}_p{month.year:04d}_{month.month:02d} PARTITION OF {PARENT} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [month, _month_start(month, 1)]
+            )
+            month = _month_start(month, 1)
+
+        # 4. 迁移数据并删除原表（连同其 identity 序列、索引和外键）
+        cursor.execute(f'INSERT INTO {PARENT} SELECT * FROM {LEGACY}')
+        cursor.execute(f'DROP TABLE {LEGACY}')
+
+        # 5. 主键序列
+        cursor.execute(f'CREATE SEQUENCE {PARENT}_id_seq OWNED BY {PARENT}.id')
+        cursor.execute(f"SELECT setval('{PARENT}_id_seq', %s, false)", [max_id + 1])
+        cursor.execute(f"ALTER TABLE {PARENT} ALTER COLUMN id SET DEFAULT nextval('{PARENT}_id_seq')")
+
+        # 6. 按原名称重建索引和外键
+        for index_def in index_defs:
+            cursor.execute(index_def)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {PARENT} ADD CONSTRAINT {name} {definition}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_emotionrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_message_record, migrations.RunPython.noop),
+    ]
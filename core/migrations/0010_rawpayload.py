@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_partition_message_record'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RawPayload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(help_text='规范化 JSON 的 SHA-256', max_length=64, unique=True, verbose_name='内容摘要')),
+                ('data', models.BinaryField(help_text='zlib 压缩的规范化 JSON', verbose_name='压缩数据')),
+                ('size', models.IntegerField(default=0, verbose_name='原始字节数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '原始数据',
+                'verbose_name_plural': '原始数据',
+                'db_table': 'raw_payload',
+            },
+        ),
+        migrations.AlterField(
+            model_name='messagerecord',
+            name='raw_data',
+            field=models.JSONField(blank=True, default=dict, help_text='消息的来源等少量信息，完整原始请求见 raw_payload', verbose_name='原始数据'),
+        ),
+        migrations.AddField(
+            model_name='messagerecord',
+            name='raw_payload',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.rawpayload', verbose_name='原始请求'),
+        ),
+        migrations.AddField(
+            model_name='replytask',
+            name='raw_payload',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.rawpayload', verbose_name='触发消息原始数据'),
+        ),
+    ]
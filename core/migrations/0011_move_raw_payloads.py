@@ -0,0 +1,103 @@
+"""
+将已有的原始请求迁移到 raw_payload 冷存储
+
+- MessageRecord.raw_data['raw'] → MessageRecord.raw_payload
+- ReplyTask.metadata['raw_msg'] → ReplyTask.raw_payload
+- ReplyTask.context['emotion_at_reply'] 只保留情绪类型和强度
+- 整合发送记录的 raw_data['original_messages'] 删除（内容可由 merged_from_tasks 对应的回复任务得到）
+"""
+import hashlib
+import json
+import zlib
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+
+def _encode(payload):
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def _iter_batches(queryset):
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def _store_batch(RawPayload, payloads):
+    """
+    保存一批原始数据，返回与 payloads 一一对应的 RawPayload ID
+
+    只在本批次内按摘要去重：bulk_create 忽略已存在的摘要，再用一次查询取回ID，
+    摘要到ID的映射不跨批次保留，内存占用与表大小无关
+    """
+    if not payloads:
+        return []
+
+    encoded = [_encode(payload) for payload in payloads]
+    digests = [hashlib.sha256(raw).hexdigest() for raw in encoded]
+
+    new_payloads = {}
+    for digest, raw in zip(digests, encoded):
+        if digest not in new_payloads:
+            new_payloads[digest] = RawPayload(digest=digest, data=zlib.compress(raw), size=len(raw))
+    RawPayload.objects.bulk_create(new_payloads.values(), batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+    payload_ids = dict(RawPayload.objects.filter(digest__in=new_payloads).values_list('digest', 'id'))
+    return [payload_ids[digest] for digest in digests]
+
+
+def move_raw_payloads(apps, schema_editor):
+    RawPayload = apps.get_model('core', 'RawPayload')
+    MessageRecord = apps.get_model('core', 'MessageRecord')
+    ReplyTask = apps.get_model('core', 'ReplyTask')
+
+    using = schema_editor.connection.alias
+
+    for batch in _iter_batches(MessageRecord.objects.filter(raw_data__has_key='raw')):
+        with transaction.atomic(using=using):
+            payload_ids = _store_batch(RawPayload, [record.raw_data.pop('raw') for record in batch])
+            for record, payload_id in zip(batch, payload_ids):
+                record.raw_payload_id = payload_id
+            MessageRecord.objects.bulk_update(batch, ['raw_data', 'raw_payload'])
+
+    for batch in _iter_batches(MessageRecord.objects.filter(raw_data__has_key='original_messages')):
+        for record in batch:
+            record.raw_data.pop('original_messages')
+        MessageRecord.objects.bulk_update(batch, ['raw_data'])
+
+    for batch in _iter_batches(ReplyTask.objects.filter(metadata__has_key='raw_msg')):
+        with_raw = []
+        for task in batch:
+            raw_msg = task.metadata.pop('raw_msg')
+            if raw_msg:
+                with_raw.append((task, raw_msg))
+            emotion = (task.context or {}).get('emotion_at_reply')
+            if emotion:
+                task.context['emotion_at_reply'] = {
+                    'emotion_type': emotion.get('emotion_type'),
+                    'intensity': emotion.get('intensity'),
+                }
+        with transaction.atomic(using=using):
+            payload_ids = _store_batch(RawPayload, [raw_msg for _, raw_msg in with_raw])
+            for (task, _), payload_id in zip(with_raw, payload_ids):
+                task.raw_payload_id = payload_id
+            ReplyTask.objects.bulk_update(batch, ['metadata', 'context', 'raw_payload'])
+
+
+class Migration(migrations.Migration):
+    # 每批在各自的事务中提交；已处理的行不再带有 raw / raw_msg 键，中断后重新执行会从剩余的行继续
+    atomic = False
+
+    dependencies = [
+        ('core', '0010_rawpayload'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_raw_payloads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    """用一条 UPDATE（关联子查询）按现有数据初始化计数器"""
+    ChatUser = apps.get_model('core', 'ChatUser')
+    MessageRecord = apps.get_model('core', 'MessageRecord')
+    MemoryLibrary = apps.get_model('core', 'MemoryLibrary')
+    ReplyTask = apps.get_model('core', 'ReplyTask')
+
+    def count_of(model, **filters):
+        return Coalesce(Subquery(
+            model.objects.filter(user=OuterRef('pk'), **filters).order_by().values('user').annotate(
+                total=Count('id')
+            ).values('total')
+        ), 0)
+
+    def latest_message_of(message_type):
+        return Subquery(
+            MessageRecord.objects.filter(user=OuterRef('pk'), message_type=message_type).order_by(
+                '-timestamp'
+            ).values('timestamp')[:1]
+        )
+
+    ChatUser.objects.update(
+        message_count=count_of(MessageRecord),
+        memory_count=count_of(MemoryLibrary),
+        pending_reply_count=count_of(ReplyTask, status='pending'),
+        last_message_at=latest_message_of('received'),
+        last_sent_at=latest_message_of('sent'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_move_raw_payloads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatuser',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='最近收到消息时间'),
+        ),
+        migrations.AddField(
+            model_name='chatuser',
+            name='last_sent_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='最近发送消息时间'),
+        ),
+        migrations.AddField(
+            model_name='chatuser',
+            name='memory_count',
+            field=models.IntegerField(default=0, help_text='冗余计数，随记忆写入/删除原子更新', verbose_name='记忆数'),
+        ),
+        migrations.AddField(
+            model_name='chatuser',
+            name='message_count',
+            field=models.IntegerField(default=0, help_text='冗余计数，随消息写入/删除原子更新', verbose_name='消息数'),
+        ),
+        migrations.AddField(
+            model_name='chatuser',
+            name='pending_reply_count',
+            field=models.IntegerField(default=0, help_text='冗余计数，随回复任务状态变化原子更新', verbose_name='待回复任务数'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_chatuser_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AICallLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('caller', models.CharField(max_length=50, verbose_name='调用方')),
+                ('model', models.CharField(max_length=100, verbose_name='模型')),
+                ('prompt_tokens', models.IntegerField(default=0, verbose_name='输入 token')),
+                ('completion_tokens', models.IntegerField(default=0, verbose_name='输出 token')),
+                ('cached_tokens', models.IntegerField(default=0, help_text='输入 token 中命中提示词缓存的部分', verbose_name='缓存命中 token')),
+                ('latency_ms', models.IntegerField(default=0, verbose_name='耗时（毫秒）')),
+                ('error', models.CharField(blank=True, max_length=500, verbose_name='错误')),
+                ('parse_failed', models.BooleanField(default=False, verbose_name='JSON 解析失败')),
+                ('created_at', models.DateTimeField(db_index=True, verbose_name='调用时间')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ai_calls', to='core.chatuser', verbose_name='所属用户')),
+            ],
+            options={
+                'verbose_name': 'AI 调用记录',
+                'verbose_name_plural': 'AI 调用记录',
+                'db_table': 'ai_call_log',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['caller', 'created_at'], name='ai_call_log_caller_1f0499_idx'), models.Index(fields=['user', 'created_at'], name='ai_call_log_user_id_3b3976_idx')],
+            },
+        ),
+    ]
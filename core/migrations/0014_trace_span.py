@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_ai_call_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TraceSpan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trace_id', models.CharField(max_length=32, verbose_name='Trace ID')),
+                ('span_id', models.CharField(max_length=16, verbose_name='Span ID')),
+                ('parent_id', models.CharField(blank=True, max_length=16, verbose_name='父 Span ID')),
+                ('name', models.CharField(max_length=100, verbose_name='阶段')),
+                ('started_at', models.DateTimeField(db_index=True, verbose_name='开始时间')),
+                ('duration_ms', models.FloatField(verbose_name='耗时（毫秒）')),
+                ('attributes', models.JSONField(blank=True, default=dict, verbose_name='属性')),
+            ],
+            options={
+                'verbose_name': '追踪 Span',
+                'verbose_name_plural': '追踪 Span',
+                'db_table': 'trace_span',
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['trace_id', 'started_at'], name='trace_span_trace_i_7ce444_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_trace_span'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messagerecord',
+            index=models.Index(condition=models.Q(('raw_payload__isnull', False)), fields=['raw_payload'], name='message_record_raw_payload_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='replytask',
+            index=models.Index(condition=models.Q(('raw_payload__isnull', False)), fields=['raw_payload'], name='reply_task_raw_payload_idx'),
+        ),
+    ]
@@ -1,5 +1,13 @@
-from django.db import models
-from django.utils import timezone
+import hashlib
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from core import clock
 
 
 class ChatUser(models.Model):
@@ -14,9 +22,16 @@ class ChatUser(models.Model):
                                          help_text='用户是否已完成引导流程（设定人物设定等）')
     metadata = models.JSONField('元数据', default=dict, blank=True,
                                 help_text='存储额外的用户信息')
+    message_count = models.IntegerField('消息数', default=0, help_text='冗余计数，随消息写入/删除原子更新')
+    memory_count = models.IntegerField('记忆数', default=0, help_text='冗余计数，随记忆写入/删除原子更新')
+    pending_reply_count = models.IntegerField('待回复任务数', default=0, help_text='冗余计数，随回复任务状态变化原子更新')
+    last_message_at = models.DateTimeField('最近收到消息时间', null=True, blank=True)
+    last_sent_at = models.DateTimeField('最近发送消息时间', null=True, blank=True)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
     updated_at = models.DateTimeField('更新时间', auto_now=True)
 
+    COUNTER_FIELDS = ['message_count', 'memory_count', 'pending_reply_count', 'last_message_at', 'last_sent_at']
+
     class Meta:
         db_table = 'chat_user'
         verbose_name = '聊天用户'
@@ -51,6 +66,110 @@ class ChatUser(models.Model):
             user.save(update_fields=['username', 'updated_at'])
         return user
 
+    @classmethod
+    def update_counters(cls, user_id: int, last_message_at: datetime = None, last_sent_at: datetime = None, **deltas):
+        """
+        原子更新冗余计数器和活跃时间（F() 表达式，不需要先读出再写回）
+
+        Args:
+            user_id: ChatUser 主键
+            last_message_at: 收到消息的时间（只会向后推进）
+            last_sent_at: 发送消息的时间（只会向后推进）
+            **deltas: 计数器增量，如 message_count=1
+        """
+        updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        for field, value in (('last_message_at', last_message_at), ('last_sent_at', last_sent_at)):
+            if value is not None:
+                updates[field] = Greatest(Coalesce(F(field), Value(value)), Value(value))
+
+        if updates:
+            cls.objects.filter(pk=user_id).update(**updates)
+
+    @classmethod
+    def delete_counted(cls, queryset, counter: str, **filters) -> int:
+        """
+        删除记录并按用户扣减对应的冗余计数器（批量删除不触发逐行更新）
+
+        Args:
+            queryset: 要删除的记录（MessageRecord / MemoryLibrary / ReplyTask）
+            counter: 计数器字段，如 memory_count
+            **filters: 只有满足条件的记录计入该计数器，如待执行的回复任务 status='pending'
+
+        Returns:
+            int: 删除的记录数（不含级联删除的关联记录）
+        """
+        with transaction.atomic():
+            counts = list(queryset.filter(**filters).order_by().values('user_id').annotate(
+                total=Count('id')
+            ).values_list('user_id', 'total'))
+            # 删掉的可能正是最近收发的消息，删除后按剩余消息重算最近收发时间
+            refresh_user_ids = set(
+                queryset.order_by().values_list('user_id', flat=True).distinct()
+            ) if queryset.model is MessageRecord else set()
+
+            deleted = queryset.delete()[1].get(queryset.model._meta.label, 0)
+            for user_id, total in counts:
+                cls.update_counters(user_id, **{counter: -total})
+
+            if refresh_user_ids:
+                cls.objects.filter(pk__in=refresh_user_ids).update(
+                    last_message_at=cls._latest_message_at('received'),
+                    last_sent_at=cls._latest_message_at('sent'),
+                )
+        return deleted
+
+    @staticmethod
+    def _latest_message_at(message_type: str) -> Subquery:
+        """用户最近一条指定类型消息的时间（关联外层 ChatUser 的子查询）"""
+        return Subquery(
+            MessageRecord.objects.filter(user=OuterRef('pk'), message_type=message_type).order_by(
+                '-timestamp'
+            ).values('timestamp')[:1]
+        )
+
+    @classmethod
+    def reconcile_counters(cls, queryset=None, dry_run: bool = False) -> list:
+        """
+        按实际数据重新计算冗余计数器，修复漂移（如批量删除、分区归档之后）
+
+        Args:
+            queryset: 要校正的用户，默认全部
+            dry_run: 只返回漂移情况，不写入
+
+        Returns:
+            list: [(user, {字段: (记录值, 实际值)})]
+        """
+        def count_of(model, **filters):
+            return Coalesce(Subquery(
+                model.objects.filter(user=OuterRef('pk'), **filters).order_by().values('user').annotate(
+                    total=Count('id')
+                ).values('total')
+            ), 0)
+
+        queryset = (queryset if queryset is not None else cls.objects.all()).annotate(
+            actual_message_count=count_of(MessageRecord),
+            actual_memory_count=count_of(MemoryLibrary),
+            actual_pending_reply_count=count_of(ReplyTask, status='pending'),
+            actual_last_message_at=cls._latest_message_at('received'),
+            actual_last_sent_at=cls._latest_message_at('sent'),
+        ).order_by('id')
+
+        drifted = []
+        for user in queryset.iterator(chunk_size=1000):
+            changes = {
+                field: (getattr(user, field), getattr(user, f'actual_{field}'))
+                for field in cls.COUNTER_FIELDS
+                if getattr(user, field) != getattr(user, f'actual_{field}')
+            }
+            if not changes:
+                continue
+
+            drifted.append((user, changes))
+            if not dry_run:
+                cls.objects.filter(pk=user.pk).update(**{field: actual for field, (_, actual) in changes.items()})
+
+        return drifted
+
 
 class EmotionRecord(models.Model):
     """情绪记录库 - 存储AI助手情绪状态变化"""
@@ -110,14 +229,208 @@ class EmotionRecord(models.Model):
         return cls.objects.filter(user=user).first()
 
     @classmethod
-    def get_emotion_trend(cls, user, hours: int = 24) -> list:
-        """获取AI助手近期情绪趋势"""
-        from datetime import timedelta
-        cutoff = timezone.now() - timedelta(hours=hours)
-        return list(cls.objects.filter(
-            user=user,
-            created_at__gte=cutoff
-        ).order_by('created_at').values('emotion_type', 'intensity', 'created_at'))
+    def record(cls, user, emotion_type: str, intensity: int, trigger_source: str, **kwargs) -> 'EmotionRecord':
+        """
+        写入情绪记录，并在同一事务中更新该用户的物化情绪状态
+
+        Args:
+            user: ChatUser 对象
+            emotion_type: 情绪类型
+            intensity: 情绪强度
+            trigger_source: 触发来源
+            **kwargs: 其他字段（trigger_content, description, metadata）
+
+        Returns:
+            EmotionRecord 实例
+        """
+        with transaction.atomic():
+            emotion_record = cls.objects.create(
+                user=user,
+                emotion_type=emotion_type,
+                intensity=intensity,
+                trigger_source=trigger_source,
+                **kwargs
+            )
+            EmotionState.apply_record(emotion_record)
+        return emotion_record
+
+
+class EmotionState(models.Model):
+    """情绪状态 - 每用户一行的物化情绪视图，随情绪记录在同一事务中增量更新"""
+
+    WINDOW_HOURS = 24  # 统计滑动窗口（小时）
+    RECENT_SIZE = 20  # 近期情绪环形缓冲区大小
+
+    user = models.OneToOneField(
+        ChatUser,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='emotion_state',
+        verbose_name='所属用户'
+    )
+    emotion_type = models.CharField('当前情绪', max_length=20, choices=EmotionRecord.EMOTION_TYPE_CHOICES, blank=True)
+    intensity = models.IntegerField('当前强度', default=0)
+    description = models.TextField('当前情绪描述', blank=True)
+    trigger_source = models.CharField('触发来源', max_length=20, choices=EmotionRecord.TRIGGER_SOURCE_CHOICES, blank=True)
+    emotion_at = models.DateTimeField('情绪时间', null=True, blank=True)
+    recent = models.JSONField('近期情绪', default=list, blank=True,
+                              help_text='最近若干条情绪记录（环形缓冲区）')
+    window_buckets = models.JSONField('窗口统计', default=dict, blank=True,
+                                      help_text='按小时分桶的各情绪次数与强度和：{小时: {情绪: [次数, 强度和]}}')
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+
+    class Meta:
+        db_table = 'emotion_state'
+        verbose_name = '情绪状态'
+        verbose_name_plural = '情绪状态'
+
+    def __str__(self):
+        return f"{self.user} - {self.get_emotion_type_display() or '无记录'} ({self.intensity}/10)"
+
+    @staticmethod
+    def _hour_bucket(dt: datetime) -> int:
+        """时间所在的小时桶（自 epoch 起的小时数）"""
+        return int(dt.timestamp() // 3600)
+
+    def apply(self, emotion_record: EmotionRecord):
+        """将一条情绪记录合并进状态（只修改内存，不保存）"""
+        self.emotion_type = emotion_record.emotion_type
+        self.intensity = emotion_record.intensity
+        self.description = emotion_record.description
+        self.trigger_source = emotion_record.trigger_source
+        self.emotion_at = emotion_record.created_at
+
+        self.recent = (self.recent + [{
+            'emotion_type': emotion_record.emotion_type,
+            'intensity': emotion_record.intensity,
+            'trigger_source': emotion_record.trigger_source,
+            'created_at': emotion_record.created_at.isoformat(),
+        }])[-self.RECENT_SIZE:]
+
+        bucket = self._hour_bucket(emotion_record.created_at)
+        oldest_bucket = bucket - self.WINDOW_HOURS + 1
+        buckets = {k: v for k, v in self.window_buckets.items() if int(k) >= oldest_bucket}
+        stats = buckets.setdefault(str(bucket), {})
+        count, intensity_sum = stats.get(emotion_record.emotion_type, [0, 0])
+        stats[emotion_record.emotion_type] = [count + 1, intensity_sum + emotion_record.intensity]
+        self.window_buckets = buckets
+
+    @classmethod
+    def apply_record(cls, emotion_record: EmotionRecord) -> 'EmotionState':
+        """锁定并更新用户的情绪状态（需在事务中调用）"""
+        state, _ = cls.objects.select_for_update().get_or_create(user_id=emotion_record.user_id)
+        state.apply(emotion_record)
+        state.save()
+        return state
+
+    @classmethod
+    def rebuild(cls, user) -> 'EmotionState':
+        """根据原始情绪记录重建用户的情绪状态（用于补齐历史数据或修复）"""
+        cutoff = clock.now() - timedelta(hours=cls.WINDOW_HOURS)
+        records = list(EmotionRecord.objects.filter(user=user, created_at__gte=cutoff).order_by('created_at'))
+        if not records:
+            latest = EmotionRecord.objects.filter(user=user).first()
+            records = [latest] if latest else []
+
+        with transaction.atomic():
+            state, _ = cls.objects.select_for_update().get_or_create(user=user)
+            state.emotion_type = ''
+            state.intensity = 0
+            state.description = ''
+            state.trigger_source = ''
+            state.emotion_at = None
+            state.recent = []
+            state.window_buckets = {}
+            for emotion_record in records:
+                state.apply(emotion_record)
+            state.save()
+        return state
+
+    def get_recent(self, hours: int) -> list:
+        """获取窗口内的近期情绪（按时间正序）"""
+        cutoff = clock.now() - timedelta(hours=hours)
+        return [
+            entry for entry in self.recent
+            if datetime.fromisoformat(entry['created_at']) >= cutoff
+        ]
+
+    def get_window_stats(self, hours: int) -> list:
+        """
+        获取窗口内各情绪的次数和平均强度（按次数降序，小时粒度）
+
+        Returns:
+            list: [{'emotion_type', 'count', 'avg_intensity'}]
+        """
+        oldest_bucket = self._hour_bucket(clock.now()) - min(hours, self.WINDOW_HOURS) + 1
+        totals = {}
+        for bucket, stats in self.window_buckets.items():
+            if int(bucket) < oldest_bucket:
+                continue
+            for emotion_type, (count, intensity_sum) in stats.items():
+                total = totals.setdefault(emotion_type, [0, 0])
+                total[0] += count
+                total[1] += intensity_sum
+
+        return sorted([
+            {
+                'emotion_type': emotion_type,
+                'count': count,
+                'avg_intensity': intensity_sum / count if count else 0,
+            }
+            for emotion_type, (count, intensity_sum) in totals.items()
+        ], key=lambda item: item['count'], reverse=True)
+
+
+class EmotionRollup(models.Model):
+    """情绪汇总 - 按用户按小时/按天聚合的情绪统计，供长周期趋势和分析查询使用"""
+
+    PERIOD_CHOICES = [
+        ('hour', '小时'),
+        ('day', '天'),
+    ]
+
+    user = models.ForeignKey(
+        ChatUser,
+        on_delete=models.CASCADE,
+        related_name='emotion_rollups',
+        verbose_name='所属用户'
+    )
+    period = models.CharField('汇总粒度', max_length=10, choices=PERIOD_CHOICES)
+    bucket_start = models.DateTimeField('时段开始')
+    count = models.IntegerField('记录数', default=0)
+    intensity_sum = models.IntegerField('强度和', default=0)
+    avg_intensity = models.FloatField('平均强度', default=0)
+    dominant_emotion = models.CharField('主导情绪', max_length=20, choices=EmotionRecord.EMOTION_TYPE_CHOICES, blank=True)
+    emotion_counts = models.JSONField('各情绪统计', default=dict, blank=True,
+                                      help_text='{情绪: [次数, 强度和]}')
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+
+    class Meta:
+        db_table = 'emotion_rollup'
+        verbose_name = '情绪汇总'
+        verbose_name_plural = '情绪汇总'
+        ordering = ['-bucket_start']
+        indexes = [
+            models.Index(fields=['period', '-bucket_start']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period', 'bucket_start'], name='unique_user_emotion_rollup')
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.get_period_display()} {self.bucket_start} - {self.count}条"
+
+    def merge(self, emotion_type: str, count: int, intensity_sum: int):
+        """合并一组情绪统计，并重新计算平均强度和主导情绪（只修改内存，不保存）"""
+        current_count, current_sum = self.emotion_counts.get(emotion_type, [0, 0])
+        self.emotion_counts[emotion_type] = [current_count + count, current_sum + intensity_sum]
+        self.count += count
+        self.intensity_sum += intensity_sum
+        self.avg_intensity = round(self.intensity_sum / self.count, 2) if self.count else 0
+        self.dominant_emotion = max(
+            self.emotion_counts.items(),
+            key=lambda item: (item[1][0], item[1][1])
+        )[0]
 
 
 class PromptLibrary(models.Model):
@@ -134,6 +447,8 @@ class PromptLibrary(models.Model):
         ('hotspot_judge', '热点判断'),
         ('emotion_analysis', '情绪分析'),
         ('message_merge', '消息合并'),
+        ('memory_consolidation', '记忆整合'),
+        ('conversation_summary', '对话摘要'),
     ]
 
     # 预定义的提示词 key
@@ -145,6 +460,8 @@ class PromptLibrary(models.Model):
         'autonomous_message': 'autonomous_message_prompt',
         'hotspot_judge': 'hotspot_judge_prompt',
         'emotion_analysis': 'emotion_analysis_prompt',
+        'memory_consolidation': 'memory_consolidation_prompt',
+        'conversation_summary': 'conversation_summary_prompt',
     }
 
     user = models.ForeignKey(
@@ -218,6 +535,7 @@ class MemoryLibrary(models.Model):
     strength = models.IntegerField('强度', default=5, help_text='记忆强度 1-10')
     weight = models.FloatField('权重', default=1.0, help_text='记忆权重，影响检索优先级')
     forget_time = models.DateTimeField('遗忘时间', null=True, blank=True, help_text='超过此时间后记忆衰减')
+    retrieval_count = models.IntegerField('检索次数', default=0, help_text='被检索进上下文的次数，用于LFU淘汰')
     metadata = models.JSONField('元数据', default=dict, blank=True)
     created_at = models.DateTimeField('创建时间', auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField('更新时间', auto_now=True)
@@ -246,7 +564,7 @@ class MemoryLibrary(models.Model):
         """检查是否已遗忘"""
         if self.forget_time is None:
             return False
-        return timezone.now() > self.forget_time
+        return clock.now() > self.forget_time
 
 
 class PlannedTask(models.Model):
@@ -297,10 +615,93 @@ class PlannedTask(models.Model):
     def mark_completed(self):
         """标记为已完成"""
         self.status = 'completed'
-        self.completed_at = timezone.now()
+        self.completed_at = clock.now()
         self.save(update_fields=['status', 'completed_at', 'updated_at'])
 
 
+class RawPayload(models.Model):
+    """原始数据冷存储 - 按内容寻址（SHA-256）去重、zlib 压缩保存的 Webhook 原始请求，热表只保存其ID"""
+
+    digest = models.CharField('内容摘要', max_length=64, unique=True, help_text='规范化 JSON 的 SHA-256')
+    data = models.BinaryField('压缩数据', help_text='zlib 压缩的规范化 JSON')
+    size = models.IntegerField('原始字节数', default=0)
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+
+    class Meta:
+        db_table = 'raw_payload'
+        verbose_name = '原始数据'
+        verbose_name_plural = '原始数据'
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.size}字节)"
+
+    @staticmethod
+    def encode(payload: dict) -> bytes:
+        """规范化 JSON 编码（键排序、无多余空白），相同内容得到相同字节"""
+        return json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def store(cls, payload: dict) -> 'RawPayload':
+        """
+        保存原始数据，内容相同的数据只保存一份
+
+        Args:
+            payload: 原始数据
+
+        Returns:
+            RawPayload 实例
+        """
+        raw = cls.encode(payload)
+        digest = hashlib.sha256(raw).hexdigest()
+        raw_payload, _ = cls.objects.get_or_create(
+            digest=digest,
+            defaults={'data': zlib.compress(raw), 'size': len(raw)}
+        )
+        return raw_payload
+
+    def load(self) -> dict:
+        """解压并解析原始数据"""
+        return json.loads(zlib.decompress(bytes(self.data)))
+
+    @classmethod
+    def delete_unreferenced(cls, grace: timedelta = timedelta(hours=1), batch_size: int = 5000) -> int:
+        """
+        分批删除不再被消息记录和回复任务引用的原始数据（归档分区、删除用户或任务后遗留的）
+
+        跳过 grace 之内创建的：刚保存的原始数据可能还在等待引用它的记录提交。
+
+        Args:
+            grace: 只删除创建超过此时长的原始数据
+            batch_size: 每批检查的原始数据条数（每批单独提交）
+
+        Returns:
+            int: 删除的条数
+        """
+        before = clock.now() - grace
+        referenced_by_message = MessageRecord.objects.filter(raw_payload=OuterRef('pk'))
+        referenced_by_task = ReplyTask.objects.filter(raw_payload=OuterRef('pk'))
+
+        last_id = 0
+        deleted = 0
+        while True:
+            window = list(cls.objects.filter(
+                id__gt=last_id, created_at__lt=before
+            ).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not window:
+                break
+            last_id = window[-1]
+
+            with transaction.atomic():
+                orphan_ids = list(cls.objects.filter(id__in=window).filter(
+                    ~Exists(referenced_by_message), ~Exists(referenced_by_task)
+                ).values_list('id', flat=True))
+                if orphan_ids:
+                    # only('id')：删除时不加载压缩数据
+                    deleted += cls.objects.filter(id__in=orphan_ids).only('id').delete()[1].get(cls._meta.label, 0)
+
+        return deleted
+
+
 class ReplyTask(models.Model):
     """回复任务库 - 存储待回复任务"""
 
@@ -331,6 +732,15 @@ class ReplyTask(models.Model):
     retry_count = models.IntegerField('重试次数', default=0)
     error_message = models.TextField('错误信息', blank=True)
     metadata = models.JSONField('元数据', default=dict, blank=True)
+    raw_payload = models.ForeignKey(
+        RawPayload,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_index=False,
+        related_name='+',
+        verbose_name='触发消息原始数据'
+    )
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
     updated_at = models.DateTimeField('更新时间', auto_now=True)
     executed_at = models.DateTimeField('执行时间', null=True, blank=True)
@@ -344,28 +754,68 @@ class ReplyTask(models.Model):
             models.Index(fields=['status', 'scheduled_time']),
             models.Index(fields=['trigger_type', 'status']),
             models.Index(fields=['user', 'status']),
+            # 清理无引用的原始数据时按引用查找（大部分任务没有原始数据，部分索引）
+            models.Index(fields=['raw_payload'], name='reply_task_raw_payload_idx',
+                         condition=Q(raw_payload__isnull=False)),
         ]
 
     def __str__(self):
         return f"{self.user} - {self.get_trigger_type_display()} - {self.scheduled_time.strftime('%Y-%m-%d %H:%M')}"
 
+    def _set_status(self, status: str, update_fields: list):
+        """修改状态并同步用户的待回复任务计数（以内存中的当前状态为变化前状态）"""
+        previous = self.status
+        self.status = status
+        with transaction.atomic():
+            self.save(update_fields=['status', 'updated_at'] + update_fields)
+            ChatUser.update_counters(
+                self.user_id,
+                pending_reply_count=(status == 'pending') - (previous == 'pending')
+            )
+
+    @classmethod
+    def update_status(cls, queryset, status: str, **fields) -> int:
+        """
+        批量修改任务状态（QuerySet.update），并按用户同步待回复任务计数
+
+        Args:
+            queryset: 要修改的任务
+            status: 新状态
+            **fields: 同时更新的其他字段
+
+        Returns:
+            int: 更新的行数
+        """
+        with transaction.atomic():
+            deltas = {}
+            for user_id, previous, total in queryset.order_by().values_list('user_id', 'status').annotate(
+                total=Count('id')
+            ):
+                deltas[user_id] = deltas.get(user_id, 0) + total * ((status == 'pending') - (previous == 'pending'))
+
+            updated = queryset.update(status=status, **fields)
+            for user_id, delta in deltas.items():
+                ChatUser.update_counters(user_id, pending_reply_count=delta)
+        return updated
+
+    def mark_pending(self):
+        """重新标记为待执行（重试）"""
+        self._set_status('pending', [])
+
     def mark_executing(self):
         """标记为执行中"""
-        self.status = 'executing'
-        self.save(update_fields=['status', 'updated_at'])
+        self._set_status('executing', [])
 
     def mark_completed(self):
         """标记为已完成"""
-        self.status = 'completed'
-        self.executed_at = timezone.now()
-        self.save(update_fields=['status', 'executed_at', 'updated_at'])
+        self.executed_at = clock.now()
+        self._set_status('completed', ['executed_at'])
 
     def mark_failed(self, error_message=''):
         """标记为失败"""
-        self.status = 'failed'
         self.error_message = error_message
         self.retry_count += 1
-        self.save(update_fields=['status', 'error_message', 'retry_count', 'updated_at'])
+        self._set_status('failed', ['error_message', 'retry_count'])
 
 
 class MessageRecord(models.Model):
@@ -387,7 +837,16 @@ class MessageRecord(models.Model):
     receiver = models.CharField('接收者', max_length=200, db_index=True)
     content = models.TextField('消息内容')
     timestamp = models.DateTimeField('消息时间', db_index=True)
-    raw_data = models.JSONField('原始数据', default=dict, blank=True, help_text='消息的原始JSON数据')
+    raw_data = models.JSONField('原始数据', default=dict, blank=True, help_text='消息的来源等少量信息，完整原始请求见 raw_payload')
+    raw_payload = models.ForeignKey(
+        RawPayload,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_index=False,
+        related_name='+',
+        verbose_name='原始请求'
+    )
     reply_task = models.ForeignKey(
         ReplyTask,
         on_delete=models.SET_NULL,
@@ -409,7 +868,125 @@ class MessageRecord(models.Model):
             models.Index(fields=['message_type', '-timestamp']),
             models.Index(fields=['sender', '-timestamp']),
             models.Index(fields=['user', '-timestamp']),
+            # 清理无引用的原始数据时按引用查找（发送的消息没有原始数据，部分索引）
+            models.Index(fields=['raw_payload'], name='message_record_raw_payload_idx',
+                         condition=Q(raw_payload__isnull=False)),
         ]
 
     def __str__(self):
         return f"{self.user} - {self.get_message_type_display()} - {self.sender} -> {self.receiver}"
+
+
+class ConversationSummary(models.Model):
+    """对话摘要 - 增量维护的每用户滚动摘要，覆盖最近消息窗口之前的全部对话"""
+
+    user = models.OneToOneField(
+        ChatUser,
+        on_delete=models.CASCADE,
+        related_name='conversation_summary',
+        verbose_name='所属用户'
+    )
+    summary = models.TextField('摘要内容', blank=True)
+    last_message_id = models.BigIntegerField('已摘要至消息ID', default=0,
+                                             help_text='ID不大于此值的消息已折叠进摘要')
+    summarized_count = models.IntegerField('已摘要消息数', default=0)
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+
+    class Meta:
+        db_table = 'conversation_summary'
+        verbose_name = '对话摘要'
+        verbose_name_plural = '对话摘要'
+
+    def __str__(self):
+        return f"{self.user} - 已摘要{self.summarized_count}条消息"
+
+
+class JobCheckpoint(models.Model):
+    """任务检查点 - 存储分批执行的后台任务进度，支持中断后续跑"""
+
+    name = models.CharField('任务名称', max_length=100, unique=True)
+    state = models.JSONField('进度状态', default=dict, blank=True)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+
+    class Meta:
+        db_table = 'job_checkpoint'
+        verbose_name = '任务检查点'
+        verbose_name_plural = '任务检查点'
+
+    def __str__(self):
+        return f"{self.name} - {self.state}"
+
+    @classmethod
+    def load(cls, name: str) -> dict:
+        """读取任务进度，不存在时返回空字典"""
+        checkpoint = cls.objects.filter(name=name).first()
+        return checkpoint.state if checkpoint else {}
+
+    @classmethod
+    def save_state(cls, name: str, state: dict):
+        """保存任务进度"""
+        cls.objects.update_or_create(name=name, defaults={'state': state})
+
+
+class AICallLog(models.Model):
+    """AI 调用记录 - 每次 LLM 调用的调用方、token 用量、耗时和错误（由 AICallLogService 异步批量写入）"""
+
+    user = models.ForeignKey(
+        ChatUser,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='ai_calls',
+        verbose_name='所属用户'
+    )
+    caller = models.CharField('调用方', max_length=50)
+    model = models.CharField('模型', max_length=100)
+    prompt_tokens = models.IntegerField('输入 token', default=0)
+    completion_tokens = models.IntegerField('输出 token', default=0)
+    cached_tokens = models.IntegerField('缓存命中 token', default=0, help_text='输入 token 中命中提示词缓存的部分')
+    latency_ms = models.IntegerField('耗时（毫秒）', default=0)
+    error = models.CharField('错误', max_length=500, blank=True)
+    parse_failed = models.BooleanField('JSON 解析失败', default=False)
+    created_at = models.DateTimeField('调用时间', db_index=True)
+
+    class Meta:
+        db_table = 'ai_call_log'
+        verbose_name = 'AI 调用记录'
+        verbose_name_plural = 'AI 调用记录'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['caller', 'created_at']),
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.caller} - {self.model} - {self.latency_ms}ms"
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class TraceSpan(models.Model):
+    """追踪 span - 一条消息从接收到回复发送的各处理阶段耗时（由 TraceService 异步批量写入）"""
+
+    trace_id = models.CharField('Trace ID', max_length=32)
+    span_id = models.CharField('Span ID', max_length=16)
+    parent_id = models.CharField('父 Span ID', max_length=16, blank=True)
+    name = models.CharField('阶段', max_length=100)
+    started_at = models.DateTimeField('开始时间', db_index=True)
+    duration_ms = models.FloatField('耗时（毫秒）')
+    attributes = models.JSONField('属性', default=dict, blank=True)
+
+    class Meta:
+        db_table = 'trace_span'
+        verbose_name = '追踪 Span'
+        verbose_name_plural = '追踪 Span'
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['trace_id', 'started_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.trace_id[:8]} - {self.name} - {self.duration_ms:.0f}ms"
@@ -0,0 +1,281 @@
+# 按需性能剖析
+# 包裹 Django 视图（ProfilingMiddleware）和每个定时任务（scheduler._instrumented），把单次执行的剖析结果写入
+# PROFILING_DIR（默认 logs/profiles/），只保留最新的 PROFILING_MAX_FILES 个文件。
+#
+# 开启方式（任一）：
+#   - 环境变量 PROFILING_ENABLED=True：按 PROFILING_SAMPLE_RATE 比例剖析全部请求和任务；
+#   - 管理后台「性能剖析」页面临时开启 N 分钟（写入 PROFILING_DIR 下的开关文件，不查询数据库）；
+#   - 请求头 X-Profile：已登录的管理员或携带 PROFILING_TOKEN 的请求总是剖析，响应头 X-Profile-File 返回文件名。
+#
+# PROFILING_MODE=sampling（默认）时由后台线程按 PROFILING_SAMPLE_INTERVAL_MS 采样被剖析线程的调用栈，
+# 输出 speedscope JSON（https://www.speedscope.app 打开即为火焰图），开销与函数调用次数无关；
+# PROFILING_MODE=cprofile 时使用 cProfile 确定性剖析，输出 pstats 文件（python -m pstats / snakeviz 查看）。
+import cProfile
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+# 管理后台开关文件（位于 PROFILING_DIR，同一主机上的各 worker 和调度器共享），及其进程内缓存：(修改时间, 状态)
+TOGGLE_FILE = 'toggle.json'
+_state_cache = (None, {})
+
+# 同一线程中嵌套的执行（如请求中同步执行的后台任务）只剖析最外层
+_local = threading.local()
+
+
+class StackSampler:
+    """采样剖析器：后台线程定期读取目标线程的调用栈，生成 speedscope sampled profile"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.frames = []
+        self.frame_index = {}
+        self.samples = []
+        self.weights = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+
+    def start(self):
+        self._started = self._last = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._ended = time.perf_counter()
+
+    def _frame_id(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self.frame_index.get(key)
+        if index is None:
+            index = self.frame_index[key] = len(self.frames)
+            self.frames.append({'name': code.co_name, 'file': code.co_filename, 'line': code.co_firstlineno})
+        return index
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append((now - self._last) * 1000)
+            self._last = now
+
+    def to_speedscope(self, name: str) -> Dict:
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': (self._ended - self._started) * 1000,
+                'samples': self.samples,
+                'weights': self.weights,
+            }],
+            'name': name,
+            'exporter': 'ruochat',
+        }
+
+
+# ==================== 开关 ====================
+
+def _profiles_dir() -> Path:
+    return Path(getattr(settings, 'PROFILING_DIR', 'logs/profiles'))
+
+
+def _toggle_path() -> Path:
+    return _profiles_dir() / TOGGLE_FILE
+
+
+def get_runtime_state() -> Dict:
+    """管理后台开关状态 {'until': ISO 时间, 'sample_rate': 比例}（开关文件修改后才重新读取）"""
+    global _state_cache
+    path = _toggle_path()
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return {}
+
+    cached_mtime, state = _state_cache
+    if cached_mtime != mtime:
+        try:
+            state = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取性能剖析开关失败: {e}")
+            state = {}
+        _state_cache = (mtime, state)
+    return state
+
+
+def enable(minutes: int, sample_rate: float):
+    """由管理后台临时开启剖析"""
+    path = _toggle_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        'until': (timezone.now() + timedelta(minutes=minutes)).isoformat(),
+        'sample_rate': sample_rate,
+    }), encoding='utf-8')
+
+
+def disable():
+    """关闭管理后台开启的剖析"""
+    _toggle_path().unlink(missing_ok=True)
+
+
+def active_sample_rate() -> float:
+    """当前剖析比例：环境变量开启时为 PROFILING_SAMPLE_RATE，管理后台开启且未过期时取两者较大值，否则为 0"""
+    rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.1) if getattr(settings, 'PROFILING_ENABLED', False) else 0.0
+
+    state = get_runtime_state()
+    until = state.get('until')
+    if until and datetime.fromisoformat(until) > timezone.now():
+        rate = max(rate, state.get('sample_rate', 1.0))
+    return rate
+
+
+# ==================== 剖析 ====================
+
+@contextmanager
+def profile(kind: str, name: str, force: bool = False):
+    """
+    按开关和比例剖析一次执行
+
+    Args:
+        kind: request / job
+        name: 视图路径或任务函数名（用于文件名）
+        force: 忽略开关和比例，总是剖析（X-Profile 请求头）
+
+    Yields:
+        dict: 剖析完成后 'file' 为写入的文件名（未剖析或未达到最短耗时时为 None）
+    """
+    result = {'file': None}
+    if getattr(_local, 'active', False) or not (force or random.random() < active_sample_rate()):
+        yield result
+        return
+
+    mode = getattr(settings, 'PROFILING_MODE', 'sampling')
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = StackSampler(getattr(settings, 'PROFILING_SAMPLE_INTERVAL_MS', 5) / 1000)
+        profiler.start()
+
+    _local.active = True
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        _local.active = False
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if mode == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+
+        if elapsed_ms >= getattr(settings, 'PROFILING_MIN_DURATION_MS', 0):
+            try:
+                result['file'] = _write(profiler, mode, kind, name, elapsed_ms)
+            except Exception as e:
+                logger.error(f"写入剖析结果失败: {e}")
+
+
+def _write(profiler, mode: str, kind: str, name: str, elapsed_ms: float) -> str:
+    directory = _profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    slug = re.sub(r'[^\w-]+', '_', name).strip('_')[:80] or 'root'
+    stem = f"{datetime.now():%Y%m%d-%H%M%S-%f}_{kind}_{slug}_{elapsed_ms:.0f}ms"
+    if mode == 'cprofile':
+        path = directory / f'{stem}.prof'
+        profiler.dump_stats(str(path))
+    else:
+        path = directory / f'{stem}.speedscope.json'
+        path.write_text(json.dumps(profiler.to_speedscope(f'{kind} {name}')), encoding='utf-8')
+
+    logger.info(f"已写入剖析结果 {path.name}（{kind} {name}，耗时 {elapsed_ms:.0f}ms）")
+    _rotate(directory)
+    return path.name
+
+
+def _rotate(directory: Path):
+    """只保留最新的 PROFILING_MAX_FILES 个剖析文件"""
+    max_files = getattr(settings, 'PROFILING_MAX_FILES', 200)
+    files = sorted(_profile_files(directory), key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in files[max_files:]:
+        path.unlink(missing_ok=True)
+
+
+def _profile_files(directory: Path) -> List[Path]:
+    return [p for p in directory.glob('*') if p.suffix == '.prof' or p.name.endswith('.speedscope.json')]
+
+
+def list_profiles(limit: int = 100) -> List[Dict]:
+    """最新的剖析文件 [{'name', 'size', 'modified'}]"""
+    directory = _profiles_dir()
+    if not directory.exists():
+        return []
+    files = sorted(_profile_files(directory), key=lambda p: p.stat().st_mtime, reverse=True)[:limit]
+    return [
+        {'name': p.name, 'size': p.stat().st_size, 'modified': datetime.fromtimestamp(p.stat().st_mtime)}
+        for p in files
+    ]
+
+
+def get_profile_path(name: str) -> Optional[Path]:
+    """按文件名取剖析文件路径（只允许 PROFILING_DIR 下的剖析文件）"""
+    directory = _profiles_dir()
+    path = directory / Path(name).name
+    if path.exists() and path in _profile_files(directory):
+        return path
+    return None
+
+
+class ProfilingMiddleware:
+    """按开关剖析请求；X-Profile 请求头（管理员或 PROFILING_TOKEN）强制剖析并在响应头返回文件名"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            result = stack.enter_context(profile('request', request.path, force=self._forced(request)))
+            response = self.get_response(request)
+            # 流式响应剖析到内容迭代完为止，文件名此时还未确定，不返回 X-Profile-File
+            metrics.call_on_close(response, stack.pop_all().close)
+        if result['file']:
+            response['X-Profile-File'] = result['file']
+        return response
+
+    @staticmethod
+    def _forced(request) -> bool:
+        header = request.headers.get('X-Profile')
+        if not header:
+            return False
+        token = getattr(settings, 'PROFILING_TOKEN', '')
+        if token and header == token:
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_authenticated and user.is_staff)
@@ -0,0 +1,137 @@
+# 数据库查询统计
+# 通过 connection.execute_wrapper 统计每个 HTTP 请求（QueryStatsMiddleware）和每次定时任务执行
+# （scheduler._instrumented）的查询数、数据库总耗时、最慢的若干条语句和重复次数最多的语句，
+# 写入 /metrics（按视图名 / 任务函数名），超过 QUERY_BUDGET_* 预算时记录警告日志。
+#
+# Django 传给 execute_wrapper 的是带占位符的 SQL，同一条语句的不同参数会归为一条，
+# 因此「重复次数最多的语句」可以直接指出循环中逐条查询（N+1）的位置。
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+# 每次执行最多记录的不同语句数（长时间运行的任务不无限增长）
+MAX_DISTINCT_STATEMENTS = 1000
+
+# 日志中 SQL 的最大长度
+SQL_PREVIEW_LENGTH = 300
+
+
+class QueryStats:
+    """一次执行的查询统计（作为 execute_wrapper 安装到当前线程的数据库连接上）"""
+
+    def __init__(self, name: str = '', top_n: int = 5):
+        self.name = name
+        self.top_n = top_n
+        self.count = 0
+        self.duration = 0.0
+        self.slowest: List[Tuple[float, str]] = []  # (耗时秒, SQL)，按耗时降序
+        self.repeats: Dict[str, int] = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self._add(sql, time.perf_counter() - started)
+
+    def _add(self, sql: str, elapsed: float):
+        self.count += 1
+        self.duration += elapsed
+
+        if len(self.slowest) < self.top_n or elapsed > self.slowest[-1][0]:
+            self.slowest.append((elapsed, sql))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.top_n:]
+
+        if sql in self.repeats or len(self.repeats) < MAX_DISTINCT_STATEMENTS:
+            self.repeats[sql] = self.repeats.get(sql, 0) + 1
+
+    def most_repeated(self) -> Optional[Tuple[str, int]]:
+        """重复次数最多的语句 (SQL, 次数)，没有重复时返回 None"""
+        if not self.repeats:
+            return None
+        sql, times = max(self.repeats.items(), key=lambda item: item[1])
+        return (sql, times) if times > 1 else None
+
+
+def _budgets(kind: str) -> Tuple[int, float]:
+    """(查询数预算, 耗时预算 ms)，0 表示不限"""
+    if kind == 'request':
+        return (getattr(settings, 'QUERY_BUDGET_REQUEST_COUNT', 50),
+                getattr(settings, 'QUERY_BUDGET_REQUEST_MS', 500))
+    return (getattr(settings, 'QUERY_BUDGET_JOB_COUNT', 1000),
+            getattr(settings, 'QUERY_BUDGET_JOB_MS', 10000))
+
+
+@contextmanager
+def collect(kind: str, name: str = ''):
+    """
+    统计块内当前线程的数据库查询，结束时写入指标并检查预算
+
+    Args:
+        kind: request / job
+        name: 视图名或任务函数名（指标标签）；请求的视图名要在执行后才能确定，可在块内写入 stats.name
+
+    Yields:
+        QueryStats: 本次执行的统计
+    """
+    stats = QueryStats(name, getattr(settings, 'QUERY_STATS_TOP_N', 5))
+    if not getattr(settings, 'QUERY_STATS_ENABLED', True):
+        yield stats
+        return
+
+    try:
+        with connection.execute_wrapper(stats):
+            yield stats
+    finally:
+        _report(kind, stats)
+
+
+def _report(kind: str, stats: QueryStats):
+    name = stats.name or 'unknown'
+    metrics.DB_QUERIES.labels(kind=kind, name=name).observe(stats.count)
+    metrics.DB_SECONDS.labels(kind=kind, name=name).observe(stats.duration)
+
+    count_budget, ms_budget = _budgets(kind)
+    duration_ms = stats.duration * 1000
+    exceeded = []
+    if count_budget and stats.count > count_budget:
+        exceeded.append(f"查询数 {stats.count} > {count_budget}")
+    if ms_budget and duration_ms > ms_budget:
+        exceeded.append(f"数据库耗时 {duration_ms:.0f}ms > {ms_budget:g}ms")
+    if not exceeded:
+        return
+
+    metrics.DB_BUDGET_EXCEEDED.labels(kind=kind, name=name).inc()
+    lines = [f"{'请求' if kind == 'request' else '任务'} {name} 超出查询预算：{'，'.join(exceeded)}"]
+    repeated = stats.most_repeated()
+    if repeated:
+        lines.append(f"  重复最多（{repeated[1]} 次）: {repeated[0][:SQL_PREVIEW_LENGTH]}")
+    for elapsed, sql in stats.slowest:
+        lines.append(f"  {elapsed * 1000:.1f}ms: {sql[:SQL_PREVIEW_LENGTH]}")
+    logger.warning('\n'.join(lines))
+
+
+class QueryStatsMiddleware:
+    """按视图名统计每个请求的数据库查询（流式响应统计到内容迭代完为止）"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            stats = stack.enter_context(collect('request'))
+            response = self.get_response(request)
+            # 用路由名而不是路径作为标签，避免 ID 等路径参数导致标签无限增长
+            match = getattr(request, 'resolver_match', None)
+            stats.name = (match.view_name or match._func_path) if match else 'unmatched'
+            metrics.call_on_close(response, stack.pop_all().close)
+        return response
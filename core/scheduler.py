@@ -1,16 +1,23 @@
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+from functools import wraps
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from django.conf import settings
 from django.utils import timezone
 
+from core import clock, metrics, profiling, querystats, tracing
+
 logger = logging.getLogger(__name__)
 
 # 全局调度器实例
 _scheduler = None
 
+# 调度器心跳：由心跳任务定期刷新，健康检查据此判断调度线程和线程池是否仍在工作
+_last_heartbeat = None
+
 
 def start_scheduler():
     """启动APScheduler定时任务调度器"""
@@ -26,9 +33,11 @@ def start_scheduler():
 
         # 添加定时任务
         _add_scheduled_jobs(_scheduler)
+        metrics.watch_scheduler(_scheduler)
 
         # 启动调度器
         _scheduler.start()
+        record_scheduler_heartbeat()
 
         logger.info("定时任务调度器启动成功")
         return _scheduler
@@ -38,12 +47,28 @@ def start_scheduler():
         raise
 
 
+def _instrumented(func):
+    """包装任务函数：记录每次执行的耗时和数据库查询（/metrics），按开关剖析（logs/profiles/）"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.monotonic()
+        outcome = 'error'
+        try:
+            with querystats.collect('job', func.__name__), profiling.profile('job', func.__name__):
+                result = func(*args, **kwargs)
+            outcome = 'success'
+            return result
+        finally:
+            metrics.SCHEDULER_JOB_SECONDS.labels(job=func.__name__, outcome=outcome).observe(time.monotonic() - started)
+    return wrapper
+
+
 def _add_scheduled_jobs(scheduler: BackgroundScheduler):
     """添加所有定时任务"""
 
     # 任务1：每日00:00 - 为所有用户生成全天计划任务
     scheduler.add_job(
-        func=generate_daily_planned_tasks_for_all_users,
+        func=_instrumented(generate_daily_planned_tasks_for_all_users),
         trigger=CronTrigger(hour=0, minute=0),
         id='daily_planning_00_00',
         name='每日00:00生成全天计划任务',
@@ -53,7 +78,7 @@ def _add_scheduled_jobs(scheduler: BackgroundScheduler):
 
     # 任务2：每日00:05 - 为所有用户生成全天自动触发消息
     scheduler.add_job(
-        func=generate_autonomous_messages_for_all_users,
+        func=_instrumented(generate_autonomous_messages_for_all_users),
         trigger=CronTrigger(hour=0, minute=5),
         id='autonomous_messages_00_05',
         name='每日00:05生成全天自动触发消息',
@@ -63,7 +88,7 @@ def _add_scheduled_jobs(scheduler: BackgroundScheduler):
 
     # 任务3：每分钟检查并执行回复任务
     scheduler.add_job(
-        func=execute_pending_reply_tasks,
+        func=_instrumented(execute_pending_reply_tasks),
         trigger=IntervalTrigger(minutes=1),
         id='execute_reply_tasks',
         name='每分钟执行待回复任务',
@@ -71,6 +96,133 @@ def _add_scheduled_jobs(scheduler: BackgroundScheduler):
     )
     logger.info("已添加任务：每分钟执行待回复任务")
 
+    # 任务4：每日03:00 - 清理超出容量上限的记忆
+    scheduler.add_job(
+        func=_instrumented(enforce_memory_limits_for_all_users),
+        trigger=CronTrigger(hour=3, minute=0),
+        id='memory_limit_03_00',
+        name='每日03:00清理超出容量的记忆',
+        replace_existing=True,
+    )
+    logger.info("已添加任务：每日03:00清理超出容量的记忆")
+
+    # 任务5：每日01:30-05:30每小时 - 分批整合用户零散记忆
+    scheduler.add_job(
+        func=_instrumented(consolidate_memories_batch),
+        trigger=CronTrigger(hour='1-5', minute=30),
+        id='memory_consolidation',
+        name='夜间分批整合用户记忆',
+        replace_existing=True,
+    )
+    logger.info("已添加任务：夜间分批整合用户记忆")
+
+    # 任务6：每10分钟 - 增量聚合情绪汇总表
+    scheduler.add_job(
+        func=_instrumented(aggregate_emotion_rollups),
+        trigger=IntervalTrigger(minutes=10),
+        id='emotion_rollup',
+        name='每10分钟聚合情绪汇总',
+        replace_existing=True,
+    )
+    logger.info("已添加任务：每10分钟聚合情绪汇总")
+
+    # 任务7：每小时 - 当前情绪向基线情绪衰减
+    scheduler.add_job(
+        func=_instrumented(decay_emotions_for_all_users),
+        trigger=CronTrigger(minute=15),
+        id='emotion_time_decay',
+        name='每小时情绪时间衰减',
+        replace_existing=True,
+    )
+    logger.info("已添加任务：每小时情绪时间衰减")
+
+    # 任务8：每日06:00 - 初始化所有用户当日情绪
+    scheduler.add_job(
+        func=_instrumented(init_daily_emotions_for_all_users),
+        trigger=CronTrigger(hour=6, minute=0),
+        id='emotion_daily_init_06_00',
+        name='每日06:00初始化当日情绪',
+        replace_existing=True,
+    )
+    logger.info("已添加任务：每日06:00初始化当日情绪")
+
+    # 任务9：每日00:30 - 预建消息记录的未来月分区
+    scheduler.add_job(
+        func=_instrumented(ensure_message_partitions),
+        trigger=CronTrigger(hour=0, minute=30),
+        id='message_partitions_00_30',
+        name='每日00:30预建消息记录分区',
+        replace_existing=True,
+    )
+    logger.info("已添加任务：每日00:30预建消息记录分区")
+
+    # 任务10：定期刷新系统统计快照（状态接口和 system_status 命令读取快照）
+    stats_refresh_minutes = getattr(settings, 'SYSTEM_STATS_REFRESH_MINUTES', 5)
+    scheduler.add_job(
+        func=_instrumented(refresh_system_stats),
+        trigger=IntervalTrigger(minutes=stats_refresh_minutes),
+        id='refresh_system_stats',
+        name=f'每{stats_refresh_minutes}分钟刷新系统统计快照',
+        replace_existing=True,
+    )
+    logger.info(f"已添加任务：每{stats_refresh_minutes}分钟刷新系统统计快照")
+
+    # 任务11：调度器心跳（供 /healthz 检查调度器存活）
+    scheduler.add_job(
+        func=_instrumented(record_scheduler_heartbeat),
+        trigger=IntervalTrigger(seconds=30),
+        id='scheduler_heartbeat',
+        name='每30秒记录调度器心跳',
+        replace_existing=True,
+    )
+    logger.info("已添加任务：每30秒记录调度器心跳")
+
+    # 任务12：定期批量写入缓冲中的记录（AI 调用记录、追踪 span），间隔取两者中较短的
+    flush_seconds = min(getattr(settings, 'AI_CALL_LOG_FLUSH_SECONDS', 10), getattr(settings, 'TRACE_FLUSH_SECONDS', 10))
+    scheduler.add_job(
+        func=_instrumented(flush_buffered_writes),
+        trigger=IntervalTrigger(seconds=flush_seconds),
+        id='flush_buffered_writes',
+        name=f'每{flush_seconds}秒写入缓冲中的记录',
+        replace_existing=True,
+    )
+    logger.info(f"已添加任务：每{flush_seconds}秒写入缓冲中的记录")
+
+    # 任务13：每日04:30 - 删除过期的追踪 span
+    scheduler.add_job(
+        func=_instrumented(cleanup_trace_spans),
+        trigger=CronTrigger(hour=4, minute=30),
+        id='cleanup_trace_spans',
+        name='每日04:30清理过期追踪span',
+        replace_existing=True,
+    )
+    logger.info("已添加任务：每日04:30清理过期追踪span")
+
+    # 任务14：每日04:45 - 删除不再被引用的原始数据
+    scheduler.add_job(
+        func=_instrumented(cleanup_raw_payloads),
+        trigger=CronTrigger(hour=4, minute=45),
+        id='cleanup_raw_payloads',
+        name='每日04:45清理无引用的原始数据',
+        replace_existing=True,
+    )
+    logger.info("已添加任务：每日04:45清理无引用的原始数据")
+
+
+def _get_users_for_daily_generation():
+    """
+    获取需要生成每日计划和自主消息的活跃用户
+
+    配置 SCHEDULER_INACTIVE_USER_DAYS 后，跳过超过该天数没有发来消息的用户（读取 ChatUser.last_message_at）。
+    """
+    from core.models import ChatUser
+
+    users = ChatUser.objects.filter(is_active=True)
+    inactive_days = getattr(settings, 'SCHEDULER_INACTIVE_USER_DAYS', 0)
+    if inactive_days > 0:
+        users = users.filter(last_message_at__gte=clock.now() - timedelta(days=inactive_days))
+    return users
+
 
 def generate_daily_planned_tasks_for_all_users():
     """
@@ -79,10 +231,8 @@ def generate_daily_planned_tasks_for_all_users():
     try:
         logger.info("开始为所有用户生成每日计划任务...")
 
-        from core.models import ChatUser
-
         # 获取所有活跃用户
-        active_users = ChatUser.objects.filter(is_active=True)
+        active_users = _get_users_for_daily_generation()
         total_users = active_users.count()
 
         if total_users == 0:
@@ -154,10 +304,8 @@ def generate_autonomous_messages_for_all_users():
     try:
         logger.info("开始为所有用户生成自主触发消息...")
 
-        from core.models import ChatUser
-
         # 获取所有活跃用户
-        active_users = ChatUser.objects.filter(is_active=True)
+        active_users = _get_users_for_daily_generation()
         total_users = active_users.count()
 
         if total_users == 0:
@@ -213,7 +361,7 @@ def generate_autonomous_messages(user):
                 scheduled_time=msg_data['scheduled_time'],
                 status='pending',
                 context={
-                    'generated_at': datetime.now().isoformat(),
+                    'generated_at': clock.local_now().isoformat(),
                     'task_context': 'autonomous_daily',
                 }
             )
@@ -238,12 +386,11 @@ def execute_pending_reply_tasks():
     """
     try:
         from core.models import ReplyTask, MessageRecord
-        from django.utils import timezone
         from django.db import transaction
         from collections import defaultdict
         from datetime import timedelta
 
-        now = timezone.now()
+        now = clock.now()
 
         # 使用数据库事务和行级锁防止重复执行
         with transaction.atomic():
@@ -272,7 +419,7 @@ def execute_pending_reply_tasks():
 
             # 立即标记为执行中，防止其他进程再次获取
             task_ids = [t.id for t in pending_tasks]
-            ReplyTask.objects.filter(id__in=task_ids).update(status='executing')
+            ReplyTask.update_status(ReplyTask.objects.filter(id__in=task_ids), 'executing')
 
         # 按用户分组任务
         tasks_by_user = defaultdict(list)
@@ -301,7 +448,9 @@ def execute_pending_reply_tasks():
 
 def _execute_user_tasks(user, tasks, webhook, ai_service):
     """
-    执行单个用户的所有待发送任务
+    执行单个用户的所有待发送任务（在第一个任务的 trace 中记录整合和发送，没有 trace 的自主消息开启新 trace）
+
+    各任务从创建到计划时间的等待、从计划时间到实际执行的排队延迟记入各自消息的 trace。
 
     Args:
         user: ChatUser 对象
@@ -309,9 +458,33 @@ def _execute_user_tasks(user, tasks, webhook, ai_service):
         webhook: Webhook 服务
         ai_service: AI 服务
     """
+    now = clock.now()
+    trace_ids = []
+    for task in tasks:
+        trace_id = (task.context or {}).get('trace_id')
+        if not trace_id:
+            continue
+        trace_ids.append(trace_id)
+        tracing.record_span(
+            'reply.scheduled_delay', task.created_at,
+            max((task.scheduled_time - task.created_at).total_seconds() * 1000, 0),
+            trace_id=trace_id, task_id=task.id,
+        )
+        lag_ms = (now - task.scheduled_time).total_seconds() * 1000
+        tracing.record_span(
+            'reply.queue_lag', task.scheduled_time, max(lag_ms, 0), trace_id=trace_id,
+            task_id=task.id, merged_tasks=len(tasks), **({'early_ms': round(-lag_ms)} if lag_ms < 0 else {}),
+        )
+
+    with tracing.trace(trace_ids[0] if trace_ids else None), \
+            tracing.span('reply.deliver', user=user.pk, tasks=len(tasks)):
+        _deliver_user_tasks(user, tasks, webhook, ai_service, trace_ids)
+
+
+def _deliver_user_tasks(user, tasks, webhook, ai_service, trace_ids):
+    """整合并发送单个用户的待发送任务，记录发送的消息"""
     from core.models import MessageRecord
     from core.services.context_service import ContextService
-    from django.utils import timezone
 
     if not webhook.enabled:
         logger.warning("Webhook 服务未启用，无法发送消息")
@@ -329,7 +502,8 @@ def _execute_user_tasks(user, tasks, webhook, ai_service):
         logger.info(f"用户 {user} 有 {len(messages)} 条待发送消息，正在整合...")
         # 获取上下文（计划任务和情绪状态）
         context_service = ContextService()
-        context = context_service.get_message_merge_context(user)
+        with tracing.span('context.merge'):
+            context = context_service.get_message_merge_context(user)
         merged_content = ai_service.merge_messages(user, messages, context)
     else:
         merged_content = messages[0]
@@ -358,12 +532,12 @@ def _execute_user_tasks(user, tasks, webhook, ai_service):
             sender='我',
             receiver=str(user_ids),
             content=merged_content,
-            timestamp=timezone.now(),
+            timestamp=clock.now(),
             reply_task=tasks[0],  # 关联第一个任务
             raw_data={
                 'merged_from_tasks': [t.id for t in tasks],
-                'original_messages': messages,
             },
+            metadata=_sent_trace_metadata(tracing.current_trace_id(), trace_ids),
         )
 
         logger.info(f"用户 {user} 的 {len(tasks)} 条任务已整合发送完成")
@@ -373,12 +547,252 @@ def _execute_user_tasks(user, tasks, webhook, ai_service):
             task.mark_failed("消息发送失败")
             # 重试逻辑
             if task.retry_count < 3:
-                task.status = 'pending'
-                task.save(update_fields=['status'])
+                task.mark_pending()
 
         logger.error(f"用户 {user} 的消息发送失败")
 
 
+def _sent_trace_metadata(trace_id, trace_ids) -> dict:
+    """发送消息记录的追踪信息：trace_id 为发送所在的 trace，整合了多条消息时 trace_ids 为全部来源 trace"""
+    if not trace_id:
+        return {}
+    metadata = {'trace_id': trace_id}
+    if len(trace_ids) > 1:
+        metadata['trace_ids'] = trace_ids
+    return metadata
+
+
+def enforce_memory_limits_for_all_users():
+    """
+    每日03:00执行：清理所有超出容量上限的用户记忆
+    """
+    try:
+        from core.services.memory_service import get_memory_service
+
+        deleted = get_memory_service().enforce_limit_for_all_users()
+        logger.info(f"记忆容量清理完成，共淘汰 {deleted} 条记忆")
+
+    except Exception as e:
+        logger.error(f"清理超出容量的记忆失败: {e}", exc_info=True)
+
+
+def consolidate_memories_batch():
+    """
+    每日01:30-05:30每小时执行：分批整合用户零散记忆
+
+    每批处理 MEMORY_CONSOLIDATION_BATCH_USERS 个记忆较多的用户，处理完一个用户即保存检查点，
+    下一批从检查点继续；所有用户处理完后检查点归零并记录完成时间，当晚剩余的批次跳过，
+    下一晚再开始新一轮（用户较少时一晚只整合一遍，不会反复把同一批记忆交给 LLM）。
+    """
+    checkpoint_name = 'memory_consolidation'
+
+    try:
+        from core.models import ChatUser, JobCheckpoint
+        from core.services.ai_service import AIService
+        from core.services.memory_service import get_memory_service
+        from django.db.models import Count, Q
+
+        min_memories = getattr(settings, 'MEMORY_CONSOLIDATION_MIN_MEMORIES', 30)
+        batch_size = getattr(settings, 'MEMORY_CONSOLIDATION_BATCH_USERS', 20)
+
+        checkpoint = JobCheckpoint.load(checkpoint_name)
+        last_user_id = checkpoint.get('last_user_id', 0)
+
+        completed_at = checkpoint.get('cycle_completed_at')
+        if completed_at and last_user_id == 0:
+            # 整合窗口在零点之后，同一本地日期即同一晚
+            completed_on = timezone.localtime(datetime.fromisoformat(completed_at)).date()
+            if completed_on == clock.local_now().date():
+                logger.info("记忆整合：本轮已在今晚完成，下一晚再开始新一轮")
+                return
+
+        # 先用冗余的记忆计数器缩小范围，再精确统计 user_memory 条数
+        users = list(ChatUser.objects.filter(
+            is_active=True,
+            id__gt=last_user_id,
+            memory_count__gte=min_memories
+        ).annotate(
+            memory_total=Count('memories', filter=Q(memories__memory_type='user_memory'))
+        ).filter(memory_total__gte=min_memories).order_by('id')[:batch_size])
+
+        if not users:
+            JobCheckpoint.save_state(checkpoint_name, {
+                'last_user_id': 0,
+                'cycle_completed_at': clock.now().isoformat(),
+            })
+            logger.info("记忆整合：本轮所有用户已处理完毕")
+            return
+
+        logger.info(f"记忆整合：本批处理 {len(users)} 个用户（从用户ID {last_user_id} 之后开始）")
+
+        memory_service = get_memory_service()
+        ai_service = AIService()
+        total_consolidated = checkpoint.get('consolidated_count', 0)
+
+        for user in users:
+            try:
+                total_consolidated += memory_service.consolidate_user_memories(user, ai_service)
+            except Exception as e:
+                logger.error(f"整合用户 {user} 的记忆失败: {e}")
+
+            JobCheckpoint.save_state(checkpoint_name, {
+                'last_user_id': user.id,
+                'consolidated_count': total_consolidated,
+            })
+
+        logger.info(f"记忆整合本批完成，本轮累计整合 {total_consolidated} 条记忆")
+
+    except Exception as e:
+        logger.error(f"分批整合记忆失败: {e}", exc_info=True)
+
+
+def aggregate_emotion_rollups():
+    """
+    每10分钟执行：将新增的情绪记录增量聚合到按小时/按天的汇总表
+    """
+    try:
+        from core.services.rollup_service import get_rollup_service
+
+        get_rollup_service().aggregate_new_records()
+
+    except Exception as e:
+        logger.error(f"聚合情绪汇总失败: {e}", exc_info=True)
+
+
+def decay_emotions_for_all_users():
+    """
+    每小时执行：所有用户的当前情绪按半衰期向基线情绪衰减
+    """
+    try:
+        from core.services.emotion_decay_service import get_emotion_decay_service
+
+        get_emotion_decay_service().decay_all(trigger_source='time_decay')
+
+    except Exception as e:
+        logger.error(f"情绪时间衰减失败: {e}", exc_info=True)
+
+
+def init_daily_emotions_for_all_users():
+    """
+    每日06:00执行：为所有活跃用户写入当日起始情绪
+    """
+    try:
+        from core.services.emotion_decay_service import get_emotion_decay_service
+
+        get_emotion_decay_service().decay_all(trigger_source='daily_init')
+
+    except Exception as e:
+        logger.error(f"初始化当日情绪失败: {e}", exc_info=True)
+
+
+def ensure_message_partitions():
+    """
+    每日00:30执行：确保消息记录当前月及之后几个月的分区存在（非分区表时跳过）
+    """
+    try:
+        from core.services.partition_service import get_partition_service
+
+        months_ahead = getattr(settings, 'MESSAGE_PARTITION_MONTHS_AHEAD', 3)
+        get_partition_service().ensure_future_partitions(months_ahead)
+
+    except Exception as e:
+        logger.error(f"预建消息记录分区失败: {e}", exc_info=True)
+
+
+def refresh_system_stats():
+    """
+    定期执行：重新统计并保存系统统计快照（大表使用估算值）
+    """
+    try:
+        from core.services.stats_service import get_stats_service
+
+        get_stats_service().refresh_snapshot()
+
+    except Exception as e:
+        logger.error(f"刷新系统统计快照失败: {e}", exc_info=True)
+
+
+def record_scheduler_heartbeat():
+    """每30秒执行：记录调度器心跳时间"""
+    global _last_heartbeat
+    _last_heartbeat = clock.now()
+
+
+def flush_buffered_writes(name: str = None):
+    """
+    定期或缓冲写满时执行：批量写入缓冲中的记录（见 core.buffering）
+
+    Args:
+        name: 只写入指定缓冲，默认全部
+    """
+    try:
+        from core import buffering
+
+        buffering.flush(name)
+
+    except Exception as e:
+        logger.error(f"写入缓冲中的记录失败: {e}", exc_info=True)
+
+
+def cleanup_trace_spans():
+    """每日04:30执行：删除超过保留天数的追踪 span"""
+    try:
+        from core.services.trace_service import get_trace_service
+
+        get_trace_service().cleanup()
+
+    except Exception as e:
+        logger.error(f"清理追踪span失败: {e}", exc_info=True)
+
+
+def cleanup_raw_payloads():
+    """每日04:45执行：删除不再被消息记录和回复任务引用的原始数据"""
+    try:
+        from core.models import RawPayload
+
+        deleted = RawPayload.delete_unreferenced()
+        if deleted:
+            logger.info(f"已删除 {deleted} 条无引用的原始数据")
+
+    except Exception as e:
+        logger.error(f"清理原始数据失败: {e}", exc_info=True)
+
+
+def update_conversation_summary(user_id: int):
+    """
+    后台执行：将用户较早的对话折叠进滚动摘要
+
+    Args:
+        user_id: ChatUser 主键
+    """
+    try:
+        from core.models import ChatUser
+        from core.services.summary_service import get_summary_service
+
+        user = ChatUser.objects.get(id=user_id)
+        get_summary_service().update_summary(user)
+
+    except Exception as e:
+        logger.error(f"更新用户 {user_id} 的对话摘要失败: {e}", exc_info=True)
+
+
+def run_in_background(func, job_id: str, *args):
+    """
+    提交一次性后台任务，相同 job_id 的未执行任务会被替换（去重）
+
+    调度器未运行时（如管理命令中）直接同步执行。
+
+    Args:
+        func: 任务函数
+        job_id: 任务ID
+        *args: 任务参数
+    """
+    if _scheduler is not None and _scheduler.running:
+        _scheduler.add_job(func=_instrumented(func), args=args, id=job_id, replace_existing=True)
+    else:
+        func(*args)
+
+
 def stop_scheduler():
     """停止调度器"""
     global _scheduler
@@ -388,7 +802,33 @@ def stop_scheduler():
         logger.info("调度器已停止")
         _scheduler = None
 
+    # 写入关闭前仍在缓冲中的 AI 调用记录和追踪 span
+    flush_buffered_writes()
+
 
 def get_scheduler():
     """获取调度器实例"""
     return _scheduler
+
+
+def get_scheduler_health() -> dict:
+    """
+    检查当前进程内调度器的存活状态
+
+    调度器在运行且心跳未超时（SCHEDULER_HEARTBEAT_TIMEOUT 秒）才视为健康；
+    心跳超时说明调度线程卡住或线程池被占满，定时任务已无法按时执行。
+
+    Returns:
+        dict: {'ok', 'running', 'heartbeat_age'}
+    """
+    running = _scheduler is not None and _scheduler.running
+    heartbeat_age = None
+    if _last_heartbeat is not None:
+        heartbeat_age = round((clock.now() - _last_heartbeat).total_seconds(), 1)
+
+    timeout = getattr(settings, 'SCHEDULER_HEARTBEAT_TIMEOUT', 120)
+    return {
+        'ok': running and heartbeat_age is not None and heartbeat_age <= timeout,
+        'running': running,
+        'heartbeat_age': heartbeat_age,
+    }
@@ -0,0 +1,209 @@
+"""
+AI 调用记录服务 - 记录每次 LLM 调用的调用方、用户、token 用量、耗时和错误，并按调用方/用户/天汇总
+
+AIService._call_openai 每次调用后把记录交给 core.buffering 缓冲，由后台批量写入，请求线程不等待数据库
+（批大小和间隔见 AI_CALL_LOG_BATCH_SIZE / AI_CALL_LOG_FLUSH_SECONDS）。
+
+汇总时 PostgreSQL 上用 percentile_cont 在数据库内计算延迟分位数，其他数据库取出耗时后在 Python 中计算。
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Aggregate, Avg, Count, FloatField, Max, Q, Sum
+from django.db.models.functions import TruncDate
+
+from core import clock
+from core.buffering import BufferedBulkWriter
+
+logger = logging.getLogger(__name__)
+
+
+class PercentileCont(Aggregate):
+    """PostgreSQL 有序集聚合 percentile_cont(fraction) WITHIN GROUP (ORDER BY expression)"""
+
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, fraction: float, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+class AICallLogService:
+    """AI 调用记录服务"""
+
+    # 汇总维度: 分组字段
+    GROUPINGS = {
+        'caller': ('caller',),
+        'user': ('user__user_id',),
+        'caller_day': ('day', 'caller'),
+        'user_day': ('day', 'user__user_id'),
+    }
+
+    PERCENTILES = (50, 95)
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'AI_CALL_LOG_ENABLED', True)
+        self.prices = {
+            'input': getattr(settings, 'AI_PRICE_INPUT_PER_MTOK', 0),
+            'cached_input': getattr(settings, 'AI_PRICE_CACHED_INPUT_PER_MTOK', 0),
+            'output': getattr(settings, 'AI_PRICE_OUTPUT_PER_MTOK', 0),
+        }
+        self.writer = BufferedBulkWriter(
+            'ai_call_log', 'AI 调用记录',
+            batch_size=getattr(settings, 'AI_CALL_LOG_BATCH_SIZE', 50),
+            flush_seconds=getattr(settings, 'AI_CALL_LOG_FLUSH_SECONDS', 10),
+            max_buffer=getattr(settings, 'AI_CALL_LOG_MAX_BUFFER', 10000),
+        )
+
+    # ==================== 记录 ====================
+
+    def record(self, caller: str, model: str, usage: Optional[Dict] = None, latency_ms: float = 0,
+               user=None, error: str = '', parse_failed: bool = False):
+        """
+        记录一次 AI 调用（只放入内存缓冲，不访问数据库）
+
+        Args:
+            caller: 调用方
+            model: 模型名
+            usage: OpenAI 返回的 usage（model_dump() 后的字典），含 prompt_tokens_details.cached_tokens
+            latency_ms: 耗时（毫秒）
+            user: 所属 ChatUser
+            error: 调用失败时的错误信息
+            parse_failed: 响应是否无法解析为 JSON
+        """
+        from core.models import AICallLog
+
+        usage = usage or {}
+        details = usage.get('prompt_tokens_details') or {}
+        entry = AICallLog(
+            user_id=getattr(user, 'pk', None),
+            caller=caller[:50],
+            model=(model or '')[:100],
+            prompt_tokens=usage.get('prompt_tokens') or 0,
+            completion_tokens=usage.get('completion_tokens') or 0,
+            cached_tokens=details.get('cached_tokens') or 0,
+            latency_ms=round(latency_ms),
+            error=(error or '')[:500],
+            parse_failed=parse_failed,
+            created_at=clock.now(),
+        )
+
+        status = '失败' if error else '解析失败' if parse_failed else '成功'
+        logger.info(
+            f"AI 调用 {caller} {status}：耗时 {entry.latency_ms}ms，"
+            f"token 输入 {entry.prompt_tokens}（缓存 {entry.cached_tokens}）/ 输出 {entry.completion_tokens}"
+        )
+
+        if self.enabled:
+            self.writer.add(entry)
+
+    # ==================== 汇总 ====================
+
+    def summarize(self, queryset=None, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  group_by: str = 'caller', limit: Optional[int] = None) -> List[Dict]:
+        """
+        按调用方 / 用户 / 天汇总调用次数、错误数、token 用量、延迟分位数和费用
+
+        Args:
+            queryset: 要汇总的 AICallLog 查询集（默认全部，如管理后台传入当前筛选结果）
+            since / until: 按调用时间过滤，[since, until)
+            group_by: caller / user / caller_day / user_day
+            limit: 最多返回的分组数（按天降序、调用次数降序）
+
+        Returns:
+            List[Dict]: 每个分组一行，含 calls, errors, parse_failures, prompt_tokens, completion_tokens,
+                        cached_tokens, total_tokens, avg_latency_ms, max_latency_ms, p50_latency_ms,
+                        p95_latency_ms, cost（未配置价格时为 None）
+        """
+        from core.models import AICallLog
+
+        if group_by not in self.GROUPINGS:
+            raise ValueError(f"不支持的汇总维度: {group_by}，可选: {', '.join(self.GROUPINGS)}")
+        keys = self.GROUPINGS[group_by]
+
+        if queryset is None:
+            queryset = AICallLog.objects.all()
+        if since:
+            queryset = queryset.filter(created_at__gte=since)
+        if until:
+            queryset = queryset.filter(created_at__lt=until)
+        if 'day' in keys:
+            queryset = queryset.annotate(day=TruncDate('created_at'))
+
+        aggregates = {
+            'calls': Count('id'),
+            'errors': Count('id', filter=~Q(error='')),
+            'parse_failures': Count('id', filter=Q(parse_failed=True)),
+            'sum_prompt_tokens': Sum('prompt_tokens'),
+            'sum_completion_tokens': Sum('completion_tokens'),
+            'sum_cached_tokens': Sum('cached_tokens'),
+            'avg_latency_ms': Avg('latency_ms'),
+            'max_latency_ms': Max('latency_ms'),
+        }
+        in_database = connection.vendor == 'postgresql'
+        if in_database:
+            for p in self.PERCENTILES:
+                aggregates[f'p{p}_latency_ms'] = PercentileCont('latency_ms', p / 100)
+
+        ordering = (['-day'] if 'day' in keys else []) + ['-calls']
+        rows = queryset.order_by().values(*keys).annotate(**aggregates).order_by(*ordering)
+        if limit:
+            rows = rows[:limit]
+        rows = list(rows)
+
+        if not in_database:
+            self._fill_percentiles(queryset, keys, rows)
+
+        for row in rows:
+            row['prompt_tokens'] = row.pop('sum_prompt_tokens') or 0
+            row['completion_tokens'] = row.pop('sum_completion_tokens') or 0
+            row['cached_tokens'] = row.pop('sum_cached_tokens') or 0
+            row['total_tokens'] = row['prompt_tokens'] + row['completion_tokens']
+            row['avg_latency_ms'] = round(row['avg_latency_ms'] or 0, 1)
+            for p in self.PERCENTILES:
+                value = row.get(f'p{p}_latency_ms')
+                row[f'p{p}_latency_ms'] = round(value, 1) if value is not None else None
+            row['cost'] = self.cost(row['prompt_tokens'], row['cached_tokens'], row['completion_tokens'])
+        return rows
+
+    def _fill_percentiles(self, queryset, keys, rows: List[Dict]):
+        """非 PostgreSQL：取出各分组的耗时，在 Python 中计算分位数"""
+        wanted = {tuple(row[k] for k in keys) for row in rows}
+        latencies = defaultdict(list)
+        for *group, latency in queryset.order_by().values_list(*keys, 'latency_ms').iterator(chunk_size=5000):
+            group = tuple(group)
+            if group in wanted:
+                latencies[group].append(latency)
+
+        for row in rows:
+            values = latencies.get(tuple(row[k] for k in keys))
+            for p in self.PERCENTILES:
+                row[f'p{p}_latency_ms'] = float(np.percentile(values, p)) if values else None
+
+    def cost(self, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> Optional[float]:
+        """按 AI_PRICE_*_PER_MTOK 计算费用，未配置价格时返回 None"""
+        if not any(self.prices.values()):
+            return None
+        return round((
+            (prompt_tokens - cached_tokens) * self.prices['input']
+            + cached_tokens * self.prices['cached_input']
+            + completion_tokens * self.prices['output']
+        ) / 1_000_000, 4)
+
+
+# 全局单例
+_ai_call_log_service_instance = None
+
+
+def get_ai_call_log_service() -> AICallLogService:
+    """获取 AI 调用记录服务单例"""
+    global _ai_call_log_service_instance
+    if _ai_call_log_service_instance is None:
+        _ai_call_log_service_instance = AICallLogService()
+    return _ai_call_log_service_instance
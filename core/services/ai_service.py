@@ -1,9 +1,14 @@
 import json
 import logging
+import re
+import time
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from django.conf import settings
 from openai import OpenAI
+from core import clock, metrics, tracing
+from core.services.ai_call_log_service import get_ai_call_log_service
+from core.services.cassette_service import get_cassette_service
 
 logger = logging.getLogger(__name__)
 
@@ -124,6 +129,33 @@ DEFAULT_PROMPTS = {
 
 请以JSON格式返回：
 {{"emotion_type": "happy", "intensity": 7, "description": "收到用户的问候让我感到开心"}}''',
+
+    'memory_consolidation': '''以下是你关于同一主题的多条零散记忆，请将它们整合为一条完整、精炼的记忆。
+
+零散记忆：
+{memories}
+
+要求：
+1. 保留所有关键信息（人物、时间、偏好、事件等），去除重复内容
+2. 如果记忆之间存在矛盾，以较新的记忆为准
+3. 标题简短概括主题，内容控制在200字以内
+
+请以JSON格式返回：{{"title": "标题", "content": "内容"}}''',
+
+    'conversation_summary': '''你需要维护一份与用户的长期对话摘要。请把新的对话内容合并进已有摘要，生成新的完整摘要。
+
+已有摘要：
+{summary}
+
+新的对话内容：
+{messages}
+
+要求：
+1. 保留对后续聊天有用的信息：聊过的话题、用户近况、约定和未完成的事
+2. 较早且不再重要的细节可以压缩或省略
+3. 使用第三人称客观描述，控制在300字以内
+
+请直接返回新的摘要内容，不需要JSON格式。''',
 }
 
 
@@ -174,33 +206,100 @@ class AIService:
         """获取人物设定"""
         return self._get_prompt(user, 'character')
 
-    def _call_openai(self, messages: List[Dict], temperature: float = 0.7, caller: str = 'unknown') -> str:
-        """调用OpenAI API"""
+    def _call_openai(self, messages: List[Dict], temperature: float = 0.7, caller: str = 'unknown',
+                     user=None, parse_json: bool = False):
+        """
+        调用OpenAI API
+
+        每次调用的 token 用量、耗时、错误和 JSON 解析结果都会异步批量写入 AI 调用记录（AICallLog）。
+
+        Args:
+            messages: 消息列表
+            temperature: 采样温度
+            caller: 调用方说明
+            user: 调用所属的 ChatUser（用于按用户统计，可为空）
+            parse_json: 是否用 _extract_json 解析响应
+
+        Returns:
+            str | Dict: 响应文本；parse_json=True 时为解析出的 JSON
+        """
+        started_at = clock.now()
+        started = time.monotonic()
+        latency_ms = None
+        usage = None
+        error = ''
+        parse_failed = False
         try:
             # 记录请求日志
             self._log_request(messages, temperature, caller)
 
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-            )
-            result = response.choices[0].message.content.strip()
+            cassette = get_cassette_service()
+            key = None
+            recorded = None
+            if cassette.mode != 'off':
+                key = cassette.request_key(self.model, messages, temperature)
+            if cassette.replaying:
+                recorded = cassette.replay(key)
+
+            if recorded is not None:
+                result = recorded['content']
+                usage = recorded.get('usage')
+            else:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                )
+                result = response.choices[0].message.content.strip()
+                usage = response.usage.model_dump() if getattr(response, 'usage', None) else None
+
+                if cassette.recording:
+                    cassette.record(key, caller, messages, result, usage, (time.monotonic() - started) * 1000)
+            latency_ms = (time.monotonic() - started) * 1000
 
             # 记录响应日志
             self._log_response(result, caller)
 
+            if parse_json:
+                try:
+                    return self._extract_json(result)
+                except Exception:
+                    parse_failed = True
+                    raise
             return result
         except Exception as e:
-            logger.error(f"OpenAI API调用失败: {e}")
+            if not parse_failed:
+                error = str(e)
+                logger.error(f"OpenAI API调用失败: {e}")
             raise
+        finally:
+            if latency_ms is None:
+                latency_ms = (time.monotonic() - started) * 1000
+            outcome = 'error' if error else 'parse_error' if parse_failed else 'success'
+            metrics.observe_llm_call(caller, latency_ms / 1000, outcome, usage)
+            tracing.record_span(
+                f'llm.{caller}', started_at, latency_ms, outcome=outcome,
+                prompt_tokens=(usage or {}).get('prompt_tokens'), completion_tokens=(usage or {}).get('completion_tokens'),
+            )
+            get_ai_call_log_service().record(
+                caller=caller,
+                model=self.model,
+                user=user,
+                usage=usage,
+                latency_ms=latency_ms,
+                error=error,
+                parse_failed=parse_failed,
+            )
 
     def _log_request(self, messages: List[Dict], temperature: float, caller: str):
-        """记录 AI 请求日志"""
+        """记录 AI 请求日志（完整提示词只在 DEBUG 级别输出，用量和耗时见 AICallLog）"""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+
         separator = "=" * 60
-        logger.info(f"\n{separator}")
-        logger.info(f"[AI 请求] 调用方: {caller} | 模型: {self.model} | temperature: {temperature}")
-        logger.info(separator)
+        logger.debug(f"\n{separator}")
+        logger.debug(f"[AI 请求] 调用方: {caller} | 模型: {self.model} | temperature: {temperature}")
+        logger.debug(separator)
 
         for i, msg in enumerate(messages):
             role = msg.get('role', 'unknown').upper()
@@ -212,16 +311,19 @@ class AIService:
             else:
                 display_content = content
 
-            logger.info(f"\n[{role}]\n{display_content}")
+            logger.debug(f"\n[{role}]\n{display_content}")
 
-        logger.info(separator)
+        logger.debug(separator)
 
     def _log_response(self, result: str, caller: str):
-        """记录 AI 响应日志"""
+        """记录 AI 响应日志（只在 DEBUG 级别输出）"""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+
         separator = "-" * 60
-        logger.info(f"\n{separator}")
-        logger.info(f"[AI 响应] 调用方: {caller}")
-        logger.info(separator)
+        logger.debug(f"\n{separator}")
+        logger.debug(f"[AI 响应] 调用方: {caller}")
+        logger.debug(separator)
 
         # 对于长响应，进行适当截断显示
         if len(result) > 2000:
@@ -229,8 +331,8 @@ class AIService:
         else:
             display_result = result
 
-        logger.info(f"\n{display_result}")
-        logger.info(f"\n{'=' * 60}\n")
+        logger.debug(f"\n{display_result}")
+        logger.debug(f"\n{'=' * 60}\n")
 
     def judge_hotspot_memorable(self, user, title: str, content: str) -> bool:
         """
@@ -256,7 +358,7 @@ class AIService:
         ]
 
         try:
-            result = self._call_openai(messages, temperature=0.3, caller='热点判断')
+            result = self._call_openai(messages, temperature=0.3, caller='热点判断', user=user)
             return '是' in result or 'yes' in result.lower()
         except Exception as e:
             logger.error(f"判断热点失败: {e}")
@@ -286,7 +388,7 @@ class AIService:
 
         # 构建上下文信息
         context_str = self._format_context(context)
-        current_time = datetime.now().strftime('%Y年%m月%d日 %H:%M:%S %A')
+        current_time = clock.local_now().strftime('%Y年%m月%d日 %H:%M:%S %A')
 
         # 替换变量
         user_prompt = reply_prompt.format(
@@ -302,14 +404,12 @@ class AIService:
         ]
 
         try:
-            result = self._call_openai(messages, temperature=0.8, caller='回复决策')
-            # 解析JSON响应
-            result_json = self._extract_json(result)
+            result_json = self._call_openai(messages, temperature=0.8, caller='回复决策', user=user, parse_json=True)
 
             reply_content = result_json.get('content', '收到')
             delay_minutes = int(result_json.get('delay_minutes', 0))
 
-            scheduled_time = datetime.now() + timedelta(minutes=delay_minutes)
+            scheduled_time = clock.local_now() + timedelta(minutes=delay_minutes)
 
             logger.info(f"AI决策：回复'{reply_content}'，延迟{delay_minutes}分钟")
             return reply_content, scheduled_time
@@ -317,7 +417,7 @@ class AIService:
         except Exception as e:
             logger.error(f"决策回复失败: {e}")
             # 默认回复
-            return "收到", datetime.now()
+            return "收到", clock.local_now()
 
     def detect_memory_points(
         self,
@@ -357,14 +457,13 @@ class AIService:
         ]
 
         try:
-            result = self._call_openai(messages, temperature=0.7, caller='记忆检测')
-            result_json = self._extract_json(result)
+            result_json = self._call_openai(messages, temperature=0.7, caller='记忆检测', user=user, parse_json=True)
 
             if not result_json.get('has_memory', False):
                 return None
 
             forget_days = result_json.get('forget_days', 30)
-            forget_time = None if forget_days == 0 else datetime.now() + timedelta(days=forget_days)
+            forget_time = None if forget_days == 0 else clock.local_now() + timedelta(days=forget_days)
 
             memory_info = {
                 'title': result_json.get('title', '未命名记忆'),
@@ -396,7 +495,7 @@ class AIService:
         planning_prompt = self._get_prompt(user, 'daily_planning')
 
         context_str = self._format_context(context)
-        date_str = datetime.now().strftime('%Y年%m月%d日 %A')
+        date_str = clock.local_now().strftime('%Y年%m月%d日 %A')
 
         # 替换变量
         user_prompt = planning_prompt.format(
@@ -410,11 +509,10 @@ class AIService:
         ]
 
         try:
-            result = self._call_openai(messages, temperature=0.8, caller='每日计划')
-            result_json = self._extract_json(result)
+            result_json = self._call_openai(messages, temperature=0.8, caller='每日计划', user=user, parse_json=True)
 
             tasks = []
-            today = datetime.now().date()
+            today = clock.local_now().date()
 
             for task_data in result_json.get('tasks', []):
                 try:
@@ -454,7 +552,7 @@ class AIService:
         autonomous_prompt = self._get_prompt(user, 'autonomous_message')
 
         context_str = self._format_context(context)
-        date_str = datetime.now().strftime('%Y年%m月%d日 %A')
+        date_str = clock.local_now().strftime('%Y年%m月%d日 %A')
 
         # 替换变量
         user_prompt = autonomous_prompt.format(
@@ -468,11 +566,10 @@ class AIService:
         ]
 
         try:
-            result = self._call_openai(messages, temperature=0.8, caller='自主消息')
-            result_json = self._extract_json(result)
+            result_json = self._call_openai(messages, temperature=0.8, caller='自主消息', user=user, parse_json=True)
 
             messages_list = []
-            today = datetime.now().date()
+            today = clock.local_now().date()
 
             for msg_data in result_json.get('messages', []):
                 try:
@@ -516,7 +613,7 @@ class AIService:
         character_setting = self._get_character_prompt(user)
         merge_prompt = self._get_prompt(user, 'message_merge')
 
-        current_time = datetime.now().strftime('%Y年%m月%d日 %H:%M:%S %A')
+        current_time = clock.local_now().strftime('%Y年%m月%d日 %H:%M:%S %A')
 
         # 格式化消息列表
         messages_text = "\n".join([f"{i+1}. {msg}" for i, msg in enumerate(messages)])
@@ -537,7 +634,7 @@ class AIService:
         ]
 
         try:
-            result = self._call_openai(ai_messages, temperature=0.7, caller='消息整合')
+            result = self._call_openai(ai_messages, temperature=0.7, caller='消息整合', user=user)
             merged_content = result.strip()
 
             logger.info(f"成功整合 {len(messages)} 条消息")
@@ -578,7 +675,7 @@ class AIService:
         emotion_prompt = self._get_prompt(user, 'emotion_analysis')
 
         context_str = self._format_context(context)
-        current_time = datetime.now().strftime('%Y年%m月%d日 %H:%M:%S %A')
+        current_time = clock.local_now().strftime('%Y年%m月%d日 %H:%M:%S %A')
 
         # 格式化当前情绪状态
         current_emotion_str = "无记录"
@@ -612,8 +709,7 @@ class AIService:
         ]
 
         try:
-            result = self._call_openai(messages, temperature=0.5, caller='情绪分析')
-            result_json = self._extract_json(result)
+            result_json = self._call_openai(messages, temperature=0.5, caller='情绪分析', user=user, parse_json=True)
 
             # 验证情绪类型
             valid_emotions = ['happy', 'sad', 'angry', 'anxious', 'calm', 'excited', 'tired', 'neutral', 'worried', 'grateful']
@@ -634,6 +730,98 @@ class AIService:
             logger.error(f"情绪分析失败: {e}")
             return None
 
+    def consolidate_memories(self, user, memories: List[Dict]) -> Optional[Dict]:
+        """
+        AI整合：将多条相关的零散记忆整合为一条
+
+        Args:
+            user: ChatUser 对象
+            memories: 待整合的记忆列表（包含 title, content, created_at）
+
+        Returns:
+            Optional[Dict]: 整合后的记忆（包含 title, content），失败时返回None
+        """
+        if len(memories) < 2:
+            return None
+
+        character_setting = self._get_character_prompt(user)
+        consolidation_prompt = self._get_prompt(user, 'memory_consolidation')
+
+        memories_text = "\n".join([
+            f"- [{m.get('created_at', '')}] {m.get('title', '')}: {m.get('content', '')}"
+            for m in memories
+        ])
+
+        # 替换变量
+        user_prompt = consolidation_prompt.format(memories=memories_text)
+
+        messages = [
+            {"role": "system", "content": f"{character_setting}\n\n你需要整理自己的记忆，把零散的记忆合并成完整的一条。"},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        try:
+            result_json = self._call_openai(messages, temperature=0.3, caller='记忆整合', user=user, parse_json=True)
+
+            title = (result_json.get('title') or '').strip()
+            content = (result_json.get('content') or '').strip()
+            if not title or not content:
+                return None
+
+            logger.info(f"整合 {len(memories)} 条记忆为: {title}")
+            return {'title': title[:200], 'content': content}
+
+        except Exception as e:
+            logger.error(f"整合记忆失败: {e}")
+            return None
+
+    def summarize_conversation(self, user, previous_summary: str, messages: List[Dict]) -> Optional[str]:
+        """
+        AI摘要：将一段较早的对话折叠进滚动摘要
+
+        Args:
+            user: ChatUser 对象
+            previous_summary: 已有摘要（可为空）
+            messages: 待折叠的消息列表（包含 sender, receiver, content, timestamp）
+
+        Returns:
+            Optional[str]: 新的完整摘要，失败时返回None
+        """
+        if not messages:
+            return None
+
+        character_setting = self._get_character_prompt(user)
+        summary_prompt = self._get_prompt(user, 'conversation_summary')
+
+        messages_text = "\n".join([
+            f"- [{m.get('timestamp', '')}] {m.get('sender', '')} → {m.get('receiver', '')}: {m.get('content', '')}"
+            for m in messages
+        ])
+
+        # 替换变量
+        user_prompt = summary_prompt.format(
+            summary=previous_summary or "暂无",
+            messages=messages_text
+        )
+
+        ai_messages = [
+            {"role": "system", "content": f"{character_setting}\n\n你需要整理你和用户的对话，更新对话摘要。"},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        try:
+            result = self._call_openai(ai_messages, temperature=0.3, caller='对话摘要', user=user)
+            summary = re.sub(r'<think>.*?</think>', '', result, flags=re.DOTALL).strip()
+            if not summary:
+                return None
+
+            logger.info(f"对话摘要已更新，折叠 {len(messages)} 条消息")
+            return summary
+
+        except Exception as e:
+            logger.error(f"更新对话摘要失败: {e}")
+            return None
+
     def _format_context(self, context: Dict) -> str:
         """格式化上下文信息为字符串"""
         formatted = []
@@ -643,6 +831,10 @@ class AIService:
             for memory in context['memories'][:5]:  # 只取前5条
                 formatted.append(f"- {memory.get('title', '')}: {memory.get('content', '')}")
 
+        if context.get('conversation_summary'):
+            formatted.append("\n## 早前对话摘要：")
+            formatted.append(context['conversation_summary'])
+
         if 'recent_messages' in context:
             formatted.append("\n## 最近消息：")
             for msg in context['recent_messages'][:10]:  # 只取前10条
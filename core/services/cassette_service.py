@@ -0,0 +1,165 @@
+"""
+AI 调用录制/回放服务（cassette）
+
+record 模式下把每次 AIService._call_openai 的请求摘要、响应内容、token 用量和耗时
+写入本地目录（每个请求摘要一个 JSON 文件）；replay 模式下按请求摘要直接返回录制的响应，
+可选按录制时的耗时 sleep，从而在无网络环境下确定性地重放同一批真实对话。
+
+请求摘要 = sha256(模型, temperature, 消息列表)，计算前会把提示词中的日期时间替换为占位符，
+否则 "当前时间"、历史消息时间戳等每次都不同，回放永远无法命中。
+同一请求多次录制时按顺序追加，回放时按顺序依次返回（循环使用）。
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CassetteMiss(LookupError):
+    """回放模式下找不到录制的响应"""
+
+
+class AICassette:
+    """AI 调用录制/回放"""
+
+    MODES = ('off', 'record', 'replay')
+
+    # 提示词中的日期时间：2025年01月01日 08:00:00 Wednesday / 2025-01-01 08:00(:00) / 单独的 08:00(:00)
+    VOLATILE_PATTERNS = [
+        re.compile(r'\d{4}年\d{1,2}月\d{1,2}日(\s*\d{1,2}:\d{2}(:\d{2})?)?(\s*[A-Z][a-z]+day)?'),
+        re.compile(r'\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?([+-]\d{2}:?\d{2}|Z)?)?'),
+        re.compile(r'(?<![\d:])\d{1,2}:\d{2}(:\d{2})?(?![\d:])'),
+    ]
+
+    def __init__(self, mode: str = 'off', directory: str = '', replay_latency: bool = False,
+                 replay_miss: str = 'error'):
+        if mode not in self.MODES:
+            raise ValueError(f"不支持的 cassette 模式: {mode}，可选: {', '.join(self.MODES)}")
+        if replay_miss not in ('error', 'live'):
+            raise ValueError(f"不支持的回放未命中策略: {replay_miss}，可选: error, live")
+
+        self.mode = mode
+        self.directory = Path(directory)
+        self.replay_latency = replay_latency
+        self.replay_miss = replay_miss
+        self._lock = threading.Lock()
+        self._cursors = defaultdict(int)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == 'record'
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    def normalize(self, text: str) -> str:
+        """把易变的日期时间替换为占位符"""
+        for pattern in self.VOLATILE_PATTERNS:
+            text = pattern.sub('<时间>', text)
+        return text
+
+    def request_key(self, model: str, messages: List[Dict], temperature: float) -> str:
+        """计算请求摘要"""
+        normalized = [
+            {'role': m.get('role', ''), 'content': self.normalize(str(m.get('content', '')))}
+            for m in messages
+        ]
+        raw = json.dumps({'model': model, 'temperature': temperature, 'messages': normalized},
+                         ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f'{key}.json'
+
+    def _load(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def record(self, key: str, caller: str, messages: List[Dict], content: str,
+               usage: Optional[Dict], latency_ms: float):
+        """
+        追加一条录制结果
+
+        Args:
+            key: 请求摘要
+            caller: 调用方（AIService 方法说明）
+            messages: 原始请求消息（便于排查，不参与回放匹配）
+            content: 响应内容
+            usage: token 用量 {'prompt_tokens', 'completion_tokens', 'total_tokens'}
+            latency_ms: 调用耗时（毫秒）
+        """
+        with self._lock:
+            entry = self._load(key) or {'key': key, 'caller': caller, 'messages': messages, 'responses': []}
+            entry['responses'].append({
+                'content': content,
+                'usage': usage,
+                'latency_ms': round(latency_ms, 1),
+                'recorded_at': time.time(),
+            })
+
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False, indent=1)
+            tmp_path.replace(path)
+
+    def replay(self, key: str) -> Optional[dict]:
+        """
+        取出下一条录制的响应（同一请求录制多次时依次循环返回）
+
+        Returns:
+            dict: {'content', 'usage', 'latency_ms'}；未命中且 replay_miss='live' 时返回 None
+
+        Raises:
+            CassetteMiss: 未命中且 replay_miss='error'
+        """
+        entry = self._load(key)
+        with self._lock:
+            if not entry or not entry['responses']:
+                self.misses += 1
+                if self.replay_miss == 'live':
+                    return None
+                raise CassetteMiss(f'cassette 中没有该请求的录制: {key}')
+
+            index = self._cursors[key] % len(entry['responses'])
+            self._cursors[key] += 1
+            self.hits += 1
+
+        response = entry['responses'][index]
+        if self.replay_latency and response.get('latency_ms'):
+            time.sleep(response['latency_ms'] / 1000)
+        return response
+
+
+# 全局单例
+_cassette_service_instance = None
+
+
+def get_cassette_service() -> AICassette:
+    """获取 AI 调用录制/回放单例（按 AI_CASSETTE_* 配置创建）"""
+    global _cassette_service_instance
+    if _cassette_service_instance is None:
+        _cassette_service_instance = AICassette(
+            mode=getattr(settings, 'AI_CASSETTE_MODE', 'off') or 'off',
+            directory=getattr(settings, 'AI_CASSETTE_DIR', 'cassettes'),
+            replay_latency=getattr(settings, 'AI_CASSETTE_REPLAY_LATENCY', False),
+            replay_miss=getattr(settings, 'AI_CASSETTE_REPLAY_MISS', 'error'),
+        )
+    return _cassette_service_instance
@@ -4,6 +4,12 @@ from datetime import datetime, timedelta
 from django.db.models import Q
 from django.utils import timezone
 
+from core import clock
+
+from core.services.memory_service import get_memory_service
+from core.services.rollup_service import get_rollup_service
+from core.services.summary_service import get_summary_service
+
 if TYPE_CHECKING:
     from core.models import ChatUser
 
@@ -33,7 +39,7 @@ class ContextService:
         memories = MemoryLibrary.objects.filter(
             user=user
         ).filter(
-            Q(forget_time__isnull=True) | Q(forget_time__gt=timezone.now())
+            Q(forget_time__isnull=True) | Q(forget_time__gt=clock.now())
         ).order_by('-weight', '-strength')[:limit]
 
         context['memories'] = [
@@ -47,6 +53,7 @@ class ContextService:
             }
             for m in memories
         ]
+        get_memory_service().record_retrieval(m['id'] for m in context['memories'])
 
         # 2. 检索该用户的历史消息（包含发送和接收的所有消息）
         recent_messages = MessageRecord.objects.filter(
@@ -65,8 +72,11 @@ class ContextService:
             for m in recent_messages
         ]
 
-        # 3. 检索该用户今日计划任务
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        # 3. 最近消息窗口之外的早前对话摘要
+        context['conversation_summary'] = get_summary_service().get_summary(user)
+
+        # 4. 检索该用户今日计划任务
+        today_start = clock.local_now().replace(hour=0, minute=0, second=0, microsecond=0)
         today_end = today_start + timedelta(days=1)
 
         planned_tasks = PlannedTask.objects.filter(
@@ -87,11 +97,11 @@ class ContextService:
             for t in planned_tasks
         ]
 
-        # 4. 检索该用户待回复任务
+        # 5. 检索该用户待回复任务
         reply_tasks = ReplyTask.objects.filter(
             user=user,
             status='pending',
-            scheduled_time__gte=timezone.now()
+            scheduled_time__gte=clock.now()
         ).order_by('scheduled_time')[:limit]
 
         context['reply_tasks'] = [
@@ -126,7 +136,7 @@ class ContextService:
         memories = MemoryLibrary.objects.filter(
             user=user
         ).filter(
-            Q(forget_time__isnull=True) | Q(forget_time__gt=timezone.now())
+            Q(forget_time__isnull=True) | Q(forget_time__gt=clock.now())
         ).filter(weight__gte=5.0).order_by('-weight', '-strength')[:limit]
 
         context['memories'] = [
@@ -140,9 +150,10 @@ class ContextService:
             }
             for m in memories
         ]
+        get_memory_service().record_retrieval(m['id'] for m in context['memories'])
 
         # 2. 检索该用户昨天的计划任务（作为参考）
-        yesterday_start = (datetime.now() - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        yesterday_start = (clock.local_now() - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
         yesterday_end = yesterday_start + timedelta(days=1)
 
         yesterday_tasks = PlannedTask.objects.filter(
@@ -184,7 +195,7 @@ class ContextService:
         memories = MemoryLibrary.objects.filter(
             user=user
         ).filter(
-            Q(forget_time__isnull=True) | Q(forget_time__gt=timezone.now())
+            Q(forget_time__isnull=True) | Q(forget_time__gt=clock.now())
         ).filter(weight__gte=3.0).order_by('-weight', '-strength')[:limit]
 
         context['memories'] = [
@@ -198,9 +209,10 @@ class ContextService:
             }
             for m in memories
         ]
+        get_memory_service().record_retrieval(m['id'] for m in context['memories'])
 
         # 2. 检索该用户今日计划任务
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        today_start = clock.local_now().replace(hour=0, minute=0, second=0, microsecond=0)
         today_end = today_start + timedelta(days=1)
 
         planned_tasks = PlannedTask.objects.filter(
@@ -224,7 +236,7 @@ class ContextService:
         # 3. 检索该用户近期消息记录
         recent_messages = MessageRecord.objects.filter(
             user=user,
-            timestamp__gte=datetime.now() - timedelta(days=3)
+            timestamp__gte=clock.local_now() - timedelta(days=3)
         ).order_by('-timestamp')[:limit]
 
         context['recent_messages'] = [
@@ -324,10 +336,10 @@ class ContextService:
         ).filter(
             Q(title__icontains=keyword) | Q(content__icontains=keyword)
         ).filter(
-            Q(forget_time__isnull=True) | Q(forget_time__gt=timezone.now())
+            Q(forget_time__isnull=True) | Q(forget_time__gt=clock.now())
         ).order_by('-weight', '-strength')[:limit]
 
-        return [
+        results = [
             {
                 'id': m.id,
                 'title': m.title,
@@ -338,11 +350,15 @@ class ContextService:
             }
             for m in memories
         ]
+        get_memory_service().record_retrieval(m['id'] for m in results)
+        return results
 
     def get_emotion_context(self, user: 'ChatUser', hours: int = 24) -> Dict:
         """
         获取AI助手情绪相关上下文
 
+        窗口不超过 EmotionState.WINDOW_HOURS 时读取物化情绪状态，否则读取情绪汇总表。
+
         Args:
             user: 聊天用户对象
             hours: 查询多少小时内的情绪记录
@@ -353,12 +369,66 @@ class ContextService:
                 - emotion_trend: AI助手近期情绪趋势
                 - emotion_stats: 情绪统计
         """
+        from core.models import EmotionState
+
+        # 窗口内的查询直接读取物化情绪状态（一次主键查询）
+        if hours <= EmotionState.WINDOW_HOURS:
+            state = EmotionState.objects.filter(pk=user.pk).first()
+            if state is None:
+                state = EmotionState.rebuild(user)
+            context = self._build_emotion_context_from_state(state, hours)
+        else:
+            context = self._build_emotion_context_from_records(user, hours)
+
+        # 计算主导情绪
+        if context['emotion_stats']:
+            dominant = context['emotion_stats'][0]
+            context['dominant_emotion'] = {
+                'emotion_type': dominant['emotion_type'],
+                'count': dominant['count'],
+                'avg_intensity': round(dominant['avg_intensity'], 1) if dominant['avg_intensity'] else 0,
+            }
+        else:
+            context['dominant_emotion'] = None
+
+        logger.info(f"为用户 {user} 聚合AI情绪上下文：{len(context['emotion_trend'])}条记录")
+        return context
+
+    def _build_emotion_context_from_state(self, state, hours: int) -> Dict:
+        """根据物化情绪状态构建情绪上下文"""
+        context = {}
+
+        if state.emotion_type:
+            context['current_emotion'] = {
+                'emotion_type': state.emotion_type,
+                'emotion_type_display': state.get_emotion_type_display(),
+                'intensity': state.intensity,
+                'description': state.description,
+                'trigger_source': state.trigger_source,
+                'created_at': state.emotion_at.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+        else:
+            context['current_emotion'] = None
+
+        context['emotion_trend'] = [
+            {
+                'emotion_type': e['emotion_type'],
+                'intensity': e['intensity'],
+                'trigger_source': e['trigger_source'],
+                'created_at': datetime.fromisoformat(e['created_at']).strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            for e in state.get_recent(hours)
+        ]
+
+        context['emotion_stats'] = state.get_window_stats(hours)
+        return context
+
+    def _build_emotion_context_from_records(self, user: 'ChatUser', hours: int) -> Dict:
+        """根据原始情绪记录构建情绪上下文（超出物化状态窗口时使用）"""
         from core.models import EmotionRecord
-        from datetime import timedelta
-        from django.db.models import Avg, Count
 
         context = {}
-        cutoff = timezone.now() - timedelta(hours=hours)
+        cutoff = clock.now() - timedelta(hours=hours)
 
         # 1. 获取当前情绪状态（最新一条记录）
         current_emotion = EmotionRecord.objects.filter(user=user).first()
@@ -390,29 +460,8 @@ class ContextService:
             for e in emotion_records
         ]
 
-        # 3. 情绪统计
-        emotion_stats = EmotionRecord.objects.filter(
-            user=user,
-            created_at__gte=cutoff
-        ).values('emotion_type').annotate(
-            count=Count('id'),
-            avg_intensity=Avg('intensity')
-        ).order_by('-count')
-
-        context['emotion_stats'] = list(emotion_stats)
-
-        # 4. 计算主导情绪
-        if context['emotion_stats']:
-            dominant = context['emotion_stats'][0]
-            context['dominant_emotion'] = {
-                'emotion_type': dominant['emotion_type'],
-                'count': dominant['count'],
-                'avg_intensity': round(dominant['avg_intensity'], 1) if dominant['avg_intensity'] else 0,
-            }
-        else:
-            context['dominant_emotion'] = None
-
-        logger.info(f"为用户 {user} 聚合AI情绪上下文：{len(context['emotion_trend'])}条记录")
+        # 3. 情绪统计（读取小时汇总表）
+        context['emotion_stats'] = get_rollup_service().get_emotion_stats(user, since=cutoff)
         return context
 
     def get_message_merge_context(self, user: 'ChatUser') -> Dict:
@@ -430,7 +479,7 @@ class ContextService:
         context = {}
 
         # 1. 检索该用户今日计划任务
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        today_start = clock.local_now().replace(hour=0, minute=0, second=0, microsecond=0)
         today_end = today_start + timedelta(days=1)
 
         planned_tasks = PlannedTask.objects.filter(
@@ -0,0 +1,226 @@
+"""
+情绪衰减服务 - 批量计算所有用户的当前情绪向基线情绪的时间衰减
+"""
+import json
+import logging
+from datetime import datetime
+from typing import List, Optional
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from core import clock
+
+logger = logging.getLogger(__name__)
+
+
+class EmotionDecayService:
+    """情绪衰减服务"""
+
+    def __init__(self):
+        self.baseline_type = getattr(settings, 'EMOTION_BASELINE_TYPE', 'calm')
+        self.baseline_intensity = getattr(settings, 'EMOTION_BASELINE_INTENSITY', 3)
+        self.half_life_hours = getattr(settings, 'EMOTION_DECAY_HALF_LIFE_HOURS', 6.0)
+        self.chunk_size = getattr(settings, 'EMOTION_DECAY_CHUNK_SIZE', 5000)
+
+    def decay_intensity(self, intensity: np.ndarray, elapsed_hours: np.ndarray) -> np.ndarray:
+        """
+        指数衰减：偏离基线的部分每经过一个半衰期减半，结果四舍五入为整数强度
+
+        Args:
+            intensity: 当前强度数组
+            elapsed_hours: 距离当前情绪产生的小时数数组（无情绪记录时为 inf）
+
+        Returns:
+            np.ndarray: 衰减后的整数强度数组
+        """
+        factor = np.exp2(-elapsed_hours / self.half_life_hours)
+        decayed = self.baseline_intensity + (intensity - self.baseline_intensity) * factor
+        return np.clip(np.rint(decayed), 1, 10).astype(np.int64)
+
+    def decay_all(self, trigger_source: str = 'time_decay', now: Optional[datetime] = None) -> int:
+        """
+        对所有活跃用户的当前情绪执行衰减
+
+        - time_decay：只为强度发生变化的用户写入衰减记录
+        - daily_init：为每个活跃用户写入当日起始情绪（没有情绪状态的用户初始化为基线情绪）
+
+        按用户ID分批读取状态为数组，用 NumPy 向量化计算衰减，每批一次 bulk_create 写入情绪记录、
+        一次批量 UPDATE 写回物化情绪状态。
+
+        Args:
+            trigger_source: 触发来源 time_decay / daily_init
+            now: 计算时刻，默认当前时间
+
+        Returns:
+            int: 写入的情绪记录数
+        """
+        from core.models import ChatUser, EmotionState
+
+        now = now or clock.now()
+        daily_init = trigger_source == 'daily_init'
+
+        if daily_init:
+            missing_user_ids = ChatUser.objects.filter(
+                is_active=True,
+                emotion_state__isnull=True
+            ).values_list('id', flat=True)
+            EmotionState.objects.bulk_create(
+                [EmotionState(user_id=user_id) for user_id in missing_user_ids],
+                batch_size=1000,
+                ignore_conflicts=True
+            )
+
+        queryset = EmotionState.objects.filter(user__is_active=True)
+        if not daily_init:
+            # 已经处于基线强度的用户无需衰减
+            queryset = queryset.exclude(emotion_type='').exclude(intensity=self.baseline_intensity)
+
+        total = 0
+        last_user_id = 0
+        while True:
+            rows = list(queryset.filter(user_id__gt=last_user_id).order_by('user_id').values_list(
+                'user_id', 'emotion_type', 'intensity', 'emotion_at'
+            )[:self.chunk_size])
+            if not rows:
+                break
+
+            total += self._decay_chunk(rows, trigger_source, now)
+            last_user_id = rows[-1][0]
+
+        logger.info(f"情绪衰减（{trigger_source}）完成，共写入 {total} 条情绪记录")
+        return total
+
+    def _decay_chunk(self, rows: List[tuple], trigger_source: str, now: datetime) -> int:
+        """计算并写入一批用户的衰减结果"""
+        from core.models import EmotionRecord, EmotionState
+
+        user_ids, emotion_types, intensities, emotion_ats = zip(*rows)
+
+        intensity = np.array(intensities, dtype=np.float64)
+        elapsed_hours = np.array([
+            (now - emotion_at).total_seconds() / 3600 if emotion_at else np.inf
+            for emotion_at in emotion_ats
+        ])
+        new_intensity = self.decay_intensity(intensity, np.maximum(elapsed_hours, 0))
+
+        if trigger_source == 'daily_init':
+            changed = np.ones(len(rows), dtype=bool)
+        else:
+            changed = new_intensity != intensity
+
+        # 回落到基线强度时情绪类型也回到基线情绪
+        new_types = np.where(
+            (new_intensity == self.baseline_intensity) | (np.array(emotion_types) == ''),
+            self.baseline_type,
+            np.array(emotion_types)
+        )
+
+        indexes = np.flatnonzero(changed)
+        if not len(indexes):
+            return 0
+
+        with transaction.atomic():
+            states = EmotionState.objects.select_for_update().in_bulk(
+                [user_ids[i] for i in indexes]
+            )
+
+            records = []
+            for i in indexes:
+                state = states.get(user_ids[i])
+                # 读取之后又产生了新情绪的用户跳过，下一轮再衰减
+                if state is None or state.emotion_at != emotion_ats[i]:
+                    continue
+
+                records.append(EmotionRecord(
+                    user_id=user_ids[i],
+                    emotion_type=str(new_types[i]),
+                    intensity=int(new_intensity[i]),
+                    trigger_source=trigger_source,
+                    description=(
+                        '新的一天开始了' if trigger_source == 'daily_init' else '情绪随时间逐渐平复'
+                    ),
+                    metadata={
+                        'decayed_from': {
+                            'emotion_type': emotion_types[i],
+                            'intensity': intensities[i],
+                        },
+                        'half_life_hours': self.half_life_hours,
+                    },
+                ))
+
+            EmotionRecord.objects.bulk_create(records, batch_size=1000)
+
+            updated_states = []
+            for record in records:
+                state = states[record.user_id]
+                state.apply(record)
+                state.updated_at = now
+                updated_states.append(state)
+
+            self._bulk_update_states(updated_states)
+
+        return len(records)
+
+    @staticmethod
+    def _bulk_update_states(states: list):
+        """
+        批量写回情绪状态
+
+        QuerySet.bulk_update 会为每行生成 CASE WHEN 表达式，上万行时编译 SQL 的开销远大于执行本身，
+        这里改为 PostgreSQL 的 UPDATE ... FROM (VALUES ...) 一次写入一页，其他数据库退化为 executemany。
+        """
+        params = [
+            (
+                state.user_id,
+                state.emotion_type,
+                state.intensity,
+                state.description,
+                state.trigger_source,
+                connection.ops.adapt_datetimefield_value(state.emotion_at),
+                json.dumps(state.recent, ensure_ascii=False),
+                json.dumps(state.window_buckets, ensure_ascii=False),
+                connection.ops.adapt_datetimefield_value(state.updated_at),
+            )
+            for state in states
+        ]
+        if not params:
+            return
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                from psycopg2.extras import execute_values
+
+                execute_values(cursor.cursor, """
+                    UPDATE emotion_state AS s SET
+                        emotion_type = v.emotion_type,
+                        intensity = v.intensity,
+                        description = v.description,
+                        trigger_source = v.trigger_source,
+                        emotion_at = v.emotion_at::timestamptz,
+                        recent = v.recent::jsonb,
+                        window_buckets = v.window_buckets::jsonb,
+                        updated_at = v.updated_at::timestamptz
+                    FROM (VALUES %s) AS v(user_id, emotion_type, intensity, description, trigger_source,
+                                          emotion_at, recent, window_buckets, updated_at)
+                    WHERE s.user_id = v.user_id
+                """, params, page_size=1000)
+            else:
+                cursor.executemany("""
+                    UPDATE emotion_state SET
+                        emotion_type = %s, intensity = %s, description = %s, trigger_source = %s,
+                        emotion_at = %s, recent = %s, window_buckets = %s, updated_at = %s
+                    WHERE user_id = %s
+                """, [param[1:] + param[:1] for param in params])
+
+
+# 全局单例
+_emotion_decay_service_instance = None
+
+
+def get_emotion_decay_service() -> EmotionDecayService:
+    """获取情绪衰减服务单例"""
+    global _emotion_decay_service_instance
+    if _emotion_decay_service_instance is None:
+        _emotion_decay_service_instance = EmotionDecayService()
+    return _emotion_decay_service_instance
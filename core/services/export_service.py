@@ -0,0 +1,212 @@
+"""
+数据导出服务 - 将消息记录、记忆、情绪记录流式导出为 CSV / JSONL（可选 gzip 压缩）
+
+导出全程使用 QuerySet.iterator(chunk_size)（PostgreSQL 上为服务端游标）逐批读取，
+边读边编码边输出，内存占用与导出行数无关。
+"""
+import csv
+import io
+import json
+import logging
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class DataExportService:
+    """数据导出服务"""
+
+    # 数据集: (模型名, 排序/时间过滤字段, 导出字段)
+    DATASETS = {
+        'messages': ('MessageRecord', 'timestamp', [
+            'id', 'user__user_id', 'message_type', 'sender', 'receiver',
+            'content', 'timestamp', 'raw_data', 'metadata', 'created_at',
+        ]),
+        'memories': ('MemoryLibrary', 'created_at', [
+            'id', 'user__user_id', 'title', 'content', 'memory_type', 'strength', 'weight',
+            'forget_time', 'retrieval_count', 'metadata', 'created_at', 'updated_at',
+        ]),
+        'emotions': ('EmotionRecord', 'created_at', [
+            'id', 'user__user_id', 'emotion_type', 'intensity', 'trigger_source',
+            'trigger_content', 'description', 'metadata', 'created_at',
+        ]),
+    }
+
+    FORMATS = ('csv', 'jsonl')
+    CONTENT_TYPES = {
+        'csv': 'text/csv; charset=utf-8',
+        'jsonl': 'application/x-ndjson; charset=utf-8',
+    }
+
+    def __init__(self, chunk_size: int = 2000, buffer_size: int = 64 * 1024):
+        self.chunk_size = chunk_size
+        self.buffer_size = buffer_size
+
+    def get_queryset(self, dataset: str, queryset=None, user_ids: Optional[List[str]] = None,
+                     since: Optional[datetime] = None, until: Optional[datetime] = None):
+        """
+        构建导出查询（values 查询集，按 (时间字段, id) 升序）
+
+        Args:
+            dataset: messages / memories / emotions
+            queryset: 基础查询集（如管理后台选中的记录），默认全表
+            user_ids: 只导出这些用户（ChatUser.user_id）
+            since: 时间字段 >= since
+            until: 时间字段 < until
+
+        Returns:
+            QuerySet: values 查询集
+        """
+        from django.apps import apps
+
+        if dataset not in self.DATASETS:
+            raise ValueError(f"不支持的数据集: {dataset}，可选: {', '.join(self.DATASETS)}")
+
+        model_name, key_field, fields = self.DATASETS[dataset]
+        if queryset is None:
+            queryset = apps.get_model('core', model_name).objects.all()
+
+        if user_ids:
+            queryset = queryset.filter(user__user_id__in=user_ids)
+        if since:
+            queryset = queryset.filter(**{f'{key_field}__gte': since})
+        if until:
+            queryset = queryset.filter(**{f'{key_field}__lt': until})
+
+        return queryset.values(*fields).order_by(key_field, 'id')
+
+    def iter_rows(self, queryset) -> Iterator[dict]:
+        """用服务端游标逐批读取，不缓存结果"""
+        return queryset.iterator(chunk_size=self.chunk_size)
+
+    def iter_csv(self, rows: Iterable[dict], fields: List[str]) -> Iterator[str]:
+        """逐行编码为 CSV（JSON 字段以 JSON 字符串写入）"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def take():
+            value = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return value
+
+        writer.writerow(fields)
+        yield take()
+
+        for row in rows:
+            writer.writerow([
+                json.dumps(value, ensure_ascii=False, cls=DjangoJSONEncoder) if isinstance(value, (dict, list))
+                else value.isoformat() if isinstance(value, datetime)
+                else value
+                for value in (row[field] for field in fields)
+            ])
+            yield take()
+
+    def iter_jsonl(self, rows: Iterable[dict]) -> Iterator[str]:
+        """逐行编码为 JSON Lines"""
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False, cls=DjangoJSONEncoder) + '\n'
+
+    def iter_bytes(self, lines: Iterable[str], compress: bool = False) -> Iterator[bytes]:
+        """
+        将文本行合并为约 buffer_size 大小的字节块输出，compress=True 时输出 gzip 流
+
+        Args:
+            lines: 文本行
+            compress: 是否 gzip 压缩
+
+        Returns:
+            Iterator[bytes]: 字节块
+        """
+        # wbits=31：输出带 gzip 文件头的流，可直接保存为 .gz 文件
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        pending = []
+        pending_size = 0
+
+        for line in lines:
+            data = line.encode('utf-8')
+            pending.append(data)
+            pending_size += len(data)
+            if pending_size >= self.buffer_size:
+                chunk = b''.join(pending)
+                pending, pending_size = [], 0
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    yield chunk
+
+        chunk = b''.join(pending)
+        if compressor:
+            chunk = compressor.compress(chunk) + compressor.flush()
+        if chunk:
+            yield chunk
+
+    def export(self, dataset: str, fmt: str = 'csv', compress: bool = False, **filters) -> Iterator[bytes]:
+        """
+        流式导出数据集
+
+        Args:
+            dataset: messages / memories / emotions
+            fmt: csv / jsonl
+            compress: 是否 gzip 压缩
+            **filters: 传给 get_queryset 的 queryset / user_ids / since / until
+
+        Returns:
+            Iterator[bytes]: 文件内容字节块
+        """
+        if fmt not in self.FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}，可选: {', '.join(self.FORMATS)}")
+
+        queryset = self.get_queryset(dataset, **filters)
+        rows = self.iter_rows(queryset)
+
+        if fmt == 'csv':
+            lines = self.iter_csv(rows, self.DATASETS[dataset][2])
+        else:
+            lines = self.iter_jsonl(rows)
+
+        return self.iter_bytes(lines, compress=compress)
+
+    def get_filename(self, dataset: str, fmt: str = 'csv', compress: bool = False) -> str:
+        """导出文件名，如 messages_20250101_120000.csv.gz"""
+        suffix = f".{fmt}{'.gz' if compress else ''}"
+        return f"{dataset}_{timezone.localtime():%Y%m%d_%H%M%S}{suffix}"
+
+    def streaming_response(self, dataset: str, fmt: str = 'csv', compress: bool = False,
+                           **filters) -> StreamingHttpResponse:
+        """
+        构建流式下载响应
+
+        Args:
+            dataset: messages / memories / emotions
+            fmt: csv / jsonl
+            compress: 是否 gzip 压缩
+            **filters: 传给 get_queryset 的过滤条件
+
+        Returns:
+            StreamingHttpResponse: 附件下载响应
+        """
+        response = StreamingHttpResponse(
+            self.export(dataset, fmt, compress, **filters),
+            content_type='application/gzip' if compress else self.CONTENT_TYPES[fmt],
+        )
+        filename = self.get_filename(dataset, fmt, compress)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+# 全局单例
+_export_service_instance = None
+
+
+def get_export_service() -> DataExportService:
+    """获取数据导出服务单例"""
+    global _export_service_instance
+    if _export_service_instance is None:
+        _export_service_instance = DataExportService()
+    return _export_service_instance
@@ -0,0 +1,509 @@
+"""
+压测服务 - 本地 OpenAI 兼容桩服务、Synology Chat Webhook 接收端和压测运行环境
+
+压测时不消耗真实 token、不向真实 Synology Chat 发消息：
+- OpenAIStubServer：在本地端口上模拟 /v1/chat/completions，延迟和输出 token 数按对数正态分布采样
+- WebhookSinkServer：模拟 Synology Chat 的 incoming webhook，记录每条发出消息的到达时间
+- LoadTestHarness：启动上述两个服务并把 OPENAI_API_BASE / WEBHOOK_URL 指向它们，
+  通过真实的 webhook_incoming 视图注入消息，在后台线程中驱动回复任务执行，并统计 SQL 查询数
+"""
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import numpy as np
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+def percentiles(values: List[float], points=(50, 95, 99)) -> Dict[str, Optional[float]]:
+    """计算分位数，如 {'p50': ..., 'p95': ..., 'p99': ...}（无数据时为 None）"""
+    if not values:
+        return {f'p{p}': None for p in points}
+    result = np.percentile(np.asarray(values, dtype=float), points)
+    return {f'p{p}': round(float(v), 1) for p, v in zip(points, result)}
+
+
+class LogNormal:
+    """以中位数和形状参数 sigma 描述的对数正态分布（sigma=0 时为常数）"""
+
+    def __init__(self, median: float, sigma: float = 0.0, rng: Optional[random.Random] = None):
+        self.median = median
+        self.sigma = sigma
+        self.rng = rng or random.Random()
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        if self.sigma <= 0:
+            return self.median
+        return self.rng.lognormvariate(np.log(self.median), self.sigma)
+
+
+class _StubServer:
+    """在后台线程中运行的本地 HTTP 服务"""
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.lock = threading.Lock()
+        handler = type('Handler', (self.handler_class,), {'stub': self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _send_json(self, data: dict, status: int = 200):
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _OpenAIStubHandler(_QuietHandler):
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json({'error': {'message': f'未模拟的接口: {self.path}'}}, status=404)
+            return
+        request = json.loads(self._read_body() or b'{}')
+        self._send_json(self.stub.complete(request))
+
+
+class OpenAIStubServer(_StubServer):
+    """
+    本地 OpenAI 兼容桩服务（/v1/chat/completions）
+
+    按请求内容返回 AIService 各调用方都能解析的结果：消息整合返回纯文本，
+    每日计划和自主消息返回 daily_items 条 07:00-22:59 之间的条目，
+    其余返回同时包含回复决策、记忆检测、情绪分析字段的 JSON（回复延迟在 0~delay_minutes 分钟间均匀取值）。
+    """
+
+    handler_class = _OpenAIStubHandler
+
+    EMOTIONS = ['happy', 'sad', 'angry', 'anxious', 'calm', 'excited', 'tired', 'neutral', 'worried', 'grateful']
+
+    def __init__(self, latency_ms: LogNormal, completion_tokens: LogNormal, memory_rate: float = 0.1,
+                 delay_minutes: int = 0, daily_items: int = 3, seed: Optional[int] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.latency_ms = latency_ms
+        self.completion_tokens = completion_tokens
+        self.memory_rate = memory_rate
+        self.delay_minutes = delay_minutes
+        self.daily_items = daily_items
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.calls_by_kind = defaultdict(int)
+        self.prompt_tokens = 0
+        self.completion_tokens_total = 0
+        self.latencies = []
+
+    def _text(self, tokens: int) -> str:
+        # 中文大致 1 字 ≈ 1 token
+        return ''.join(self.rng.choice('今天天气不错我们一起去吃饭吧好的呀明天见') for _ in range(max(1, tokens)))
+
+    def complete(self, request: dict) -> dict:
+        messages = request.get('messages') or []
+        prompt = '\n'.join(str(m.get('content', '')) for m in messages)
+        system = str(messages[0].get('content', '')) if messages else ''
+
+        with self.lock:
+            latency = self.latency_ms.sample()
+            tokens = int(self.completion_tokens.sample())
+            has_memory = self.rng.random() < self.memory_rate
+            emotion = self.rng.choice(self.EMOTIONS)
+            intensity = self.rng.randint(1, 10)
+            delay = self.rng.randint(0, self.delay_minutes)
+            times = sorted(f'{self.rng.randint(7, 22):02d}:{self.rng.randint(0, 59):02d}' for _ in range(self.daily_items))
+
+        time.sleep(latency / 1000)
+
+        text = self._text(tokens)
+        if '整合成一条' in system:
+            kind, content = 'merge', text
+        elif '生成你的计划任务' in system:
+            kind = 'planning'
+            content = json.dumps({'tasks': [
+                {'title': f'计划{i + 1}', 'description': text, 'task_type': 'daily', 'time': t}
+                for i, t in enumerate(times)
+            ]}, ensure_ascii=False)
+        elif '关怀消息' in system:
+            kind = 'autonomous'
+            content = json.dumps({'messages': [{'content': text, 'time': t} for t in times]}, ensure_ascii=False)
+        else:
+            kind = 'memory' if '值得记忆' in system else 'emotion' if '情绪' in system else 'reply'
+            content = json.dumps({
+                'content': text,
+                'delay_minutes': delay,
+                'has_memory': has_memory,
+                'title': f'记忆{self.rng.randint(1, 50)}',
+                'strength': 5,
+                'weight': 1.0,
+                'forget_days': 30,
+                'emotion_type': emotion,
+                'intensity': intensity,
+                'description': text[:20],
+            }, ensure_ascii=False)
+
+        prompt_tokens = len(prompt)
+        with self.lock:
+            self.calls += 1
+            self.calls_by_kind[kind] += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens_total += tokens
+            self.latencies.append(latency)
+
+        return {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': tokens,
+                'total_tokens': prompt_tokens + tokens,
+            },
+        }
+
+
+class _WebhookSinkHandler(_QuietHandler):
+
+    def do_POST(self):
+        body = self._read_body().decode('utf-8')
+        payload = json.loads(parse_qs(body).get('payload', ['{}'])[0])
+        self.stub.receive(payload)
+        self._send_json({'success': True})
+
+
+class WebhookSinkServer(_StubServer):
+    """本地 Synology Chat incoming webhook 接收端，记录每条消息的到达时间（time.monotonic）"""
+
+    handler_class = _WebhookSinkHandler
+
+    def __init__(self, latency_ms: LogNormal, **kwargs):
+        super().__init__(**kwargs)
+        self.latency_ms = latency_ms
+        self.received = []
+
+    def receive(self, payload: dict):
+        with self.lock:
+            latency = self.latency_ms.sample()
+        time.sleep(latency / 1000)
+        with self.lock:
+            self.received.append((time.monotonic(), payload.get('user_ids') or [], payload.get('text', '')))
+
+
+class QueryCounter:
+    """
+    统计 SQL 查询数和耗时的 execute_wrapper（可同时安装到多个线程的数据库连接上）
+
+    用法：
+        with connection.execute_wrapper(counter):
+            ...
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.count += 1
+                self.duration += elapsed
+
+    def snapshot(self):
+        with self.lock:
+            return self.count, self.duration
+
+
+class LoadTestHarness:
+    """
+    压测运行环境
+
+    start() 启动桩服务、把配置指向桩服务并重建相关服务单例、停止进程内调度器，
+    改由 executor 线程按 executor_interval 秒的间隔调用 execute_pending_reply_tasks
+    （executor_interval 为 None 时不启动，由调用方自行驱动）；stop() 恢复原配置。
+    """
+
+    def __init__(self, llm: OpenAIStubServer, sink: WebhookSinkServer, executor_interval: Optional[float] = 1.0):
+        self.llm = llm
+        self.sink = sink
+        self.executor_interval = executor_interval
+        self.queries = QueryCounter()
+        self.ingests = []  # (time.monotonic() 发送时刻, user_id, 接入耗时 ms, 是否成功)
+        self.schedule_lag = []  # 每条消息实际开始注入距排定时刻的毫秒数
+        self.in_flight = 0  # 已到排定时刻但尚未处理完的消息数
+        self.lock = threading.Lock()
+        self._settings_override = None
+        self._stop_event = threading.Event()
+        self._executor_thread = None
+        self._local = threading.local()
+
+    def start(self):
+        from django.conf import settings
+        from django.test import override_settings
+        from core import scheduler
+
+        self.llm.start()
+        self.sink.start()
+
+        self._settings_override = override_settings(
+            OPENAI_API_BASE=f'{self.llm.url}/v1',
+            OPENAI_API_KEY='loadtest',
+            WEBHOOK_URL=f'{self.sink.url}/webhook',
+            WEBHOOK_TOKEN='',
+            # 消息经 django.test.Client 注入，Host 为 testserver
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        )
+        self._settings_override.enable()
+        self._reset_singletons()
+
+        # 进程内调度器的每分钟轮询会与压测驱动的执行线程争抢任务
+        scheduler.stop_scheduler()
+
+        if self.executor_interval:
+            self._executor_thread = threading.Thread(target=self._executor_loop, daemon=True)
+            self._executor_thread.start()
+        return self
+
+    def stop(self):
+        from core import buffering
+
+        self._stop_event.set()
+        if self._executor_thread:
+            self._executor_thread.join()
+        # 临时数据库删除前写入缓冲中的 AI 调用记录和追踪 span
+        buffering.flush()
+        if self._settings_override:
+            self._settings_override.disable()
+        self._reset_singletons()
+        self.llm.stop()
+        self.sink.stop()
+
+    @staticmethod
+    def _reset_singletons():
+        from core.services import message_handler, webhook_service
+        message_handler._message_handler_instance = None
+        webhook_service._webhook_service_instance = None
+
+    def _executor_loop(self):
+        from core.scheduler import execute_pending_reply_tasks
+
+        with connection.execute_wrapper(self.queries):
+            while not self._stop_event.wait(self.executor_interval):
+                execute_pending_reply_tasks()
+        connection.close()
+
+    def _client(self):
+        from django.test import Client
+
+        if not hasattr(self._local, 'client'):
+            self._local.client = Client()
+        return self._local.client
+
+    def post_message(self, user_id: str, username: str, text: str) -> float:
+        """
+        通过真实的 webhook_incoming 视图注入一条消息（在调用线程中同步处理）
+
+        Returns:
+            float: 接入耗时（毫秒）
+        """
+        started = time.monotonic()
+        with connection.execute_wrapper(self.queries):
+            response = self._client().post('/api/webhook/incoming/', {
+                'user_id': user_id,
+                'username': username,
+                'text': text,
+                'post_id': uuid.uuid4().hex,
+                'timestamp': str(int(time.time() * 1000)),
+            })
+        elapsed_ms = (time.monotonic() - started) * 1000
+
+        with self.lock:
+            self.ingests.append((started, str(user_id), elapsed_ms, response.status_code == 200))
+        return elapsed_ms
+
+    def run_schedule(self, schedule: Iterable[Tuple[float, str, str, str]], concurrency: int = 16):
+        """
+        开环发送：按预先排定的时刻注入消息，不因处理变慢而推迟，
+        工作线程跟不上时消息在队列中等待（等待时间计入 schedule_lag）
+
+        Args:
+            schedule: (距开始的秒数, user_id, username, text)，按时间升序
+            concurrency: 并发发送线程数
+        """
+        work = queue.Queue()
+
+        def worker():
+            try:
+                while True:
+                    item = work.get()
+                    if item is None:
+                        return
+                    due, user_id, username, text = item
+                    with self.lock:
+                        self.schedule_lag.append(max(0.0, time.monotonic() - due) * 1000)
+                    try:
+                        self.post_message(user_id, username, text)
+                    except Exception as e:
+                        logger.error(f"压测消息注入失败: {e}", exc_info=True)
+                    finally:
+                        with self.lock:
+                            self.in_flight -= 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+
+        started = time.monotonic()
+        for offset, user_id, username, text in schedule:
+            due = started + offset
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self.lock:
+                self.in_flight += 1
+            work.put((due, user_id, username, text))
+
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+
+    def reply_lags(self) -> List[Tuple[float, float]]:
+        """
+        每条发出消息的 (到达接收端的 time.monotonic(), 距其所回复的最早一条未回复入站消息的毫秒数)
+
+        多条入站消息可能被整合为一条发出消息，此时按最早的一条计算。
+        """
+        pending = defaultdict(list)
+        with self.lock:
+            for started, user_id, _, _ in sorted(self.ingests):
+                pending[user_id].append(started)
+
+        results = []
+        with self.sink.lock:
+            received = sorted(self.sink.received)
+        for arrived, user_ids, _ in received:
+            for user_id in user_ids:
+                waiting = [t for t in pending[str(user_id)] if t <= arrived]
+                if waiting:
+                    results.append((arrived, (arrived - waiting[0]) * 1000))
+                    pending[str(user_id)] = [t for t in pending[str(user_id)] if t > arrived]
+        return results
+
+    def time_to_send(self) -> List[float]:
+        """每条发出消息的发送延迟（毫秒），见 reply_lags"""
+        return [lag for _, lag in self.reply_lags()]
+
+    def drain(self, user_ids: Optional[List[str]] = None, timeout: float = 120) -> bool:
+        """等待回复任务全部执行完毕，超时返回 False"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.pending_replies(user_ids) == 0:
+                return True
+            time.sleep(0.5)
+        return False
+
+    def pending_replies(self, user_ids: Optional[List[str]] = None) -> int:
+        """仍在等待发送的回复任务数（可只统计指定用户）"""
+        from core.models import ReplyTask
+
+        queryset = ReplyTask.objects.filter(status__in=['pending', 'executing'])
+        if user_ids is not None:
+            queryset = queryset.filter(user__user_id__in=user_ids)
+        return queryset.count()
+
+
+@contextmanager
+def scratch_database(keepdb: bool = False):
+    """
+    在临时数据库（test_<数据库名>）中执行，结束后删除（keepdb=True 时保留）并切回原数据库
+
+    Yields:
+        str: 临时数据库名
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb)
+    try:
+        yield connection.settings_dict['NAME']
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        # SQLite 内存临时库会忽略 destroy_test_db 里的 close()，恢复库名后再关闭一次才会重连到原数据库
+        connection.close()
+
+
+def add_stub_arguments(parser):
+    """为管理命令添加桩服务相关参数（loadtest / replay_traffic 共用）"""
+    parser.add_argument('--concurrency', type=int, default=16, help='并发注入线程数，默认 16')
+    parser.add_argument('--llm-latency-ms', type=float, default=800, help='LLM 响应延迟中位数（毫秒），默认 800')
+    parser.add_argument('--llm-latency-sigma', type=float, default=0.5, help='LLM 延迟对数正态分布 sigma，默认 0.5')
+    parser.add_argument('--llm-tokens', type=float, default=60, help='LLM 输出 token 数中位数，默认 60')
+    parser.add_argument('--llm-tokens-sigma', type=float, default=0.5, help='输出 token 数对数正态分布 sigma，默认 0.5')
+    parser.add_argument('--memory-rate', type=float, default=0.1, help='记忆检测命中概率，默认 0.1')
+    parser.add_argument('--webhook-latency-ms', type=float, default=50, help='Synology webhook 响应延迟（毫秒），默认 50')
+    parser.add_argument('--executor-interval', type=float, default=1.0,
+                        help='执行待发送回复任务的轮询间隔（秒），默认 1')
+    parser.add_argument('--drain-timeout', type=float, default=120,
+                        help='注入结束后等待回复全部发出的最长时间（秒），默认 120')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+
+
+def build_harness(options: dict) -> LoadTestHarness:
+    """按 add_stub_arguments 的参数创建桩服务和压测运行环境（尚未启动）"""
+    rng = random.Random(options.get('seed'))
+    llm = OpenAIStubServer(
+        latency_ms=LogNormal(options['llm_latency_ms'], options['llm_latency_sigma'], random.Random(rng.random())),
+        completion_tokens=LogNormal(options['llm_tokens'], options['llm_tokens_sigma'], random.Random(rng.random())),
+        memory_rate=options['memory_rate'],
+        seed=rng.random(),
+    )
+    sink = WebhookSinkServer(latency_ms=LogNormal(options['webhook_latency_ms'], 0.3, random.Random(rng.random())))
+    return LoadTestHarness(llm, sink, executor_interval=options['executor_interval'])
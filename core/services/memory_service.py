@@ -0,0 +1,289 @@
+"""
+记忆库服务 - 限制每个用户的记忆条数（超出上限时按淘汰策略批量删除），
+以及将相关的零散记忆整合为一条
+"""
+import logging
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Set, TYPE_CHECKING
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.utils import timezone
+
+from core import clock
+
+if TYPE_CHECKING:
+    from core.models import ChatUser, MemoryLibrary
+
+logger = logging.getLogger(__name__)
+
+
+# 淘汰策略：接收候选记忆的 QuerySet，返回按“先淘汰”排序后的 QuerySet
+EVICTION_POLICIES: Dict[str, Callable[[QuerySet], QuerySet]] = {
+    # 权重×强度最低的记忆先淘汰
+    'weight_strength': lambda qs: qs.annotate(
+        evict_score=F('weight') * F('strength')
+    ).order_by('evict_score', 'retrieval_count', 'created_at'),
+    # 被检索次数最少的记忆先淘汰（LFU）
+    'lfu': lambda qs: qs.order_by('retrieval_count', 'created_at'),
+    # 最早创建的非永久记忆先淘汰（forget_time 为空视为永久记忆，不参与淘汰）
+    'oldest': lambda qs: qs.filter(forget_time__isnull=False).order_by('created_at'),
+}
+
+# 记忆整合：两条记忆的字符二元组 Jaccard 相似度达到该阈值即视为相关
+CLUSTER_SIMILARITY_THRESHOLD = 0.25
+# 记忆整合：每个簇最多包含的记忆条数（控制单次 AI 调用的输入长度）
+CLUSTER_MAX_SIZE = 8
+
+
+class MemoryService:
+    """记忆库服务 - 容量管理与记忆整合"""
+
+    def __init__(self):
+        self.max_per_user = getattr(settings, 'MEMORY_MAX_PER_USER', 200)
+        self.policy = getattr(settings, 'MEMORY_EVICTION_POLICY', 'weight_strength')
+
+        if self.policy not in EVICTION_POLICIES:
+            logger.warning(f"未知的记忆淘汰策略: {self.policy}，使用默认策略 weight_strength")
+            self.policy = 'weight_strength'
+
+    def create_memory(self, user: 'ChatUser', **fields) -> 'MemoryLibrary':
+        """
+        创建记忆并执行容量检查
+
+        Args:
+            user: 聊天用户对象
+            **fields: MemoryLibrary 字段
+
+        Returns:
+            MemoryLibrary: 新创建的记忆
+        """
+        from core.models import MemoryLibrary
+
+        memory = MemoryLibrary.objects.create(user=user, **fields)
+        self.enforce_limit(user, exclude_ids=[memory.id])
+        return memory
+
+    def enforce_limit(
+        self,
+        user: 'ChatUser',
+        exclude_ids: Optional[Iterable[int]] = None,
+        policy: Optional[str] = None
+    ) -> int:
+        """
+        将用户的记忆条数控制在上限内
+
+        先淘汰已过遗忘时间的记忆，不足部分再按淘汰策略补足，最后用一条 DELETE 批量删除。
+
+        Args:
+            user: 聊天用户对象
+            exclude_ids: 不参与淘汰的记忆ID（如刚写入的记忆）
+            policy: 淘汰策略，默认使用配置中的策略
+
+        Returns:
+            int: 删除的记忆条数
+        """
+        from core.models import ChatUser, MemoryLibrary
+
+        if self.max_per_user <= 0:
+            return 0
+
+        queryset = MemoryLibrary.objects.filter(user=user)
+        overflow = queryset.count() - self.max_per_user
+        if overflow <= 0:
+            return 0
+
+        if exclude_ids:
+            queryset = queryset.exclude(id__in=list(exclude_ids))
+
+        # 1. 已遗忘的记忆最先淘汰
+        victim_ids = list(queryset.filter(
+            forget_time__lt=clock.now()
+        ).order_by('forget_time').values_list('id', flat=True)[:overflow])
+
+        # 2. 按淘汰策略补足剩余数量
+        remaining = overflow - len(victim_ids)
+        if remaining > 0:
+            order_func = EVICTION_POLICIES[policy or self.policy]
+            candidates = order_func(queryset.exclude(id__in=victim_ids))
+            victim_ids += list(candidates.values_list('id', flat=True)[:remaining])
+
+        if not victim_ids:
+            logger.warning(f"用户 {user} 的记忆超出上限 {overflow} 条，但没有可淘汰的记忆")
+            return 0
+
+        deleted = MemoryLibrary.objects.filter(id__in=victim_ids).delete()[0]
+        ChatUser.update_counters(user.id, memory_count=-deleted)
+        logger.info(f"用户 {user} 记忆超出上限，按 {policy or self.policy} 策略淘汰 {deleted} 条")
+        return deleted
+
+    def enforce_limit_for_all_users(self) -> int:
+        """
+        清理所有超出容量的用户（上限调低后用于回收存量数据）
+
+        Returns:
+            int: 删除的记忆总数
+        """
+        from core.models import ChatUser
+
+        if self.max_per_user <= 0:
+            return 0
+
+        # 用冗余计数器筛选（计数器可能略有漂移，enforce_limit 内会按实际条数判断）
+        over_limit_users = ChatUser.objects.filter(memory_count__gt=self.max_per_user)
+
+        total_deleted = 0
+        for user in over_limit_users:
+            try:
+                total_deleted += self.enforce_limit(user)
+            except Exception as e:
+                logger.error(f"清理用户 {user} 的记忆失败: {e}")
+
+        return total_deleted
+
+    def record_retrieval(self, memory_ids: Iterable[int]):
+        """
+        记录记忆被检索（累加检索次数，供 LFU 策略使用）
+
+        Args:
+            memory_ids: 被检索的记忆ID列表
+        """
+        from core.models import MemoryLibrary
+
+        memory_ids = list(memory_ids)
+        if not memory_ids:
+            return
+
+        try:
+            MemoryLibrary.objects.filter(id__in=memory_ids).update(
+                retrieval_count=F('retrieval_count') + 1
+            )
+        except Exception as e:
+            logger.error(f"记录记忆检索次数失败: {e}")
+
+    def consolidate_user_memories(self, user: 'ChatUser', ai_service, max_clusters: Optional[int] = None) -> int:
+        """
+        整合用户的零散记忆
+
+        将相关的 user_memory 聚成簇，每个簇通过 AI 整合为一条更强的记忆，
+        原记忆归档到新记忆的 metadata['archived_sources'] 后删除。
+
+        Args:
+            user: 聊天用户对象
+            ai_service: AI 服务
+            max_clusters: 本次最多整合的簇数
+
+        Returns:
+            int: 被整合（删除）的原记忆条数
+        """
+        from core.models import ChatUser, MemoryLibrary
+
+        if max_clusters is None:
+            max_clusters = getattr(settings, 'MEMORY_CONSOLIDATION_MAX_CLUSTERS', 5)
+
+        memories = list(MemoryLibrary.objects.filter(
+            user=user,
+            memory_type='user_memory'
+        ).order_by('created_at'))
+
+        clusters = self._cluster_memories(memories)[:max_clusters]
+        if not clusters:
+            return 0
+
+        consolidated_count = 0
+        merged_clusters = 0
+        for cluster in clusters:
+            merged = ai_service.consolidate_memories(user, [
+                {
+                    'title': m.title,
+                    'content': m.content,
+                    'created_at': timezone.localtime(m.created_at).strftime('%Y-%m-%d'),
+                }
+                for m in cluster
+            ])
+            if not merged:
+                continue
+
+            # 永久记忆参与整合时，整合结果也永久保留
+            forget_times = [m.forget_time for m in cluster]
+            forget_time = None if None in forget_times else max(forget_times)
+
+            with transaction.atomic():
+                MemoryLibrary.objects.create(
+                    user=user,
+                    title=merged['title'],
+                    content=merged['content'],
+                    memory_type='user_memory',
+                    strength=min(10, max(m.strength for m in cluster) + 1),
+                    weight=min(10.0, max(m.weight for m in cluster) + 0.1 * (len(cluster) - 1)),
+                    forget_time=forget_time,
+                    retrieval_count=sum(m.retrieval_count for m in cluster),
+                    metadata={
+                        'consolidated_from': [m.id for m in cluster],
+                        'archived_sources': [
+                            {
+                                'id': m.id,
+                                'title': m.title,
+                                'content': m.content,
+                                'created_at': m.created_at.isoformat(),
+                            }
+                            for m in cluster
+                        ],
+                    },
+                )
+                deleted = MemoryLibrary.objects.filter(id__in=[m.id for m in cluster]).delete()[0]
+                ChatUser.update_counters(user.id, memory_count=-deleted)
+
+            consolidated_count += len(cluster)
+            merged_clusters += 1
+
+        logger.info(f"用户 {user} 记忆整合完成：{consolidated_count} 条记忆整合为 {merged_clusters} 条")
+        return consolidated_count
+
+    @staticmethod
+    def _cluster_memories(memories: List['MemoryLibrary']) -> List[List['MemoryLibrary']]:
+        """
+        按字符二元组相似度将记忆贪心聚类，只返回至少包含两条记忆的簇
+
+        Args:
+            memories: 按创建时间排序的记忆列表
+
+        Returns:
+            List[List[MemoryLibrary]]: 记忆簇列表，较大的簇在前
+        """
+        def bigrams(memory) -> Set[str]:
+            text = re.sub(r'\s+', '', f"{memory.title}{memory.content[:200]}".lower())
+            return {text[i:i + 2] for i in range(len(text) - 1)} or {text}
+
+        signatures = [bigrams(m) for m in memories]
+        assigned = set()
+        clusters = []
+
+        for i in range(len(memories)):
+            if i in assigned:
+                continue
+            cluster = [i]
+            for j in range(i + 1, len(memories)):
+                if j in assigned or len(cluster) >= CLUSTER_MAX_SIZE:
+                    continue
+                union = signatures[i] | signatures[j]
+                if union and len(signatures[i] & signatures[j]) / len(union) >= CLUSTER_SIMILARITY_THRESHOLD:
+                    cluster.append(j)
+            if len(cluster) > 1:
+                assigned.update(cluster)
+                clusters.append([memories[k] for k in cluster])
+
+        clusters.sort(key=len, reverse=True)
+        return clusters
+
+
+# 全局单例
+_memory_service_instance = None
+
+
+def get_memory_service() -> MemoryService:
+    """获取记忆库容量服务单例"""
+    global _memory_service_instance
+    if _memory_service_instance is None:
+        _memory_service_instance = MemoryService()
+    return _memory_service_instance
@@ -3,9 +3,11 @@ from typing import Dict, Optional, TYPE_CHECKING
 from datetime import datetime
 from django.utils import timezone
 
-from core.models import MessageRecord, ReplyTask, MemoryLibrary, ChatUser, EmotionRecord
+from core import tracing
+from core.models import MessageRecord, ReplyTask, MemoryLibrary, ChatUser, EmotionRecord, RawPayload
 from core.services.ai_service import AIService
 from core.services.context_service import ContextService
+from core.services.memory_service import get_memory_service
 
 if TYPE_CHECKING:
     pass
@@ -38,6 +40,7 @@ class MessageHandler:
         4. AI判断：是否存在记忆点 → 写入/强化记忆库
         5. AI判断：情绪分析 → 写入情绪记录库
         6. 同步修改当日其他自动回复任务
+        7. 后台更新对话摘要
 
         Args:
             user: 聊天用户对象
@@ -57,11 +60,12 @@ class MessageHandler:
             # 步骤1：消息已在webhook_service中写入消息记录库
 
             # 步骤2：检索并添加上下文
-            context = self.context_service.get_user_message_context(user, sender)
+            with tracing.span('context.build'):
+                context = self.context_service.get_user_message_context(user, sender)
 
-            # 获取情绪上下文（用于 AI 决策）
-            emotion_context = self.context_service.get_emotion_context(user)
-            context['emotion'] = emotion_context
+                # 获取情绪上下文（用于 AI 决策）
+                emotion_context = self.context_service.get_emotion_context(user)
+                context['emotion'] = emotion_context
 
             # 步骤3：AI判断回复内容和回复时间（考虑情绪状态）
             reply_content, scheduled_time = self.ai_service.decide_reply_content_and_timing(
@@ -76,7 +80,14 @@ class MessageHandler:
             if raw_msg:
                 webhook_user_id = raw_msg.get('user_id')
 
-            # 创建回复任务
+            # 保存回复时的情绪状态（只保留类型和强度）
+            current_emotion = emotion_context.get('current_emotion')
+            emotion_at_reply = {
+                'emotion_type': current_emotion['emotion_type'],
+                'intensity': current_emotion['intensity'],
+            } if current_emotion else None
+
+            # 创建回复任务（原始消息与消息记录共用同一份冷存储数据）
             reply_task = ReplyTask.objects.create(
                 user=user,
                 trigger_type='user',
@@ -86,13 +97,12 @@ class MessageHandler:
                     'user_id': webhook_user_id,  # 保存用户ID用于回复
                     'original_message': content,
                     'msg_type': msg_type,
-                    'emotion_at_reply': emotion_context.get('current_emotion'),  # 保存回复时的情绪状态
+                    'emotion_at_reply': emotion_at_reply,
+                    'trace_id': tracing.current_trace_id(),
                 },
                 scheduled_time=scheduled_time,
                 status='pending',
-                metadata={
-                    'raw_msg': raw_msg or {},
-                }
+                raw_payload=RawPayload.store(raw_msg) if raw_msg else None,
             )
 
             logger.info(f"创建回复任务 #{reply_task.id}：{reply_content[:50]}... (计划时间: {scheduled_time})")
@@ -117,8 +127,8 @@ class MessageHandler:
                     existing_memory.strengthen(delta=1)
                     logger.info(f"强化记忆: {existing_memory.title} (强度: {existing_memory.strength})")
                 else:
-                    # 创建新记忆
-                    new_memory = MemoryLibrary.objects.create(
+                    # 创建新记忆（超出容量上限时按淘汰策略清理旧记忆）
+                    new_memory = get_memory_service().create_memory(
                         user=user,
                         title=memory_info['title'],
                         content=memory_info['content'],
@@ -135,6 +145,9 @@ class MessageHandler:
             # 步骤6：同步修改当日其他自动回复任务
             self._sync_autonomous_tasks(user, reply_task)
 
+            # 步骤7：窗口外消息累计足够时，后台折叠进对话摘要
+            self._schedule_summary_update(user)
+
             logger.info(f"用户 {user} 的消息处理完成: {sender}")
 
         except Exception as e:
@@ -170,8 +183,8 @@ class MessageHandler:
             )
 
             if emotion_info:
-                # 创建情绪记录
-                emotion_record = EmotionRecord.objects.create(
+                # 创建情绪记录（同一事务中更新物化情绪状态）
+                emotion_record = EmotionRecord.record(
                     user=user,
                     emotion_type=emotion_info['emotion_type'],
                     intensity=emotion_info['intensity'],
@@ -229,6 +242,24 @@ class MessageHandler:
         except Exception as e:
             logger.error(f"同步自主任务失败: {e}")
 
+    def _schedule_summary_update(self, user: ChatUser):
+        """
+        检查并提交对话摘要的后台更新任务
+
+        Args:
+            user: 聊天用户对象
+        """
+        try:
+            from core.scheduler import run_in_background, update_conversation_summary
+            from core.services.summary_service import get_summary_service
+
+            if get_summary_service().should_update(user):
+                run_in_background(update_conversation_summary, f'conversation_summary_{user.id}', user.id)
+                logger.info(f"已提交用户 {user} 的对话摘要更新任务")
+
+        except Exception as e:
+            logger.error(f"提交对话摘要更新失败: {e}")
+
     def _handle_onboarding(self, user: ChatUser, sender: str, content: str, raw_msg: Optional[Dict]):
         """
         处理新用户引导流程
@@ -0,0 +1,192 @@
+"""
+消息记录分区服务 - 维护 message_record 的按月范围分区，并将过期分区导出为 gzip 压缩的 JSONL 后摘除
+"""
+import gzip
+import logging
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class MessagePartitionService:
+    """消息记录分区服务（仅 PostgreSQL 声明式分区表）"""
+
+    PARENT_TABLE = 'message_record'
+    PARTITION_NAME_RE = re.compile(r'^message_record_p(\d{4})_(\d{2})$')
+
+    @staticmethod
+    def month_start(dt: datetime, offset: int = 0) -> datetime:
+        """dt 所在月份（按本地时区）向后偏移 offset 个月的月初"""
+        local = timezone.localtime(dt) if timezone.is_aware(dt) else dt
+        month_index = local.year * 12 + local.month - 1 + offset
+        return timezone.make_aware(datetime(month_index // 12, month_index % 12 + 1, 1))
+
+    def partition_name(self, month: datetime) -> str:
+        """分区表名，如 message_record_p2025_01"""
+        return f"{self.PARENT_TABLE}_p{month.year:04d}_{month.month:02d}"
+
+    def is_partitioned(self) -> bool:
+        """message_record 是否已是分区表"""
+        if connection.vendor != 'postgresql':
+            return False
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+                [self.PARENT_TABLE]
+            )
+            return cursor.fetchone() is not None
+
+    def list_partitions(self) -> List[Dict]:
+        """
+        列出当前挂载的月分区（按月份升序）
+
+        Returns:
+            List[Dict]: [{'name', 'start', 'end'}]
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass(%s)
+            """, [self.PARENT_TABLE])
+            names = [row[0] for row in cursor.fetchall()]
+
+        partitions = []
+        for name in names:
+            match = self.PARTITION_NAME_RE.match(name)
+            if not match:
+                continue
+            start = timezone.make_aware(datetime(int(match.group(1)), int(match.group(2)), 1))
+            partitions.append({'name': name, 'start': start, 'end': self.month_start(start, 1)})
+
+        return sorted(partitions, key=lambda p: p['start'])
+
+    def ensure_partitions(self, start: datetime, end: datetime) -> List[str]:
+        """
+        确保 [start, end] 覆盖的每个月都有分区（已存在的跳过）
+
+        Args:
+            start: 起始时间
+            end: 结束时间
+
+        Returns:
+            List[str]: 新建的分区名
+
+        Raises:
+            ValueError: 某个月的分区表存在但未挂载（archive_messages --keep-table 摘除后保留的表），
+                        无法新建分区，该月的数据也无法写入
+        """
+        if not self.is_partitioned():
+            return []
+
+        existing = {p['name'] for p in self.list_partitions()}
+        created = []
+        month = self.month_start(start)
+        last_month = self.month_start(end)
+
+        with connection.cursor() as cursor:
+            while month <= last_month:
+                name = self.partition_name(month)
+                if name not in existing:
+                    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+                    if cursor.fetchone()[0]:
+                        raise ValueError(
+                            f'表 {name} 已存在但未挂载为 {self.PARENT_TABLE} 的分区（通常是 archive_messages '
+                            f'--keep-table 摘除的月份），{month:%Y-%m} 的消息无法写入。请先重新挂载：'
+                            f'ALTER TABLE "{self.PARENT_TABLE}" ATTACH PARTITION "{name}" '
+                            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{self.month_start(month, 1).isoformat()}')，"
+                            f'或在确认已归档后删除该表'
+                        )
+                    cursor.execute(
+                        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{self.PARENT_TABLE}" '
+                        f'FOR VALUES FROM (%s) TO (%s)',
+                        [month, self.month_start(month, 1)]
+                    )
+                    created.append(name)
+                month = self.month_start(month, 1)
+
+        if created:
+            logger.info(f"已创建消息记录分区: {', '.join(created)}")
+        return created
+
+    def ensure_future_partitions(self, months_ahead: int = 3) -> List[str]:
+        """确保当前月及之后 months_ahead 个月的分区存在"""
+        now = timezone.now()
+        return self.ensure_partitions(now, self.month_start(now, months_ahead))
+
+    def get_expired_partitions(self, keep_months: int) -> List[Dict]:
+        """获取整体早于保留期（当前月往前 keep_months 个月）的分区"""
+        cutoff = self.month_start(timezone.now(), -keep_months)
+        return [p for p in self.list_partitions() if p['end'] <= cutoff]
+
+    def export_partition(self, name: str, output_path: Path, chunk_size: int = 2000) -> int:
+        """
+        用服务端游标将分区逐行导出为 gzip 压缩的 JSONL
+
+        Args:
+            name: 分区表名
+            output_path: 输出文件路径
+            chunk_size: 每次拉取的行数
+
+        Returns:
+            int: 导出的行数
+        """
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output_path.with_suffix(output_path.suffix + '.tmp')
+
+        exported = 0
+        with transaction.atomic(), connection.chunked_cursor() as cursor, \
+                gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            cursor.execute(f'SELECT row_to_json(t)::text FROM "{name}" t ORDER BY t.id')
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                f.writelines(row[0] + '\n' for row in rows)
+                exported += len(rows)
+
+        tmp_path.rename(output_path)
+        return exported
+
+    def archive_partition(self, name: str, output_dir: Path, drop: bool = True) -> int:
+        """
+        导出分区后从父表摘除（drop=True 时同时删除分区表）
+
+        先导出再摘除，导出失败时分区保持挂载，数据不会丢失。
+
+        Args:
+            name: 分区表名
+            output_dir: 导出目录
+            drop: 是否删除已摘除的分区表
+
+        Returns:
+            int: 导出的行数
+        """
+        exported = self.export_partition(name, output_dir / f'{name}.jsonl.gz')
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{self.PARENT_TABLE}" DETACH PARTITION "{name}"')
+            if drop:
+                cursor.execute(f'DROP TABLE "{name}"')
+
+        logger.info(f"消息记录分区 {name} 已归档（{exported} 行），{'已删除' if drop else '已摘除'}")
+        return exported
+
+
+# 全局单例
+_partition_service_instance = None
+
+
+def get_partition_service() -> MessagePartitionService:
+    """获取消息记录分区服务单例"""
+    global _partition_service_instance
+    if _partition_service_instance is None:
+        _partition_service_instance = MessagePartitionService()
+    return _partition_service_instance
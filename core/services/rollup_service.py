@@ -0,0 +1,237 @@
+"""
+情绪汇总服务 - 将新增的情绪记录增量聚合到按小时/按天的汇总表
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, TYPE_CHECKING
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from core import clock
+
+if TYPE_CHECKING:
+    from core.models import ChatUser
+
+logger = logging.getLogger(__name__)
+
+
+class EmotionRollupService:
+    """情绪汇总服务"""
+
+    CHECKPOINT_NAME = 'emotion_rollup'
+    PERIOD_TRUNCATES = {
+        'hour': TruncHour,
+        'day': TruncDay,
+    }
+
+    def aggregate_new_records(self, batch_size: int = 50000, max_batches: int = 20) -> int:
+        """
+        聚合检查点之后新增的情绪记录
+
+        每批按记录ID顺序取 batch_size 条，在数据库中按 (用户, 时段, 情绪) 分组聚合后
+        合并进汇总表，汇总行与检查点在同一事务中写入，保证每条记录只被统计一次。
+
+        ID 在插入时分配，但事务的提交顺序不同（情绪记录与状态在同一事务中写入，衰减任务大批量写入），
+        ID 较小的记录可能在检查点越过它之后才提交而被永久漏掉。因此只聚合到第一条创建时间在
+        EMOTION_ROLLUP_SAFETY_SECONDS 秒以内的记录之前：超过这个时间的事务都已提交，检查点之前不会再出现新记录。
+
+        Args:
+            batch_size: 每批处理的记录数
+            max_batches: 单次调用最多处理的批数
+
+        Returns:
+            int: 本次聚合的记录数
+        """
+        from core.models import EmotionRecord, JobCheckpoint
+
+        safety_seconds = getattr(settings, 'EMOTION_ROLLUP_SAFETY_SECONDS', 300)
+        cutoff = clock.now() - timedelta(seconds=safety_seconds)
+
+        total = 0
+        for _ in range(max_batches):
+            last_record_id = JobCheckpoint.load(self.CHECKPOINT_NAME).get('last_record_id', 0)
+
+            records = EmotionRecord.objects.filter(id__gt=last_record_id)
+            first_recent_id = records.filter(created_at__gte=cutoff).order_by('id').values_list(
+                'id', flat=True
+            ).first()
+            if first_recent_id is not None:
+                records = records.filter(id__lt=first_recent_id)
+
+            record_ids = list(records.order_by('id').values_list('id', flat=True)[:batch_size])
+
+            if not record_ids:
+                break
+
+            with transaction.atomic():
+                for period in self.PERIOD_TRUNCATES:
+                    self._merge_period(period, last_record_id, record_ids[-1])
+                JobCheckpoint.save_state(self.CHECKPOINT_NAME, {'last_record_id': record_ids[-1]})
+
+            total += len(record_ids)
+            if len(record_ids) < batch_size:
+                break
+
+        if total:
+            logger.info(f"情绪汇总：本次聚合 {total} 条情绪记录")
+        return total
+
+    def _merge_period(self, period: str, after_id: int, until_id: int):
+        """将 (after_id, until_id] 区间内的记录按指定粒度合并进汇总表"""
+        from core.models import EmotionRecord, EmotionRollup
+
+        truncate = self.PERIOD_TRUNCATES[period]
+        rows = EmotionRecord.objects.filter(
+            id__gt=after_id,
+            id__lte=until_id
+        ).annotate(
+            bucket_start=truncate('created_at')
+        ).values('user_id', 'bucket_start', 'emotion_type').annotate(
+            record_count=Count('id'),
+            intensity_total=Sum('intensity')
+        ).order_by()
+
+        grouped = defaultdict(list)
+        for row in rows:
+            grouped[(row['user_id'], row['bucket_start'])].append(row)
+
+        if not grouped:
+            return
+
+        existing = {
+            (rollup.user_id, rollup.bucket_start): rollup
+            for rollup in EmotionRollup.objects.filter(
+                period=period,
+                user_id__in={key[0] for key in grouped},
+                bucket_start__in={key[1] for key in grouped},
+            )
+        }
+
+        to_create, to_update = [], []
+        for key, emotion_rows in grouped.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                rollup = EmotionRollup(user_id=key[0], period=period, bucket_start=key[1], emotion_counts={})
+                to_create.append(rollup)
+            else:
+                to_update.append(rollup)
+
+            for row in emotion_rows:
+                rollup.merge(row['emotion_type'], row['record_count'], row['intensity_total'] or 0)
+
+        EmotionRollup.objects.bulk_create(to_create)
+        EmotionRollup.objects.bulk_update(
+            to_update,
+            ['count', 'intensity_sum', 'avg_intensity', 'dominant_emotion', 'emotion_counts'],
+            batch_size=1000
+        )
+
+    def get_emotion_stats(self, user: 'ChatUser', since: datetime) -> List[Dict]:
+        """
+        统计指定时间之后各情绪的次数和平均强度（按次数降序）
+
+        整点小时部分读取小时汇总表，起点所在的不完整小时和尚未聚合的新记录直接从原始表补齐。
+
+        Args:
+            user: 聊天用户对象
+            since: 统计起始时间
+
+        Returns:
+            List[Dict]: [{'emotion_type', 'count', 'avg_intensity'}]
+        """
+        from core.models import EmotionRecord, EmotionRollup, JobCheckpoint
+
+        last_record_id = JobCheckpoint.load(self.CHECKPOINT_NAME).get('last_record_id', 0)
+        totals = defaultdict(lambda: [0, 0])
+
+        # 起点向后取整到整点（汇总按本地时区的小时分桶），之前的不完整小时不读汇总表
+        since = timezone.localtime(since)
+        hour_start = since.replace(minute=0, second=0, microsecond=0)
+        if hour_start < since:
+            hour_start += timedelta(hours=1)
+
+        rollups = EmotionRollup.objects.filter(
+            user=user,
+            period='hour',
+            bucket_start__gte=hour_start
+        ).values_list('emotion_counts', flat=True)
+        for emotion_counts in rollups:
+            for emotion_type, (count, intensity_sum) in emotion_counts.items():
+                totals[emotion_type][0] += count
+                totals[emotion_type][1] += intensity_sum
+
+        pending = EmotionRecord.objects.filter(
+            Q(created_at__lt=hour_start) | Q(id__gt=last_record_id),
+            user=user,
+            created_at__gte=since
+        ).values('emotion_type').annotate(
+            record_count=Count('id'),
+            intensity_total=Sum('intensity')
+        ).order_by()
+        for row in pending:
+            totals[row['emotion_type']][0] += row['record_count']
+            totals[row['emotion_type']][1] += row['intensity_total'] or 0
+
+        return sorted([
+            {
+                'emotion_type': emotion_type,
+                'count': count,
+                'avg_intensity': intensity_sum / count if count else 0,
+            }
+            for emotion_type, (count, intensity_sum) in totals.items()
+        ], key=lambda item: item['count'], reverse=True)
+
+    def get_trend(self, user: 'ChatUser', since: datetime, period: str = 'day') -> List[Dict]:
+        """
+        获取按时段的情绪趋势（只读汇总表，不含尚未聚合的新记录）
+
+        Args:
+            user: 聊天用户对象
+            since: 起始时间
+            period: 汇总粒度 hour/day
+
+        Returns:
+            List[Dict]: 按时间升序的时段统计
+        """
+        from core.models import EmotionRollup
+
+        rollups = EmotionRollup.objects.filter(
+            user=user,
+            period=period,
+            bucket_start__gte=since
+        ).order_by('bucket_start').values(
+            'bucket_start', 'count', 'avg_intensity', 'dominant_emotion', 'emotion_counts'
+        )
+
+        return [
+            {
+                'bucket_start': timezone.localtime(r['bucket_start']).isoformat(),
+                'count': r['count'],
+                'avg_intensity': r['avg_intensity'],
+                'dominant_emotion': r['dominant_emotion'],
+                'emotions': {
+                    emotion_type: {
+                        'count': count,
+                        'avg_intensity': round(intensity_sum / count, 2) if count else 0,
+                    }
+                    for emotion_type, (count, intensity_sum) in r['emotion_counts'].items()
+                },
+            }
+            for r in rollups
+        ]
+
+
+# 全局单例
+_rollup_service_instance = None
+
+
+def get_rollup_service() -> EmotionRollupService:
+    """获取情绪汇总服务单例"""
+    global _rollup_service_instance
+    if _rollup_service_instance is None:
+        _rollup_service_instance = EmotionRollupService()
+    return _rollup_service_instance
@@ -0,0 +1,424 @@
+"""
+压测数据生成服务 - 按固定随机种子批量生成用户、提示词、消息、记忆、情绪记录和计划/回复任务
+
+生成的数据尽量接近真实分布：
+- 消息按会话成簇出现，会话开始时间服从早高峰/午间/晚间高峰的日内分布，会话内收发交替、间隔数秒到数分钟
+- 记忆混合永久（无 forget_time）、已过遗忘时间和未到遗忘时间三种
+- 计划任务、回复任务覆盖所有状态，待执行任务排在未来
+
+PostgreSQL 上各表通过 COPY FROM STDIN 流式写入（边生成边写，不在内存中积累），
+其他数据库退化为分批 executemany，仅用于小规模验证。写入绕过 ORM 信号，
+冗余计数器和情绪状态在最后统一计算。
+"""
+import io
+import json
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# 会话开始时间的日内分布（0-23 点的相对权重）：早高峰、午休、晚间高峰，深夜最少
+HOUR_WEIGHTS = [
+    2, 1, 1, 1, 1, 2, 4, 8, 12, 9, 6, 7,
+    10, 8, 5, 5, 6, 7, 9, 11, 13, 14, 12, 6,
+]
+
+RECEIVED_TEXTS = [
+    '在吗', '早上好', '今天好累啊', '晚饭吃什么好呢', '刚下班', '周末有什么安排吗', '我有点想你了',
+    '今天天气真不错', '你在干嘛呀', '明天要考试了好紧张', '晚安', '午饭吃了什么', '好无聊啊',
+    '今天老板又批评我了', '刚看完一部电影，超好看', '下雨了记得带伞', '我到家了', '哈哈哈笑死我了',
+]
+
+SENT_TEXTS = [
+    '在呢，怎么啦', '早呀，昨晚睡得好吗', '辛苦啦，早点休息', '要不要试试楼下那家面馆', '路上小心哦',
+    '还没想好，你呢', '哼，才没有想你呢', '是呀，适合出去走走', '刚练完歌，有点累', '加油，你可以的',
+    '晚安，做个好梦', '吃了沙拉，最近在减脂', '那我们聊会儿天吧', '别往心里去，抱抱', '什么电影，推荐一下',
+]
+
+MEMORY_TEXTS = [
+    ('用户的生日', '用户说下个月 12 号是生日'), ('喜欢的食物', '用户最喜欢吃火锅，不太能吃辣'),
+    ('工作', '用户在一家互联网公司做产品经理'), ('宠物', '用户养了一只叫团子的橘猫'),
+    ('考试', '用户在准备下个月的资格考试'), ('旅行计划', '用户打算国庆去云南旅行'),
+    ('运动习惯', '用户每周三和周六去游泳'), ('家人', '用户的妈妈最近身体不太好'),
+]
+
+PLAN_TITLES = ['晨练', '录歌', '健身', '看电影', '写歌', '整理房间', '和朋友吃饭', '练琴']
+
+
+class ScaleDataGenerator:
+    """压测数据生成器"""
+
+    # 表名: 写入的列（均不含 id，由数据库序列分配）
+    COLUMNS = {
+        'prompt_library': ['user_id', 'category', 'key', 'content', 'is_active', 'metadata', 'created_at', 'updated_at'],
+        'message_record': ['user_id', 'message_type', 'sender', 'receiver', 'content', 'timestamp',
+                           'raw_data', 'metadata', 'created_at'],
+        'memory_library': ['user_id', 'title', 'content', 'memory_type', 'strength', 'weight', 'forget_time',
+                           'retrieval_count', 'metadata', 'created_at', 'updated_at'],
+        'emotion_record': ['user_id', 'emotion_type', 'intensity', 'trigger_source', 'trigger_content',
+                           'description', 'metadata', 'created_at'],
+        'planned_task': ['user_id', 'title', 'description', 'task_type', 'scheduled_time', 'status',
+                         'metadata', 'created_at', 'updated_at', 'completed_at'],
+        'reply_task': ['user_id', 'trigger_type', 'content', 'context', 'scheduled_time', 'status', 'retry_count',
+                       'error_message', 'metadata', 'created_at', 'updated_at', 'executed_at'],
+    }
+
+    COPY_CHUNK_SIZE = 256 * 1024
+
+    PROMPT_CATEGORIES = [
+        'reply_decision', 'memory_detection', 'daily_planning', 'autonomous_message', 'hotspot_judge',
+        'message_merge', 'emotion_analysis', 'memory_consolidation', 'conversation_summary',
+    ]
+
+    def __init__(self, users: int, messages_per_user: int, memories_per_user: int = 20,
+                 emotions_per_user: int = 50, tasks_per_user: int = 10, days: int = 30,
+                 seed: int = 42, start_user_id: int = 800000000, batch_size: int = 5000):
+        self.users = users
+        self.messages_per_user = messages_per_user
+        self.memories_per_user = memories_per_user
+        self.emotions_per_user = emotions_per_user
+        self.tasks_per_user = tasks_per_user
+        self.days = days
+        self.seed = seed
+        self.start_user_id = start_user_id
+        self.batch_size = batch_size
+        self.now = timezone.now().replace(microsecond=0)
+        self.start = self.now - timedelta(days=days)
+        # 每个用户最近收发时间，用于最后回填冗余计数器
+        self.last_times: Dict[int, Dict[str, datetime]] = {}
+
+    def user_ids(self) -> List[str]:
+        return [str(self.start_user_id + i) for i in range(self.users)]
+
+    @staticmethod
+    def nickname(index: int) -> str:
+        return f'用户{index}'
+
+    def _rng(self, table: str, index: int) -> random.Random:
+        """每个 (表, 用户序号) 独立的随机数序列，结果与主键分配、生成顺序和批大小无关"""
+        return random.Random(f'{self.seed}:{table}:{index}')
+
+    # ==================== 用户 ====================
+
+    def create_users(self) -> List[Tuple[int, int]]:
+        """
+        创建用户（ORM 批量创建，需要拿到主键供后续各表引用）
+
+        Returns:
+            List[Tuple[int, int]]: [(主键, 用户序号)]
+        """
+        from core.models import ChatUser
+
+        ChatUser.objects.bulk_create([
+            ChatUser(
+                user_id=user_id,
+                username=f'scale_{user_id}',
+                nickname=self.nickname(i),
+                is_initialized=True,
+                metadata={'seed_scale_data': self.seed},
+            )
+            for i, user_id in enumerate(self.user_ids())
+        ], batch_size=self.batch_size)
+        pks = dict(ChatUser.objects.filter(user_id__in=self.user_ids()).values_list('user_id', 'id'))
+        return [(pks[user_id], i) for i, user_id in enumerate(self.user_ids())]
+
+    # ==================== 各表行生成 ====================
+
+    def _random_time(self, rng: random.Random, start: datetime, end: datetime) -> datetime:
+        """在 [start, end) 内按日内分布（本地时间）取一个时间"""
+        day = rng.randrange(max(1, (end - start).days))
+        hour = rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+        moment = (timezone.localtime(start) + timedelta(days=day)).replace(hour=hour, minute=0, second=0) + timedelta(
+            seconds=rng.randrange(3600)
+        )
+        return min(max(moment, start), end - timedelta(seconds=1))
+
+    def prompt_rows(self, user_pk: int, index: int) -> Iterator[tuple]:
+        from core.services.ai_service import DEFAULT_PROMPTS
+        from core.services.user_init_service import CHARACTER_PRESETS
+
+        rng = self._rng('prompt', index)
+        presets = [p for p in CHARACTER_PRESETS if p['content']]
+        preset = rng.choice(presets)
+
+        yield (user_pk, 'character', 'main_character', preset['content'], True,
+               {'source': 'seed_scale_data', 'preset': preset['id']}, self.start, self.start)
+        for category in self.PROMPT_CATEGORIES:
+            if DEFAULT_PROMPTS.get(category):
+                yield (user_pk, category, f'{category}_prompt', DEFAULT_PROMPTS[category], True,
+                       {'source': 'system_default'}, self.start, self.start)
+
+    def message_rows(self, user_pk: int, index: int) -> Iterator[tuple]:
+        """按会话成簇生成消息：每个会话 2-20 条，收发交替，间隔数秒到数分钟"""
+        rng = self._rng('message', index)
+        nickname = self.nickname(index)
+        remaining = self.messages_per_user
+        sessions = []
+        while remaining > 0:
+            size = min(remaining, rng.randint(2, 20))
+            sessions.append((self._random_time(rng, self.start, self.now), size))
+            remaining -= size
+        sessions.sort()
+
+        last = {}
+        for session_start, size in sessions:
+            moment = session_start
+            message_type = 'received'
+            for _ in range(size):
+                if moment >= self.now:
+                    moment = self.now - timedelta(seconds=1)
+                if message_type == 'received':
+                    sender, receiver, content = nickname, 'AI助手', rng.choice(RECEIVED_TEXTS)
+                else:
+                    sender, receiver, content = 'AI助手', nickname, rng.choice(SENT_TEXTS)
+                yield (user_pk, message_type, sender, receiver, content, moment,
+                       {'source': 'seed_scale_data'}, {}, moment)
+                last[message_type] = max(moment, last.get(message_type, moment))
+
+                # 大多数时候一收一发，偶尔连发几条
+                if rng.random() < 0.7:
+                    message_type = 'sent' if message_type == 'received' else 'received'
+                moment += timedelta(seconds=int(rng.expovariate(1 / 45)) + 2)
+
+        self.last_times[user_pk] = last
+
+    def memory_rows(self, user_pk: int, index: int) -> Iterator[tuple]:
+        """记忆：约 20% 永久、30% 已过遗忘时间、50% 未到遗忘时间"""
+        rng = self._rng('memory', index)
+        for i in range(self.memories_per_user):
+            title, content = rng.choice(MEMORY_TEXTS)
+            created_at = self._random_time(rng, self.start, self.now)
+            roll = rng.random()
+            if roll < 0.2:
+                forget_time = None
+            elif roll < 0.5:
+                forget_time = self.now - timedelta(days=rng.uniform(0.1, self.days))
+            else:
+                forget_time = self.now + timedelta(days=rng.uniform(1, 90))
+            memory_type = rng.choices(['user_memory', 'important_event', 'hotspot'], weights=[7, 2, 1])[0]
+            yield (user_pk, title, content, memory_type, rng.randint(1, 10), round(rng.uniform(0.5, 2.0), 2),
+                   forget_time, int(rng.expovariate(1 / 3)), {'source': 'seed_scale_data'}, created_at, created_at)
+
+    def emotion_rows(self, user_pk: int, index: int) -> Iterator[tuple]:
+        from core.models import EmotionRecord
+
+        emotion_types = [value for value, _ in EmotionRecord.EMOTION_TYPE_CHOICES]
+        rng = self._rng('emotion', index)
+        times = sorted(self._random_time(rng, self.start, self.now) for _ in range(self.emotions_per_user))
+        for created_at in times:
+            source = rng.choices(['user_message', 'system', 'time_decay', 'daily_init'], weights=[8, 1, 2, 1])[0]
+            yield (user_pk, rng.choice(emotion_types), rng.randint(1, 10), source,
+                   rng.choice(RECEIVED_TEXTS) if source == 'user_message' else '', '',
+                   {'source': 'seed_scale_data'}, created_at)
+
+    def planned_task_rows(self, user_pk: int, index: int) -> Iterator[tuple]:
+        """计划任务依次轮换所有状态，待执行的排在未来，其余在过去"""
+        from core.models import PlannedTask
+
+        statuses = [value for value, _ in PlannedTask.STATUS_CHOICES]
+        rng = self._rng('planned_task', index)
+        for i in range(self.tasks_per_user):
+            status = statuses[i % len(statuses)]
+            if status == 'pending':
+                scheduled = self.now + timedelta(minutes=rng.randint(1, 24 * 60))
+            else:
+                scheduled = self._random_time(rng, self.start, self.now)
+            created_at = min(scheduled, self.now) - timedelta(hours=rng.randint(1, 12))
+            completed_at = scheduled if status == 'completed' else None
+            yield (user_pk, rng.choice(PLAN_TITLES), '', rng.choices(['daily', 'special', 'reminder'], weights=[8, 1, 1])[0],
+                   scheduled, status, {'source': 'seed_scale_data'}, created_at, created_at, completed_at)
+
+    def reply_task_rows(self, user_pk: int, index: int) -> Iterator[tuple]:
+        """回复任务依次轮换所有状态，待执行的排在未来，其余在过去"""
+        statuses = self._reply_statuses()
+        rng = self._rng('reply_task', index)
+        for i in range(self.tasks_per_user):
+            status = statuses[i % len(statuses)]
+            if status == 'pending':
+                scheduled = self.now + timedelta(minutes=rng.randint(1, 120))
+            else:
+                scheduled = self._random_time(rng, self.start, self.now)
+            created_at = min(scheduled, self.now) - timedelta(minutes=rng.randint(0, 30))
+            executed_at = scheduled if status in ('completed', 'failed') else None
+            yield (user_pk, rng.choices(['user', 'autonomous'], weights=[4, 1])[0], rng.choice(SENT_TEXTS), {},
+                   scheduled, status, 1 if status == 'failed' else 0,
+                   'Synology Chat 返回错误' if status == 'failed' else '',
+                   {'source': 'seed_scale_data'}, created_at, created_at, executed_at)
+
+    @staticmethod
+    def _reply_statuses() -> List[str]:
+        from core.models import ReplyTask
+        return [value for value, _ in ReplyTask.STATUS_CHOICES]
+
+    def pending_reply_count(self) -> int:
+        statuses = self._reply_statuses()
+        return sum(1 for i in range(self.tasks_per_user) if statuses[i % len(statuses)] == 'pending')
+
+    def table_rows(self) -> List[Tuple[str, Callable[[int, int], Iterable[tuple]]]]:
+        return [
+            ('prompt_library', self.prompt_rows),
+            ('message_record', self.message_rows),
+            ('memory_library', self.memory_rows),
+            ('emotion_record', self.emotion_rows),
+            ('planned_task', self.planned_task_rows),
+            ('reply_task', self.reply_task_rows),
+        ]
+
+    # ==================== 写入 ====================
+
+    def load(self, progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, int]:
+        """
+        生成并写入全部数据
+
+        Args:
+            progress: 进度回调 (表名, 已写入行数)
+
+        Returns:
+            Dict[str, int]: 各表写入行数
+        """
+        from core.models import ChatUser
+
+        existing = ChatUser.objects.filter(user_id__in=self.user_ids()).count()
+        if existing:
+            raise ValueError(f'已存在 {existing} 个 user_id 在 {self.start_user_id} 起的范围内，请换用 --start-user-id')
+
+        with transaction.atomic():
+            users = self.create_users()
+            counts = {'chat_user': len(users)}
+
+            if connection.vendor == 'postgresql':
+                from core.services.partition_service import get_partition_service
+                get_partition_service().ensure_partitions(self.start, self.now)
+
+            for table, generate in self.table_rows():
+                rows = (row for user_pk, index in users for row in generate(user_pk, index))
+                counts[table] = self._write(table, rows, progress)
+
+            self._fill_counters(users)
+
+        return counts
+
+    def _write(self, table: str, rows: Iterable[tuple], progress) -> int:
+        if connection.vendor == 'postgresql':
+            return self._copy(table, rows, progress)
+        return self._insert(table, rows, progress)
+
+    def _copy(self, table: str, rows: Iterable[tuple], progress) -> int:
+        """COPY FROM STDIN（text 格式），边生成边写"""
+        stream = _CopyStream(rows, progress=lambda n: progress(table, n) if progress else None)
+        columns = ', '.join(f'"{c}"' for c in self.COLUMNS[table])
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f'COPY "{table}" ({columns}) FROM STDIN', stream, size=self.COPY_CHUNK_SIZE)
+        if progress:
+            progress(table, stream.rows)
+        return stream.rows
+
+    def _insert(self, table: str, rows: Iterable[tuple], progress) -> int:
+        """非 PostgreSQL：分批 executemany"""
+        columns = self.COLUMNS[table]
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(table),
+            ', '.join(connection.ops.quote_name(c) for c in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        written = 0
+        batch = []
+        with connection.cursor() as cursor:
+            for row in rows:
+                batch.append([json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v for v in row])
+                if len(batch) >= self.batch_size:
+                    cursor.executemany(sql, batch)
+                    written += len(batch)
+                    batch = []
+                    if progress:
+                        progress(table, written)
+            if batch:
+                cursor.executemany(sql, batch)
+                written += len(batch)
+        if progress:
+            progress(table, written)
+        return written
+
+    def _fill_counters(self, users: List[Tuple[int, int]]):
+        """按生成结果回填冗余计数器（COPY 不触发信号）"""
+        from core.models import ChatUser
+
+        pending = self.pending_reply_count()
+        batch = []
+        for user_pk, _ in users:
+            last = self.last_times.get(user_pk, {})
+            batch.append(ChatUser(
+                pk=user_pk,
+                message_count=self.messages_per_user,
+                memory_count=self.memories_per_user,
+                pending_reply_count=pending,
+                last_message_at=last.get('received'),
+                last_sent_at=last.get('sent'),
+            ))
+        ChatUser.objects.bulk_update(
+            batch, ['message_count', 'memory_count', 'pending_reply_count', 'last_message_at', 'last_sent_at'],
+            batch_size=1000,
+        )
+
+    def rebuild_emotion_states(self, progress: Optional[Callable[[int], None]] = None) -> int:
+        """为生成的用户重建物化情绪状态"""
+        from core.models import ChatUser, EmotionState
+
+        rebuilt = 0
+        for user in ChatUser.objects.filter(user_id__in=self.user_ids()).iterator(chunk_size=1000):
+            EmotionState.rebuild(user)
+            rebuilt += 1
+            if progress and rebuilt % 1000 == 0:
+                progress(rebuilt)
+        return rebuilt
+
+
+class _CopyStream(io.RawIOBase):
+    """把行迭代器编码为 COPY text 格式的只读文件对象，供 copy_expert 按块读取"""
+
+    ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+    def __init__(self, rows: Iterable[tuple], progress=None, report_every: int = 100000):
+        self.rows_iter = iter(rows)
+        self.rows = 0
+        self.progress = progress
+        self.report_every = report_every
+        self.buffer = bytearray()
+
+    def readable(self):
+        return True
+
+    @classmethod
+    def encode(cls, value) -> str:
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value, ensure_ascii=False)
+        return str(value).translate(cls.ESCAPES)
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                row = next(self.rows_iter)
+            except StopIteration:
+                break
+            self.buffer += ('\t'.join(self.encode(v) for v in row) + '\n').encode('utf-8')
+            self.rows += 1
+            if self.progress and self.rows % self.report_every == 0:
+                self.progress(self.rows)
+
+        if size < 0:
+            size = len(self.buffer)
+        chunk = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return chunk
@@ -0,0 +1,302 @@
+"""
+调度模拟服务 - 用虚拟时钟在几秒内跑完一整天的定时任务和用户消息
+
+SchedulerSimulation 把 core.clock 切换为 SimulatedClock，通过 scheduler._add_scheduled_jobs 注册与生产相同的
+定时任务（CronTrigger / IntervalTrigger），然后依次跳到下一个任务触发或用户消息到达的时刻同步执行。
+00:00 每日计划、00:05 自主消息、每分钟回复任务执行（含 10 分钟整合窗口）以及用户消息触发的
+_sync_autonomous_tasks 调整因此按真实的先后顺序发生。LLM 和 Synology webhook 使用压测桩服务。
+"""
+import copy
+import logging
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from unittest import mock
+
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from django.db import connection
+from django.utils import timezone
+
+from core import clock
+from core.clock import SimulatedClock
+from core.services.loadtest_service import LoadTestHarness, percentiles
+from core.services.seed_service import HOUR_WEIGHTS, RECEIVED_TEXTS
+
+logger = logging.getLogger(__name__)
+
+
+class SimulatedJob:
+    """虚拟调度器中的一个定时任务"""
+
+    def __init__(self, job_id: str, name: str, func: Callable, trigger, next_run: Optional[datetime]):
+        self.id = job_id
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.next_run = next_run
+
+
+class VirtualScheduler:
+    """
+    代替 BackgroundScheduler 接收 _add_scheduled_jobs 注册的任务，触发时间按虚拟时钟计算
+
+    未指定 start_date 的 IntervalTrigger 以创建时的真实时间为起点，这里改为以虚拟时间为起点；
+    CronTrigger 默认按系统本地时区解释，这里统一按 TIME_ZONE（与部署环境 TZ 一致）。
+    """
+
+    def __init__(self, sim_clock: SimulatedClock):
+        self.clock = sim_clock
+        self.tz = timezone.get_default_timezone()
+        self.jobs: List[SimulatedJob] = []
+
+    def add_job(self, func, trigger, id, name='', replace_existing=False, **kwargs):
+        now = self.clock.now()
+        if isinstance(trigger, IntervalTrigger):
+            trigger = IntervalTrigger(seconds=trigger.interval_length, start_date=now + trigger.interval, timezone=self.tz)
+        elif isinstance(trigger, CronTrigger):
+            trigger = copy.copy(trigger)
+            trigger.timezone = self.tz
+
+        self.jobs = [job for job in self.jobs if job.id != id]
+        self.jobs.append(SimulatedJob(id, name or id, func, trigger, trigger.get_next_fire_time(None, now)))
+
+    def next_job(self) -> Optional[SimulatedJob]:
+        """下一个要触发的任务（同一时刻按注册顺序）"""
+        pending = [job for job in self.jobs if job.next_run is not None]
+        return min(pending, key=lambda job: job.next_run) if pending else None
+
+
+class SchedulerSimulation:
+    """
+    虚拟时钟下的全天调度模拟
+
+    需要在 harness.start() 之后、在可以随意写入的数据库（如临时数据库）中运行。
+    """
+
+    REPLY_JOB_ID = 'execute_reply_tasks'
+    AUTONOMOUS_JOB_ID = 'autonomous_messages_00_05'
+
+    def __init__(self, harness: LoadTestHarness, users: list, start: datetime, hours: int = 24,
+                 messages_per_user: int = 20, seed: Optional[int] = None):
+        """
+        Args:
+            harness: 已启动的压测运行环境（executor_interval=None，回复任务由模拟按调度执行）
+            users: 参与模拟的 ChatUser 列表
+            start: 模拟起始时间（带时区）
+            hours: 模拟时长（小时）
+            messages_per_user: 每个用户在模拟时段内发送的消息数（按日内分布随机）
+            seed: 随机种子
+        """
+        self.harness = harness
+        self.users = users
+        self.start = start
+        self.end = start + timedelta(hours=hours)
+        self.messages_per_user = messages_per_user
+        self.rng = random.Random(seed)
+        self.ticks = []
+        self.messages = []
+        self._autonomous_times = {}
+
+    def build_arrivals(self) -> List[tuple]:
+        """按日内分布（本地时间）生成 (到达时间, user) 列表，按时间升序"""
+        hours = int((self.end - self.start).total_seconds() // 3600)
+        local_start = timezone.localtime(self.start)
+        weights = [HOUR_WEIGHTS[(local_start + timedelta(hours=h)).hour] for h in range(hours)]
+
+        arrivals = []
+        for user in self.users:
+            for _ in range(self.messages_per_user):
+                hour = self.rng.choices(range(hours), weights=weights)[0]
+                moment = self.start + timedelta(hours=hour, seconds=self.rng.randrange(3600))
+                arrivals.append((moment, user))
+        arrivals.sort(key=lambda item: (item[0], item[1].pk))
+        return arrivals
+
+    def run(self, progress: Optional[Callable[[datetime], None]] = None) -> Dict:
+        """
+        推进虚拟时间直到模拟结束
+
+        Args:
+            progress: 每跨过一个虚拟小时调用一次，参数为当前虚拟时间
+
+        Returns:
+            Dict: 模拟报告，见 build_report
+        """
+        from core.scheduler import _add_scheduled_jobs
+
+        sim_clock = SimulatedClock(self.start)
+        arrivals = self.build_arrivals()
+        next_arrival = 0
+        last_hour = None
+        started = time.perf_counter()
+
+        clock.set_clock(sim_clock)
+        # auto_now / auto_now_add 字段由 Django 内部调用 timezone.now() 取值
+        try:
+            with mock.patch('django.utils.timezone.now', sim_clock.now):
+                scheduler = VirtualScheduler(sim_clock)
+                _add_scheduled_jobs(scheduler)
+
+                while True:
+                    job = scheduler.next_job()
+                    arrival = arrivals[next_arrival][0] if next_arrival < len(arrivals) else None
+                    moment = min(t for t in (job.next_run if job else None, arrival) if t is not None)
+                    if moment >= self.end:
+                        break
+
+                    sim_clock.set(moment)
+                    hour = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+                    if progress and hour != last_hour:
+                        progress(hour)
+                        last_hour = hour
+
+                    if arrival is not None and (job is None or arrival < job.next_run):
+                        self._inject(moment, arrivals[next_arrival][1])
+                        next_arrival += 1
+                    else:
+                        self._run_job(job, moment)
+                        job.next_run = job.trigger.get_next_fire_time(moment, moment)
+        finally:
+            clock.set_clock(None)
+
+        return self.build_report(time.perf_counter() - started)
+
+    def _measure(self, func: Callable) -> Dict:
+        harness = self.harness
+        queries, db_seconds = harness.queries.snapshot()
+        llm_calls = harness.llm.calls
+        sent = len(harness.sink.received)
+        started = time.perf_counter()
+
+        func()
+
+        wall = time.perf_counter() - started
+        queries_after, db_seconds_after = harness.queries.snapshot()
+        return {
+            'wall_ms': round(wall * 1000, 1),
+            'queries': queries_after - queries,
+            'db_ms': round((db_seconds_after - db_seconds) * 1000, 1),
+            'llm_calls': harness.llm.calls - llm_calls,
+            'sent': len(harness.sink.received) - sent,
+        }
+
+    def _inject(self, moment: datetime, user):
+        text = self.rng.choice(RECEIVED_TEXTS)
+        stats = self._measure(lambda: self.harness.post_message(user.user_id, user.username, text))
+        self.messages.append({'time': timezone.localtime(moment).isoformat(), 'user_id': user.user_id, **stats})
+
+    def _run_job(self, job: SimulatedJob, moment: datetime):
+        def call():
+            with connection.execute_wrapper(self.harness.queries):
+                job.func()
+
+        tick = {'time': timezone.localtime(moment).isoformat(), 'job': job.id, **self._measure(call)}
+        if job.id == self.REPLY_JOB_ID:
+            tick.update(self._queue_sizes(moment))
+        elif job.id == self.AUTONOMOUS_JOB_ID:
+            self._snapshot_autonomous_tasks()
+        self.ticks.append(tick)
+
+    def _queue_sizes(self, moment: datetime) -> Dict:
+        """执行回复任务后仍在等待的回复任务数，以及其中已到期的数量"""
+        from core.models import ReplyTask
+
+        pending = ReplyTask.objects.filter(status='pending')
+        return {
+            'pending': pending.count(),
+            'overdue': pending.filter(scheduled_time__lte=moment).count(),
+        }
+
+    def _snapshot_autonomous_tasks(self):
+        """记录刚生成的自主消息计划时间，用于统计之后被 _sync_autonomous_tasks 推迟的数量"""
+        from core.models import ReplyTask
+
+        self._autonomous_times.update(
+            ReplyTask.objects.filter(trigger_type='autonomous').exclude(id__in=self._autonomous_times)
+            .values_list('id', 'scheduled_time')
+        )
+
+    def build_report(self, wall_seconds: float) -> Dict:
+        from core.models import PlannedTask, ReplyTask
+
+        tasks = list(ReplyTask.objects.filter(user__in=self.users).values_list(
+            'id', 'trigger_type', 'status', 'scheduled_time', 'executed_at',
+        ))
+        lags = defaultdict(list)
+        for task_id, trigger_type, status, scheduled_time, executed_at in tasks:
+            if status == 'completed' and executed_at:
+                lags[trigger_type].append((executed_at - scheduled_time).total_seconds())
+        rescheduled = sum(
+            1 for task_id, _, _, scheduled_time, _ in tasks
+            if task_id in self._autonomous_times and scheduled_time != self._autonomous_times[task_id]
+        )
+
+        status_counts = defaultdict(int)
+        for _, _, status, _, _ in tasks:
+            status_counts[status] += 1
+
+        jobs = {}
+        for tick in self.ticks:
+            summary = jobs.setdefault(tick['job'], {'runs': 0, 'wall_ms': 0.0, 'max_wall_ms': 0.0, 'queries': 0, 'llm_calls': 0})
+            summary['runs'] += 1
+            summary['wall_ms'] = round(summary['wall_ms'] + tick['wall_ms'], 1)
+            summary['max_wall_ms'] = max(summary['max_wall_ms'], tick['wall_ms'])
+            summary['queries'] += tick['queries']
+            summary['llm_calls'] += tick['llm_calls']
+
+        all_lags = [lag for values in lags.values() for lag in values]
+        reply_ticks = [tick for tick in self.ticks if tick['job'] == self.REPLY_JOB_ID]
+        return {
+            'window': [timezone.localtime(self.start).isoformat(), timezone.localtime(self.end).isoformat()],
+            'wall_seconds': round(wall_seconds, 1),
+            'users': len(self.users),
+            'messages_injected': len(self.messages),
+            'replies_sent': len(self.harness.sink.received),
+            'llm_calls': self.harness.llm.calls,
+            'llm_calls_by_kind': dict(self.harness.llm.calls_by_kind),
+            'planned_tasks': PlannedTask.objects.filter(user__in=self.users).count(),
+            'reply_tasks': dict(status_counts),
+            'autonomous_created': len(self._autonomous_times),
+            'autonomous_rescheduled': rescheduled,
+            'send_lag_seconds': {kind: percentiles(values) for kind, values in sorted(lags.items())},
+            'sent_early': sum(1 for lag in all_lags if lag < 0),
+            'max_pending': max((tick['pending'] for tick in reply_ticks), default=0),
+            'max_overdue': max((tick['overdue'] for tick in reply_ticks), default=0),
+            'jobs': jobs,
+            'hourly': self._hourly(),
+            'ticks': self.ticks,
+            'messages': self.messages,
+        }
+
+    def _hourly(self) -> List[Dict]:
+        """按虚拟小时汇总消息注入和定时任务的工作量"""
+        hours = {}
+
+        def bucket(item):
+            key = item['time'][:13]
+            return hours.setdefault(key, {
+                'hour': key, 'messages': 0, 'job_runs': 0, 'sent': 0, 'llm_calls': 0,
+                'queries': 0, 'db_ms': 0.0, 'wall_ms': 0.0, 'max_tick_ms': 0.0, 'max_pending': 0, 'max_overdue': 0,
+            })
+
+        for message in self.messages:
+            row = bucket(message)
+            row['messages'] += 1
+        for tick in self.ticks:
+            row = bucket(tick)
+            row['job_runs'] += 1
+            row['max_tick_ms'] = max(row['max_tick_ms'], tick['wall_ms'])
+            row['max_pending'] = max(row['max_pending'], tick.get('pending', 0))
+            row['max_overdue'] = max(row['max_overdue'], tick.get('overdue', 0))
+        for item in self.messages + self.ticks:
+            row = bucket(item)
+            row['sent'] += item['sent']
+            row['llm_calls'] += item['llm_calls']
+            row['queries'] += item['queries']
+            row['db_ms'] = round(row['db_ms'] + item['db_ms'], 1)
+            row['wall_ms'] = round(row['wall_ms'] + item['wall_ms'], 1)
+
+        return [hours[key] for key in sorted(hours)]
@@ -0,0 +1,154 @@
+"""
+系统统计服务 - 生成系统状态统计快照
+
+状态接口和 system_status 命令默认读取定时刷新的快照，而不是每次请求都对各表执行 COUNT(*)。
+快照中的大表（消息记录、情绪记录）在 PostgreSQL 上超过阈值时使用 pg_class.reltuples 估算总数；
+需要精确数字时显式传入 exact=True。
+"""
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class SystemStatsService:
+    """系统统计服务"""
+
+    CHECKPOINT_NAME = 'system_stats'
+
+    # 统计项: (模型名, 分组字段)，总数为各分组之和，每张表只查询一次
+    SECTIONS = {
+        'users': ('ChatUser', 'is_active'),
+        'prompts': ('PromptLibrary', 'is_active'),
+        'planned_tasks': ('PlannedTask', 'status'),
+        'reply_tasks': ('ReplyTask', 'status'),
+        'memories': ('MemoryLibrary', 'memory_type'),
+        'messages': ('MessageRecord', 'message_type'),
+        'emotions': ('EmotionRecord', None),
+    }
+
+    # 允许使用估算值的大表
+    ESTIMATED_SECTIONS = ('messages', 'emotions')
+
+    def __init__(self):
+        self.estimate_min_rows = getattr(settings, 'SYSTEM_STATS_ESTIMATE_MIN_ROWS', 100000)
+        self.max_age_seconds = getattr(settings, 'SYSTEM_STATS_REFRESH_MINUTES', 5) * 60 * 2
+
+    def estimate_rows(self, table: str) -> Optional[int]:
+        """
+        用 pg_class.reltuples 估算表的行数（分区表为各分区之和）
+
+        Args:
+            table: 表名
+
+        Returns:
+            Optional[int]: 估算行数；非 PostgreSQL 或表从未 ANALYZE 时返回 None
+        """
+        if connection.vendor != 'postgresql':
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT COUNT(*), SUM(c.reltuples), MIN(c.reltuples)
+                FROM pg_class c
+                WHERE c.relkind = 'r' AND (
+                    c.oid = to_regclass(%s)
+                    OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))
+                )
+            """, [table, table])
+            relations, total, min_reltuples = cursor.fetchone()
+
+        # reltuples 为 -1 表示尚未 ANALYZE（PostgreSQL 14+），此时估算不可用
+        if not relations or min_reltuples is None or min_reltuples < 0:
+            return None
+        return int(total)
+
+    def _count_section(self, model, group_field: Optional[str]) -> Dict:
+        """精确统计：按分组字段 GROUP BY 一次查出各分组数量和总数"""
+        if group_field is None:
+            return {'total': model.objects.count()}
+
+        rows = list(model.objects.order_by().values_list(group_field).annotate(count=Count('id')))
+        counts = {str(value).lower() if isinstance(value, bool) else value: count for value, count in rows}
+        counts['total'] = sum(count for _, count in rows)
+        return counts
+
+    def collect(self, exact: bool = False) -> Dict:
+        """
+        统计各表数量
+
+        Args:
+            exact: 为 True 时所有表都精确计数；否则超过阈值的大表使用估算值
+
+        Returns:
+            Dict: {'generated_at', 'exact', 'estimated': [统计项], 统计项: {分组值: 数量, 'total': 总数}}
+        """
+        from django.apps import apps
+
+        stats = {'generated_at': timezone.now().isoformat(), 'exact': exact, 'estimated': []}
+
+        for section, (model_name, group_field) in self.SECTIONS.items():
+            model = apps.get_model('core', model_name)
+
+            if not exact and section in self.ESTIMATED_SECTIONS:
+                estimate = self.estimate_rows(model._meta.db_table)
+                if estimate is not None and estimate >= self.estimate_min_rows:
+                    stats[section] = {'total': estimate}
+                    stats['estimated'].append(section)
+                    continue
+
+            stats[section] = self._count_section(model, group_field)
+
+        return stats
+
+    def refresh_snapshot(self, exact: bool = False) -> Dict:
+        """重新统计并保存快照"""
+        from core.models import JobCheckpoint
+
+        stats = self.collect(exact=exact)
+        JobCheckpoint.save_state(self.CHECKPOINT_NAME, stats)
+        return stats
+
+    def get_snapshot(self, exact: bool = False) -> Dict:
+        """
+        获取统计快照
+
+        exact=True 时同步精确统计并更新快照；否则读取已保存的快照，
+        快照不存在或超过两个刷新周期未更新（如调度器未运行）时才当场重新生成。
+
+        Args:
+            exact: 是否精确统计
+
+        Returns:
+            Dict: 统计快照，见 collect()
+        """
+        from core.models import JobCheckpoint
+
+        if exact:
+            return self.refresh_snapshot(exact=True)
+
+        stats = JobCheckpoint.load(self.CHECKPOINT_NAME)
+        generated_at = stats.get('generated_at')
+        if generated_at:
+            age = (timezone.now() - datetime.fromisoformat(generated_at)).total_seconds()
+            if age <= self.max_age_seconds:
+                return stats
+
+        return self.refresh_snapshot()
+
+
+# 全局单例
+_stats_service_instance = None
+
+
+def get_stats_service() -> SystemStatsService:
+    """获取系统统计服务单例"""
+    global _stats_service_instance
+    if _stats_service_instance is None:
+        _stats_service_instance = SystemStatsService()
+    return _stats_service_instance
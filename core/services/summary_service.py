@@ -0,0 +1,124 @@
+"""
+对话摘要服务 - 将最近消息窗口之外的历史对话增量折叠为每用户滚动摘要
+"""
+import logging
+from typing import TYPE_CHECKING
+from django.conf import settings
+
+if TYPE_CHECKING:
+    from core.models import ChatUser
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationSummaryService:
+    """对话摘要服务"""
+
+    def __init__(self):
+        self.every = getattr(settings, 'CONVERSATION_SUMMARY_EVERY', 20)
+        self.keep_recent = getattr(settings, 'CONVERSATION_SUMMARY_KEEP_RECENT', 10)
+        self.max_batch = getattr(settings, 'CONVERSATION_SUMMARY_MAX_BATCH', 100)
+
+    def get_summary(self, user: 'ChatUser') -> str:
+        """获取用户的对话摘要（按用户唯一索引查询一次）"""
+        from core.models import ConversationSummary
+
+        summary = ConversationSummary.objects.filter(user=user).values_list('summary', flat=True).first()
+        return summary or ''
+
+    def _foldable_count(self, user: 'ChatUser', last_message_id: int, limit: int) -> int:
+        """
+        计算最近消息窗口之外、尚未折叠的消息数，最多数到 limit 条
+
+        每条消息都会调用，没有摘要的老用户不能每次都统计全部历史（跨所有月分区），
+        因此用 COUNT(*) FROM (... LIMIT n) 在数够后即停止。
+        """
+        from core.models import MessageRecord
+
+        pending = MessageRecord.objects.filter(
+            user=user, id__gt=last_message_id
+        ).order_by()[:self.keep_recent + limit].count()
+        return pending - self.keep_recent
+
+    def should_update(self, user: 'ChatUser') -> bool:
+        """
+        判断是否需要更新摘要（窗口外未折叠的消息达到 CONVERSATION_SUMMARY_EVERY 条）
+
+        Args:
+            user: 聊天用户对象
+
+        Returns:
+            bool: 是否需要更新
+        """
+        from core.models import ConversationSummary
+
+        if self.every <= 0:
+            return False
+
+        last_message_id = ConversationSummary.objects.filter(
+            user=user
+        ).values_list('last_message_id', flat=True).first() or 0
+
+        return self._foldable_count(user, last_message_id, self.every) >= self.every
+
+    def update_summary(self, user: 'ChatUser', ai_service=None) -> bool:
+        """
+        将窗口外最早的一批消息折叠进摘要（一次 AI 调用）
+
+        Args:
+            user: 聊天用户对象
+            ai_service: AI 服务，默认新建
+
+        Returns:
+            bool: 是否更新了摘要
+        """
+        from core.models import ConversationSummary, MessageRecord
+
+        summary_record, _ = ConversationSummary.objects.get_or_create(user=user)
+
+        foldable = self._foldable_count(user, summary_record.last_message_id, max(self.every, self.max_batch))
+        if foldable < self.every:
+            return False
+
+        messages = list(MessageRecord.objects.filter(
+            user=user,
+            id__gt=summary_record.last_message_id
+        ).order_by('id').values(
+            'id', 'sender', 'receiver', 'content', 'timestamp'
+        )[:min(foldable, self.max_batch)])
+
+        if ai_service is None:
+            from core.services.ai_service import AIService
+            ai_service = AIService()
+
+        new_summary = ai_service.summarize_conversation(user, summary_record.summary, [
+            {
+                'sender': m['sender'],
+                'receiver': m['receiver'],
+                'content': m['content'],
+                'timestamp': m['timestamp'].strftime('%Y-%m-%d %H:%M'),
+            }
+            for m in messages
+        ])
+        if not new_summary:
+            return False
+
+        summary_record.summary = new_summary
+        summary_record.last_message_id = messages[-1]['id']
+        summary_record.summarized_count += len(messages)
+        summary_record.save(update_fields=['summary', 'last_message_id', 'summarized_count', 'updated_at'])
+
+        logger.info(f"用户 {user} 对话摘要已更新，累计折叠 {summary_record.summarized_count} 条消息")
+        return True
+
+
+# 全局单例
+_summary_service_instance = None
+
+
+def get_summary_service() -> ConversationSummaryService:
+    """获取对话摘要服务单例"""
+    global _summary_service_instance
+    if _summary_service_instance is None:
+        _summary_service_instance = ConversationSummaryService()
+    return _summary_service_instance
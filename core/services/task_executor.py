@@ -1,8 +1,8 @@
 import logging
 from typing import Optional
 from datetime import datetime
-from django.utils import timezone
 
+from core import clock
 from core.models import ReplyTask, MessageRecord
 
 logger = logging.getLogger(__name__)
@@ -48,8 +48,7 @@ def execute_reply_task(task: ReplyTask) -> bool:
 
             # 如果重试次数未超过限制，重新标记为待执行
             if task.retry_count < 3:
-                task.status = 'pending'
-                task.save(update_fields=['status'])
+                task.mark_pending()
                 logger.warning(f"回复任务 #{task.id} 发送失败，将重试 (第{task.retry_count}次)")
             else:
                 logger.error(f"回复任务 #{task.id} 重试次数已达上限，放弃执行")
@@ -165,12 +164,13 @@ def _record_sent_message(task: ReplyTask):
             sender='我',  # 当前用户
             receiver=receiver_name,
             content=task.content,
-            timestamp=timezone.now(),
+            timestamp=clock.now(),
             reply_task=task,
             raw_data={
                 'trigger_type': task.trigger_type,
                 'task_id': task.id,
             },
+            metadata={'trace_id': context['trace_id']} if context.get('trace_id') else {},
         )
 
         logger.info(f"消息已记录到数据库（用户: {task.user}）：{task.content[:50]}...")
@@ -190,7 +190,7 @@ def execute_batch_reply_tasks(max_tasks: int = 10):
         from core.models import ReplyTask
 
         # 查找到期的待执行任务（只处理活跃用户的任务）
-        now = timezone.now()
+        now = clock.now()
         pending_tasks = ReplyTask.objects.filter(
             status='pending',
             scheduled_time__lte=now,
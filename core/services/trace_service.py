@@ -0,0 +1,89 @@
+"""
+追踪服务 - 缓冲并批量写入追踪 span，按 trace 查询时间线，清理过期 span
+
+span 由 core.tracing 在各处理阶段结束时提交，经 core.buffering 缓冲后批量写入（批大小和间隔见
+TRACE_BATCH_SIZE / TRACE_FLUSH_SECONDS）；调度器每日删除超过 TRACE_RETENTION_DAYS 天的 span。
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+
+from core import clock
+from core.buffering import BufferedBulkWriter
+
+logger = logging.getLogger(__name__)
+
+
+class TraceService:
+    """追踪服务"""
+
+    def __init__(self):
+        self.retention_days = getattr(settings, 'TRACE_RETENTION_DAYS', 7)
+        self.writer = BufferedBulkWriter(
+            'trace_span', '追踪 span',
+            batch_size=getattr(settings, 'TRACE_BATCH_SIZE', 200),
+            flush_seconds=getattr(settings, 'TRACE_FLUSH_SECONDS', 10),
+            max_buffer=getattr(settings, 'TRACE_MAX_BUFFER', 20000),
+        )
+
+    def record(self, trace_id: str, span_id: str, parent_id: str, name: str, started_at, duration_ms: float,
+               attributes: Dict = None):
+        """记录一个 span（只放入内存缓冲，不访问数据库）"""
+        from core.models import TraceSpan
+
+        self.writer.add(TraceSpan(
+            trace_id=trace_id,
+            span_id=span_id,
+            parent_id=parent_id or '',
+            name=name[:100],
+            started_at=started_at,
+            duration_ms=round(duration_ms, 3),
+            attributes=attributes or {},
+        ))
+
+    def get_spans(self, trace_ids: Iterable[str]) -> List:
+        """按开始时间返回若干 trace 的全部 span"""
+        from core.models import TraceSpan
+
+        trace_ids = [t for t in trace_ids if t]
+        if not trace_ids:
+            return []
+        return list(TraceSpan.objects.filter(trace_id__in=trace_ids).order_by('started_at', 'id'))
+
+    def cleanup(self, batch_size: int = 10000) -> int:
+        """
+        分批删除超过保留天数的 span
+
+        Returns:
+            int: 删除的条数
+        """
+        from core.models import TraceSpan
+
+        if self.retention_days <= 0:
+            return 0
+
+        cutoff = clock.now() - timedelta(days=self.retention_days)
+        deleted = 0
+        while True:
+            ids = list(TraceSpan.objects.filter(started_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            deleted += TraceSpan.objects.filter(id__in=ids).delete()[0]
+
+        if deleted:
+            logger.info(f"已删除 {deleted} 条 {self.retention_days} 天前的追踪 span")
+        return deleted
+
+
+# 全局单例
+_trace_service_instance = None
+
+
+def get_trace_service() -> TraceService:
+    """获取追踪服务单例"""
+    global _trace_service_instance
+    if _trace_service_instance is None:
+        _trace_service_instance = TraceService()
+    return _trace_service_instance
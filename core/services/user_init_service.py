@@ -105,6 +105,8 @@ class UserInitService:
                     ('hotspot_judge', 'hotspot_judge_prompt'),
                     ('message_merge', 'message_merge_prompt'),
                     ('emotion_analysis', 'emotion_analysis_prompt'),
+                    ('memory_consolidation', 'memory_consolidation_prompt'),
+                    ('conversation_summary', 'conversation_summary_prompt'),
                 ]
 
                 for category, key in prompt_categories:
@@ -0,0 +1,431 @@
+"""
+用户数据迁移服务 - 将单个用户的全部数据导出为归档文件，并在其他实例上导入
+
+归档为 zip 文件，每张表一个 CSV 成员（与 PostgreSQL COPY ... WITH (FORMAT csv, HEADER) 格式一致），
+另有 manifest.json 记录版本、列和行数，user.json 记录用户本身和对话摘要。
+
+PostgreSQL 上导出直接 COPY TO STDOUT 写入 zip 成员，导入先 COPY FROM STDIN 到临时表，
+再用一条 INSERT ... SELECT 分配新 ID 并改写外键，全程不经过 ORM 逐行处理；
+其他数据库退化为 ORM 逐批读写（仅用于开发环境）。
+"""
+import csv
+import io
+import json
+import logging
+import zipfile
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class UserTransferService:
+    """用户数据迁移服务"""
+
+    ARCHIVE_VERSION = 1
+
+    # 按依赖顺序排列：被引用的表在前，导入时先建立其 ID 映射
+    TABLES = [
+        'RawPayload',
+        'PromptLibrary',
+        'MemoryLibrary',
+        'PlannedTask',
+        'EmotionRecord',
+        'ReplyTask',
+        'MessageRecord',
+    ]
+
+    # 需要改写的外键列: 被引用的表
+    REMAPPED_COLUMNS = {
+        'raw_payload_id': 'RawPayload',
+        'reply_task_id': 'ReplyTask',
+    }
+
+    USER_FIELDS = ['user_id', 'username', 'nickname', 'is_active', 'is_initialized', 'metadata', 'created_at']
+
+    BATCH_SIZE = 2000
+
+    @staticmethod
+    def _model(name: str):
+        from django.apps import apps
+        return apps.get_model('core', name)
+
+    def _columns(self, model) -> list:
+        return [field.column for field in model._meta.concrete_fields]
+
+    def _user_queryset(self, name: str, user):
+        """用户在某张表中的全部数据（按 ID 排序）"""
+        model = self._model(name)
+        if name == 'RawPayload':
+            ReplyTask = self._model('ReplyTask')
+            MessageRecord = self._model('MessageRecord')
+            queryset = model.objects.filter(
+                Q(id__in=ReplyTask.objects.filter(user=user).values('raw_payload_id'))
+                | Q(id__in=MessageRecord.objects.filter(user=user).values('raw_payload_id'))
+            )
+        else:
+            queryset = model.objects.filter(user=user)
+        return queryset.order_by('id')
+
+    # ==================== 导出 ====================
+
+    def export_user(self, user, output, progress=None) -> Dict:
+        """
+        导出用户的全部数据
+
+        Args:
+            user: ChatUser 实例
+            output: 输出文件路径或可写的二进制文件对象
+            progress: 进度回调 progress(表名, 行数)
+
+        Returns:
+            Dict: manifest
+        """
+        manifest = {
+            'version': self.ARCHIVE_VERSION,
+            'exported_at': timezone.now().isoformat(),
+            'user_id': user.user_id,
+            'tables': {},
+        }
+
+        summary = self._model('ConversationSummary').objects.filter(user=user).values(
+            'summary', 'last_message_id', 'summarized_count'
+        ).first()
+        user_data = {
+            'user': {field: getattr(user, field) for field in self.USER_FIELDS},
+            'conversation_summary': summary,
+        }
+
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+            archive.writestr('user.json', json.dumps(user_data, ensure_ascii=False, default=str, indent=2))
+
+            # 导出期间保持同一快照，避免表之间的引用不一致
+            with transaction.atomic():
+                for name in self.TABLES:
+                    model = self._model(name)
+                    queryset = self._user_queryset(name, user)
+                    columns = self._columns(model)
+
+                    with archive.open(f'{model._meta.db_table}.csv', 'w', force_zip64=True) as member:
+                        if connection.vendor == 'postgresql':
+                            rows = self._copy_out(queryset, columns, member)
+                        else:
+                            rows = self._write_csv(queryset, columns, member)
+
+                    manifest['tables'][model._meta.db_table] = {'columns': columns, 'rows': rows}
+                    if progress:
+                        progress(model._meta.db_table, rows)
+
+            archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+
+        return manifest
+
+    def _copy_out(self, queryset, columns: list, member) -> int:
+        """PostgreSQL：COPY (SELECT ...) TO STDOUT 直接写入归档成员"""
+        sql, params = queryset.values_list(*columns).query.sql_with_params()
+        with connection.cursor() as cursor:
+            copy_sql = cursor.mogrify(f'COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)', params).decode()
+            cursor.copy_expert(copy_sql, member)
+            return cursor.rowcount
+
+    def _write_csv(self, queryset, columns: list, member) -> int:
+        """其他数据库：逐批读取并按 COPY 的 CSV 约定写入（NULL 为不加引号的空值，布尔为 t/f，二进制为 \\x 十六进制）"""
+        text = io.TextIOWrapper(member, encoding='utf-8', newline='')
+        writer = csv.writer(text, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerow(columns)
+
+        rows = 0
+        for row in queryset.values_list(*columns).iterator(chunk_size=self.BATCH_SIZE):
+            writer.writerow([self._to_csv_value(value) for value in row])
+            rows += 1
+
+        text.flush()
+        text.detach()
+        return rows
+
+    @staticmethod
+    def _to_csv_value(value):
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False)
+        if isinstance(value, (bytes, memoryview)):
+            return '\\x' + bytes(value).hex()
+        return value
+
+    # ==================== 导入 ====================
+
+    def read_manifest(self, archive_path) -> Dict:
+        """读取并校验归档的 manifest"""
+        with zipfile.ZipFile(archive_path) as archive:
+            manifest = json.loads(archive.read('manifest.json'))
+
+        if manifest.get('version') != self.ARCHIVE_VERSION:
+            raise ValueError(f"不支持的归档版本: {manifest.get('version')}（当前为 {self.ARCHIVE_VERSION}）")
+
+        for name in self.TABLES:
+            model = self._model(name)
+            table = model._meta.db_table
+            archived = manifest['tables'].get(table)
+            if archived is None:
+                raise ValueError(f'归档中缺少表 {table}')
+
+            fields = {field.column: field for field in model._meta.concrete_fields}
+            unknown = set(archived['columns']) - set(fields)
+            missing = [column for column, field in fields.items()
+                       if column not in archived['columns'] and not field.null]
+            if unknown or missing:
+                raise ValueError(
+                    f"表 {table} 的结构与归档不一致（归档多出: {sorted(unknown) or '无'}，归档缺少: {missing or '无'}）"
+                )
+
+        return manifest
+
+    def import_user(self, archive_path, user_id: Optional[str] = None, progress=None) -> Tuple[object, Dict]:
+        """
+        导入用户归档，所有记录分配新 ID，外键按映射改写
+
+        Args:
+            archive_path: 归档文件路径
+            user_id: 以此 user_id 导入（默认使用归档中的 user_id）
+            progress: 进度回调 progress(表名, 行数)
+
+        Returns:
+            Tuple[ChatUser, Dict]: (新建的用户, {表名: 导入行数})
+        """
+        from core.models import ChatUser, ConversationSummary, EmotionState
+
+        manifest = self.read_manifest(archive_path)
+
+        with zipfile.ZipFile(archive_path) as archive:
+            user_data = json.loads(archive.read('user.json'))
+            fields = dict(user_data['user'])
+            if user_id:
+                fields['user_id'] = user_id
+            if ChatUser.objects.filter(user_id=fields['user_id']).exists():
+                raise ValueError(f"用户 {fields['user_id']} 已存在，可用 --user-id 以其他 user_id 导入")
+
+            counts = {}
+            with transaction.atomic():
+                created_at = fields.pop('created_at', None)
+                user = ChatUser.objects.create(**fields)
+                if created_at:
+                    ChatUser.objects.filter(pk=user.pk).update(created_at=created_at)
+
+                if connection.vendor == 'postgresql':
+                    importer = PostgresUserImporter(self, archive, manifest, user)
+                else:
+                    importer = OrmUserImporter(self, archive, manifest, user)
+
+                for name in self.TABLES:
+                    table = self._model(name)._meta.db_table
+                    counts[table] = importer.import_table(name)
+                    if progress:
+                        progress(table, counts[table])
+
+                summary = user_data.get('conversation_summary')
+                if summary:
+                    ConversationSummary.objects.create(
+                        user=user,
+                        summary=summary['summary'],
+                        last_message_id=importer.map_last_message_id(summary['last_message_id']),
+                        summarized_count=summary['summarized_count'],
+                    )
+
+                ChatUser.reconcile_counters(ChatUser.objects.filter(pk=user.pk))
+
+        EmotionState.rebuild(user)
+        return user, counts
+
+
+class PostgresUserImporter:
+    """PostgreSQL 导入：COPY 到临时表，再 INSERT ... SELECT 分配新 ID 并改写外键"""
+
+    def __init__(self, service: UserTransferService, archive: zipfile.ZipFile, manifest: Dict, user):
+        self.service = service
+        self.archive = archive
+        self.manifest = manifest
+        self.user = user
+
+    def _stage(self, table: str) -> str:
+        return f'_import_{table}'
+
+    def _map(self, table: str) -> str:
+        return f'_import_{table}_map'
+
+    def import_table(self, name: str) -> int:
+        model = self.service._model(name)
+        table = model._meta.db_table
+        columns = self.manifest['tables'][table]['columns']
+        column_list = ', '.join(f'"{column}"' for column in columns)
+        stage, id_map = self._stage(table), self._map(table)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {column_list} FROM "{table}" WITH NO DATA'
+            )
+            with self.archive.open(f'{table}.csv') as member:
+                cursor.copy_expert(f'COPY {stage} ({column_list}) FROM STDIN WITH (FORMAT csv, HEADER)', member)
+
+            if name == 'RawPayload':
+                # 原始数据按内容寻址，已存在的直接复用
+                insert_columns = ', '.join(f'"{column}"' for column in columns if column != 'id')
+                cursor.execute(
+                    f'INSERT INTO raw_payload ({insert_columns}) SELECT {insert_columns} FROM {stage} '
+                    f'ON CONFLICT (digest) DO NOTHING'
+                )
+                cursor.execute(
+                    f'CREATE TEMP TABLE {id_map} ON COMMIT DROP AS '
+                    f'SELECT s.id AS old_id, r.id AS new_id FROM {stage} s JOIN raw_payload r ON r.digest = s.digest'
+                )
+                cursor.execute(f'SELECT COUNT(*) FROM {stage}')
+                return cursor.fetchone()[0]
+
+            # 按原 ID 顺序分配新 ID，保持记录的相对顺序
+            cursor.execute(
+                f'CREATE TEMP TABLE {id_map} ON COMMIT DROP AS '
+                f"SELECT old_id, nextval(pg_get_serial_sequence(%s, 'id')) AS new_id "
+                f'FROM (SELECT id AS old_id FROM {stage} ORDER BY id) s',
+                [table]
+            )
+            cursor.execute(f'CREATE UNIQUE INDEX ON {id_map} (old_id)')
+
+            if table == 'message_record':
+                self._ensure_partitions(cursor, stage)
+
+            select_list, joins = [], []
+            for column in columns:
+                if column == 'id':
+                    select_list.append('m.new_id')
+                elif column == 'user_id':
+                    select_list.append('%s')
+                elif column in self.service.REMAPPED_COLUMNS:
+                    ref_table = self.service._model(self.service.REMAPPED_COLUMNS[column])._meta.db_table
+                    alias = f'ref_{column}'
+                    joins.append(f'LEFT JOIN {self._map(ref_table)} {alias} ON {alias}.old_id = s."{column}"')
+                    select_list.append(f'{alias}.new_id')
+                else:
+                    select_list.append(f's."{column}"')
+
+            cursor.execute(
+                f'INSERT INTO "{table}" ({column_list}) '
+                f'SELECT {", ".join(select_list)} FROM {stage} s JOIN {id_map} m ON m.old_id = s.id '
+                f'{" ".join(joins)}',
+                [self.user.pk]
+            )
+            return cursor.rowcount
+
+    def _ensure_partitions(self, cursor, stage: str):
+        """消息记录为分区表时，确保导入数据覆盖的月份都有分区"""
+        from core.services.partition_service import get_partition_service
+
+        cursor.execute(f'SELECT MIN("timestamp"), MAX("timestamp") FROM {stage}')
+        start, end = cursor.fetchone()
+        if start is not None:
+            get_partition_service().ensure_partitions(start, end)
+
+    def map_last_message_id(self, last_message_id: int) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COALESCE(MAX(new_id), 0) FROM {self._map("message_record")} WHERE old_id <= %s',
+                [last_message_id]
+            )
+            return cursor.fetchone()[0]
+
+
+class OrmUserImporter:
+    """其他数据库的导入：逐批解析 CSV，在内存中改写 ID 后 bulk_create（仅用于开发环境）"""
+
+    def __init__(self, service: UserTransferService, archive: zipfile.ZipFile, manifest: Dict, user):
+        self.service = service
+        self.archive = archive
+        self.manifest = manifest
+        self.user = user
+        self.id_maps = {}
+
+    def _parse(self, field, value: str):
+        if value == '' and field.null:
+            return None
+        internal_type = field.get_internal_type()
+        if internal_type == 'JSONField':
+            return json.loads(value)
+        if internal_type == 'BinaryField':
+            return bytes.fromhex(value[2:])
+        return field.to_python(value)
+
+    def import_table(self, name: str) -> int:
+        model = self.service._model(name)
+        table = model._meta.db_table
+        fields = {field.column: field for field in model._meta.concrete_fields}
+        id_map = self.id_maps.setdefault(name, {})
+
+        rows = 0
+        with self.archive.open(f'{table}.csv') as member:
+            reader = csv.DictReader(io.TextIOWrapper(member, encoding='utf-8', newline=''))
+            batch, old_ids = [], []
+            for row in reader:
+                values = {column: self._parse(fields[column], value) for column, value in row.items()}
+                old_id = values.pop('id')
+
+                if name == 'RawPayload':
+                    payload, _ = model.objects.get_or_create(digest=values['digest'], defaults=values)
+                    id_map[old_id] = payload.id
+                    rows += 1
+                    continue
+
+                values['user_id'] = self.user.pk
+                for column, ref_name in self.service.REMAPPED_COLUMNS.items():
+                    if values.get(column) is not None:
+                        values[column] = self.id_maps.get(ref_name, {}).get(values[column])
+
+                batch.append(model(**{fields[column].attname: value for column, value in values.items()}))
+                old_ids.append(old_id)
+                if len(batch) >= self.service.BATCH_SIZE:
+                    rows += self._flush(model, batch, old_ids, id_map)
+                    batch, old_ids = [], []
+
+            rows += self._flush(model, batch, old_ids, id_map)
+
+        return rows
+
+    def _flush(self, model, batch: list, old_ids: list, id_map: dict) -> int:
+        if not batch:
+            return 0
+
+        # bulk_create 会覆盖 auto_now / auto_now_add 字段，之后按原值写回
+        timestamps = [
+            {field.attname: getattr(obj, field.attname) for field in model._meta.concrete_fields
+             if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)}
+            for obj in batch
+        ]
+        created = model.objects.bulk_create(batch)
+        for obj, old_id, values in zip(created, old_ids, timestamps):
+            id_map[old_id] = obj.pk
+            for attname, value in values.items():
+                setattr(obj, attname, value)
+        if timestamps and timestamps[0]:
+            model.objects.bulk_update(created, list(timestamps[0]), batch_size=500)
+
+        return len(created)
+
+    def map_last_message_id(self, last_message_id: int) -> int:
+        mapped = [new_id for old_id, new_id in self.id_maps.get('MessageRecord', {}).items()
+                  if old_id <= last_message_id]
+        return max(mapped, default=0)
+
+
+# 全局单例
+_user_transfer_service_instance = None
+
+
+def get_user_transfer_service() -> UserTransferService:
+    """获取用户数据迁移服务单例"""
+    global _user_transfer_service_instance
+    if _user_transfer_service_instance is None:
+        _user_transfer_service_instance = UserTransferService()
+    return _user_transfer_service_instance
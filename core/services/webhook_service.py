@@ -3,14 +3,16 @@ Webhook 消息服务 - 基于 Synology Chat API 实现
 替代 itchat 微信服务，通过 Webhook 方式收发消息
 """
 import logging
+import time
 import requests
 import json
 from typing import Optional, Callable, Dict, Any, TYPE_CHECKING
-from datetime import datetime
 from django.conf import settings
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from core import clock, metrics, tracing
+
 if TYPE_CHECKING:
     from core.models import ChatUser
 
@@ -62,6 +64,8 @@ class WebhookService:
         Returns:
             发送结果
         """
+        started = time.monotonic()
+        status = 'error'
         try:
             logger.info(f"Sending webhook to {self.webhook_url}")
             logger.info(f"Payload: {payload}")
@@ -76,13 +80,16 @@ class WebhookService:
             }
 
             # 发送请求
-            response = self.session.post(
-                self.webhook_url,
-                data=data,
-                headers=headers,
-                timeout=(10, 30)  # (连接超时, 读取超时)
-            )
-
+            with tracing.span('webhook.send') as span:
+                response = self.session.post(
+                    self.webhook_url,
+                    data=data,
+                    headers=headers,
+                    timeout=(10, 30)  # (连接超时, 读取超时)
+                )
+                span['status'] = response.status_code
+
+            status = str(response.status_code)
             result = {
                 "status": "success",
                 "status_code": response.status_code,
@@ -102,6 +109,8 @@ class WebhookService:
             }
             logger.error(f"Failed to send webhook: {str(e)}")
             return error_result
+        finally:
+            metrics.WEBHOOK_SEND_SECONDS.labels(status=status).observe(time.monotonic() - started)
 
     def send_message(self, content: str, user_ids: Optional[list] = None) -> bool:
         """
@@ -245,13 +254,14 @@ class WebhookService:
             )
 
             # 保存到数据库
-            self._save_received_message(
-                user=chat_user,
-                sender=username,
-                content=text,
-                msg_type='text',
-                raw_data=data
-            )
+            with tracing.span('message.save'):
+                self._save_received_message(
+                    user=chat_user,
+                    sender=username,
+                    content=text,
+                    msg_type='text',
+                    raw_data=data
+                )
 
             # 调用回调函数
             if self.message_callback:
@@ -280,8 +290,8 @@ class WebhookService:
             }
 
     def _save_received_message(self, user: 'ChatUser', sender: str, content: str, msg_type: str, raw_data: dict):
-        """保存接收到的消息到数据库"""
-        from core.models import MessageRecord
+        """保存接收到的消息到数据库（完整原始请求存入冷存储，消息记录只引用其ID）"""
+        from core.models import MessageRecord, RawPayload
 
         try:
             MessageRecord.objects.create(
@@ -290,12 +300,13 @@ class WebhookService:
                 sender=sender,
                 receiver='我',
                 content=content,
-                timestamp=datetime.now(),
+                timestamp=clock.local_now(),
                 raw_data={
                     'msg_type': msg_type,
                     'source': 'webhook',
-                    'raw': raw_data
                 },
+                raw_payload=RawPayload.store(raw_data),
+                metadata=_trace_metadata(),
             )
         except Exception as e:
             logger.error(f"保存接收消息失败: {e}")
@@ -311,8 +322,9 @@ class WebhookService:
                 sender='我',
                 receiver=receiver,
                 content=content,
-                timestamp=datetime.now(),
+                timestamp=clock.local_now(),
                 raw_data={'source': 'webhook'},
+                metadata=_trace_metadata(),
             )
         except Exception as e:
             logger.error(f"保存发送消息失败: {e}")
@@ -342,6 +354,12 @@ class WebhookService:
             return False
 
 
+def _trace_metadata() -> dict:
+    """消息记录的追踪信息（不在 trace 中时为空）"""
+    trace_id = tracing.current_trace_id()
+    return {'trace_id': trace_id} if trace_id else {}
+
+
 # 全局单例
 _webhook_service_instance = None
 
@@ -1,2 +1,36 @@
 # 信号处理器
 # 用于处理模型保存、删除等事件的自动化逻辑
+#
+# ChatUser 的冗余计数器在写入时通过 F() 表达式原子更新。
+# 这里只处理新增；删除不接信号（post_delete 接收器会让批量删除和级联删除退化为逐行加载、逐行更新），
+# 由执行删除的代码调用 ChatUser.update_counters，其余漂移由 reconcile_counters 命令修复。
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from core.models import ChatUser, MemoryLibrary, MessageRecord, ReplyTask
+
+
+@receiver(post_save, sender=MessageRecord)
+def count_new_message(sender, instance, created, **kwargs):
+    """新消息：消息数 +1，并推进最近收发时间"""
+    if not created:
+        return
+
+    if instance.message_type == 'received':
+        ChatUser.update_counters(instance.user_id, message_count=1, last_message_at=instance.timestamp)
+    else:
+        ChatUser.update_counters(instance.user_id, message_count=1, last_sent_at=instance.timestamp)
+
+
+@receiver(post_save, sender=MemoryLibrary)
+def count_new_memory(sender, instance, created, **kwargs):
+    """新记忆：记忆数 +1"""
+    if created:
+        ChatUser.update_counters(instance.user_id, memory_count=1)
+
+
+@receiver(post_save, sender=ReplyTask)
+def count_new_reply_task(sender, instance, created, **kwargs):
+    """新的待执行回复任务：待回复任务数 +1（之后的状态变化由 ReplyTask 的状态方法维护）"""
+    if created and instance.status == 'pending':
+        ChatUser.update_counters(instance.user_id, pending_reply_count=1)
@@ -0,0 +1,129 @@
+# 请求追踪
+# webhook_incoming 为每条收到的消息生成 trace_id，经回复任务（ReplyTask.context['trace_id']）传递到发送出的消息
+# （MessageRecord.metadata['trace_id']）。各阶段（接收、上下文查询、每次 LLM 调用、排队等待、整合、发送）
+# 记录为带耗时的 span，由 TraceService 异步批量写入 trace_span 表，管理后台按消息显示时间线。
+#
+# 当前 trace 和父 span 保存在 contextvars 中：没有进入 trace() 时 span() 不做任何记录，
+# 因此 AI 服务、webhook 服务等可以无条件地包裹 span()，只有处于某条消息的处理流程中时才会被记录。
+import contextvars
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Optional
+
+from django.conf import settings
+
+from core import clock
+
+# (trace_id, 当前 span_id)
+_current = contextvars.ContextVar('ruochat_trace', default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _new_span_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id() -> Optional[str]:
+    """当前 trace_id，不在 trace 中时返回 None"""
+    current = _current.get()
+    return current[0] if current else None
+
+
+@contextmanager
+def trace(trace_id: Optional[str] = None):
+    """
+    进入一个 trace（传入已有的 trace_id 则继续该 trace，否则按 TRACE_SAMPLE_RATE 采样生成新的）
+
+    Yields:
+        Optional[str]: trace_id；追踪关闭或未被采样时为 None，其中的 span() 不做记录
+    """
+    if trace_id is None and getattr(settings, 'TRACE_ENABLED', True):
+        if random.random() < getattr(settings, 'TRACE_SAMPLE_RATE', 1.0):
+            trace_id = new_trace_id()
+
+    token = _current.set((trace_id, '') if trace_id else None)
+    try:
+        yield trace_id
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    记录一个阶段的耗时（不在 trace 中时不做任何事）
+
+    Yields:
+        dict: span 属性，可在块内补充（如状态码）
+    """
+    current = _current.get()
+    if current is None:
+        yield attributes
+        return
+
+    trace_id, parent_id = current
+    span_id = _new_span_id()
+    started_at = clock.now()
+    started = time.monotonic()
+    token = _current.set((trace_id, span_id))
+    try:
+        yield attributes
+    except Exception as e:
+        attributes['error'] = str(e)[:500]
+        raise
+    finally:
+        _current.reset(token)
+        _record(trace_id, span_id, parent_id, name, started_at, (time.monotonic() - started) * 1000, attributes)
+
+
+def record_span(name: str, started_at: datetime, duration_ms: float, trace_id: Optional[str] = None, **attributes):
+    """
+    直接记录一个已知起止时间的 span（如回复任务从创建到计划时间的等待），父 span 为当前 span
+
+    Args:
+        name: 阶段名
+        started_at: 开始时间
+        duration_ms: 耗时（毫秒）
+        trace_id: 所属 trace，默认为当前 trace；两者都没有时不记录
+    """
+    current = _current.get()
+    parent_id = ''
+    if current and (trace_id is None or trace_id == current[0]):
+        trace_id, parent_id = current
+    if not trace_id:
+        return
+    _record(trace_id, _new_span_id(), parent_id, name, started_at, duration_ms, attributes)
+
+
+def _record(trace_id, span_id, parent_id, name, started_at, duration_ms, attributes):
+    from core.services.trace_service import get_trace_service
+
+    get_trace_service().record(
+        trace_id=trace_id,
+        span_id=span_id,
+        parent_id=parent_id,
+        name=name,
+        started_at=started_at,
+        duration_ms=duration_ms,
+        attributes=attributes,
+    )
+
+
+def traced_view(name: str):
+    """视图装饰器：为每个请求生成新的 trace，整个视图记录为根 span"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with trace(), span(name, method=request.method) as attributes:
+                response = view(request, *args, **kwargs)
+                attributes['status'] = response.status_code
+                return response
+        return wrapper
+    return decorator
@@ -24,8 +24,12 @@ urlpatterns = [
     # 情绪管理
     path('emotions/', views.list_emotions, name='list_emotions'),
     path('emotions/status/', views.get_emotion_status, name='get_emotion_status'),
+    path('emotions/trend/', views.get_emotion_trend, name='get_emotion_trend'),
     path('emotions/record/', views.manual_emotion_record, name='manual_emotion_record'),
 
+    # AI 调用统计
+    path('ai/calls/stats/', views.ai_call_stats, name='ai_call_stats'),
+
     # 用户初始化
     path('user/init/presets/', views.get_character_presets, name='get_character_presets'),
     path('user/init/status/', views.check_user_init_status, name='check_user_init_status'),
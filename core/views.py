@@ -1,7 +1,12 @@
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import base64
 import json
 import logging
 
@@ -14,24 +19,81 @@ from .models import (
     MessageRecord,
     EmotionRecord
 )
+from . import clock, metrics, tracing
 from .services.ai_service import AIService
 from .services.context_service import ContextService
 
 logger = logging.getLogger(__name__)
 
 
+@require_http_methods(["GET"])
+def healthz(request):
+    """
+    健康检查：只检查数据库连通性和调度器存活，不做任何统计
+
+    全部正常返回 200，否则返回 503（供容器 HEALTHCHECK 使用）
+    """
+    from django.db import connection
+    from .scheduler import get_scheduler_health
+
+    checks = {}
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        checks['database'] = {'ok': True}
+    except Exception as e:
+        checks['database'] = {'ok': False, 'error': str(e)}
+
+    checks['scheduler'] = get_scheduler_health()
+
+    healthy = all(check['ok'] for check in checks.values())
+    return JsonResponse({
+        'status': 'ok' if healthy else 'unhealthy',
+        'checks': checks,
+    }, status=200 if healthy else 503)
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """
+    Prometheus 指标（文本格式）
+
+    配置了 METRICS_TOKEN 时需携带 Authorization: Bearer <token>
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse('unauthorized', status=401, content_type='text/plain')
+
+    content, content_type = metrics.render()
+    return HttpResponse(content, content_type=content_type)
+
+
 @require_http_methods(["GET"])
 def system_status(request):
-    """获取系统状态"""
+    """
+    获取系统状态
+
+    默认读取定时刷新的统计快照（大表可能为估算值，见 estimated），
+    ?exact=1 时当场精确统计
+    """
+    from .services.stats_service import get_stats_service
+
+    exact = request.GET.get('exact', '').lower() in ('1', 'true', 'yes')
+    stats = get_stats_service().get_snapshot(exact=exact)
+
     return JsonResponse({
         'status': 'running',
-        'users_count': ChatUser.objects.filter(is_active=True).count(),
-        'prompts_count': PromptLibrary.objects.filter(is_active=True).count(),
-        'memories_count': MemoryLibrary.objects.count(),
-        'planned_tasks_count': PlannedTask.objects.filter(status='pending').count(),
-        'reply_tasks_count': ReplyTask.objects.filter(status='pending').count(),
-        'messages_count': MessageRecord.objects.count(),
-        'emotions_count': EmotionRecord.objects.count(),
+        'users_count': stats['users'].get('true', 0),
+        'prompts_count': stats['prompts'].get('true', 0),
+        'memories_count': stats['memories']['total'],
+        'planned_tasks_count': stats['planned_tasks'].get('pending', 0),
+        'reply_tasks_count': stats['reply_tasks'].get('pending', 0),
+        'messages_count': stats['messages']['total'],
+        'emotions_count': stats['emotions']['total'],
+        'generated_at': stats['generated_at'],
+        'exact': stats['exact'],
+        'estimated': stats['estimated'],
     })
 
 
@@ -102,7 +164,9 @@ def add_hotspot(request):
         is_memorable = ai_service.judge_hotspot_memorable(chat_user, title, content)
 
         if is_memorable:
-            memory = MemoryLibrary.objects.create(
+            from .services.memory_service import get_memory_service
+
+            memory = get_memory_service().create_memory(
                 user=chat_user,
                 title=title,
                 content=content,
@@ -130,9 +194,151 @@ def add_hotspot(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+# ==================== 列表分页 ====================
+
+LIST_MAX_LIMIT = 1000
+STREAM_CHUNK_SIZE = 2000
+
+
+class ListParamError(ValueError):
+    """列表查询参数错误"""
+
+
+def _encode_cursor(key_value, row_id) -> str:
+    """将最后一行的 (排序字段值, id) 编码为不透明的游标"""
+    raw = json.dumps([key_value.isoformat(), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor: str):
+    """解析游标，返回 (排序字段值, id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key_value, row_id = json.loads(raw)
+        key_value = parse_datetime(key_value)
+        if key_value is None or not isinstance(row_id, int):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ListParamError('cursor 无效')
+    return key_value, row_id
+
+
+def _parse_datetime_param(request, name: str):
+    """解析 ISO 格式的时间参数（也接受日期），不带时区时按当前时区处理"""
+    value = request.GET.get(name)
+    if not value:
+        return None
+
+    parsed = clock.parse_time(value)
+    if parsed is None:
+        raise ListParamError(f'{name} 格式无效，应为 ISO 8601 时间或日期')
+    return parsed
+
+
+def _keyset_list_response(request, queryset, key_field: str, fields: list, result_key: str,
+                          default_limit: int):
+    """
+    列表接口的通用分页/流式输出
+
+    按 (key_field, id) 做键集分页：下一页从上一页最后一行之后继续，
+    翻页代价与页码无关，翻页期间新增的数据也不会造成重复或遗漏。
+
+    查询参数：
+        cursor: 上一页返回的 next_cursor
+        order: desc（默认，最新在前）或 asc（适合增量同步）
+        since / until: 按 key_field 过滤，[since, until)
+        fields: 逗号分隔的返回字段（id 和 key_field 始终返回）
+        limit: 每页条数，默认 default_limit，最多 LIST_MAX_LIMIT
+        format: json（默认）或 ndjson（服务端游标流式输出全部结果，每行一个 JSON 对象）
+
+    Args:
+        request: 请求
+        queryset: 已按业务参数过滤的查询集
+        key_field: 排序字段（时间字段）
+        fields: 允许返回的字段
+        result_key: JSON 响应中结果列表的键名
+        default_limit: 默认每页条数
+    """
+    try:
+        output_format = request.GET.get('format', 'json')
+        if output_format not in ('json', 'ndjson'):
+            raise ListParamError('format 只能是 json 或 ndjson')
+
+        order = request.GET.get('order', 'desc')
+        if order not in ('asc', 'desc'):
+            raise ListParamError('order 只能是 asc 或 desc')
+
+        selected = fields
+        if request.GET.get('fields'):
+            selected = [f.strip() for f in request.GET['fields'].split(',') if f.strip()]
+            unknown = set(selected) - set(fields)
+            if unknown:
+                raise ListParamError(f"不支持的字段: {', '.join(sorted(unknown))}，可选: {', '.join(fields)}")
+        selected = list(dict.fromkeys(['id', key_field] + selected))
+
+        limit = request.GET.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise ListParamError('limit 必须是整数')
+            if limit <= 0:
+                raise ListParamError('limit 必须大于 0')
+        if output_format == 'json':
+            limit = min(limit or default_limit, LIST_MAX_LIMIT)
+
+        since = _parse_datetime_param(request, 'since')
+        until = _parse_datetime_param(request, 'until')
+
+        cursor = request.GET.get('cursor')
+        cursor_key = _decode_cursor(cursor) if cursor else None
+
+    except ListParamError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if since:
+        queryset = queryset.filter(**{f'{key_field}__gte': since})
+    if until:
+        queryset = queryset.filter(**{f'{key_field}__lt': until})
+
+    if cursor_key:
+        key_value, last_id = cursor_key
+        # 单独的范围条件让数据库可以直接用 key_field 上的索引定位起点
+        if order == 'desc':
+            queryset = queryset.filter(**{f'{key_field}__lte': key_value}).filter(
+                Q(**{f'{key_field}__lt': key_value}) | Q(**{key_field: key_value, 'id__lt': last_id})
+            )
+        else:
+            queryset = queryset.filter(**{f'{key_field}__gte': key_value}).filter(
+                Q(**{f'{key_field}__gt': key_value}) | Q(**{key_field: key_value, 'id__gt': last_id})
+            )
+
+    ordering = [key_field, 'id'] if order == 'asc' else [f'-{key_field}', '-id']
+    queryset = queryset.values(*selected).order_by(*ordering)
+
+    if output_format == 'ndjson':
+        if limit:
+            queryset = queryset[:limit]
+
+        def stream():
+            for row in queryset.iterator(chunk_size=STREAM_CHUNK_SIZE):
+                yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+        return StreamingHttpResponse(stream(), content_type='application/x-ndjson; charset=utf-8')
+
+    # 多取一行判断是否还有下一页
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1][key_field], rows[-1]['id'])
+
+    return JsonResponse({result_key: rows, 'next_cursor': next_cursor})
+
+
 @require_http_methods(["GET"])
 def list_planned_tasks(request):
-    """获取计划任务列表"""
+    """获取计划任务列表（按计划时间分页，参数见 _keyset_list_response）"""
     status = request.GET.get('status', None)
     user_id = request.GET.get('user_id', None)
     queryset = PlannedTask.objects.all()
@@ -143,17 +349,15 @@ def list_planned_tasks(request):
     if status:
         queryset = queryset.filter(status=status)
 
-    tasks = list(queryset.values(
+    return _keyset_list_response(request, queryset, 'scheduled_time', [
         'id', 'user__user_id', 'title', 'description', 'task_type',
         'scheduled_time', 'status', 'created_at'
-    ).order_by('-scheduled_time')[:50])
-
-    return JsonResponse({'tasks': tasks})
+    ], 'tasks', default_limit=50)
 
 
 @require_http_methods(["GET"])
 def list_reply_tasks(request):
-    """获取回复任务列表"""
+    """获取回复任务列表（按计划回复时间分页，参数见 _keyset_list_response）"""
     status = request.GET.get('status', None)
     user_id = request.GET.get('user_id', None)
     queryset = ReplyTask.objects.all()
@@ -164,17 +368,15 @@ def list_reply_tasks(request):
     if status:
         queryset = queryset.filter(status=status)
 
-    tasks = list(queryset.values(
+    return _keyset_list_response(request, queryset, 'scheduled_time', [
         'id', 'user__user_id', 'trigger_type', 'content', 'scheduled_time',
         'status', 'created_at', 'executed_at'
-    ).order_by('-scheduled_time')[:50])
-
-    return JsonResponse({'tasks': tasks})
+    ], 'tasks', default_limit=50)
 
 
 @require_http_methods(["GET"])
 def list_memories(request):
-    """获取记忆列表"""
+    """获取记忆列表（按创建时间分页，参数见 _keyset_list_response）"""
     memory_type = request.GET.get('type', None)
     user_id = request.GET.get('user_id', None)
     queryset = MemoryLibrary.objects.all()
@@ -185,17 +387,15 @@ def list_memories(request):
     if memory_type:
         queryset = queryset.filter(memory_type=memory_type)
 
-    memories = list(queryset.values(
+    return _keyset_list_response(request, queryset, 'created_at', [
         'id', 'user__user_id', 'title', 'content', 'memory_type',
         'strength', 'weight', 'forget_time', 'created_at'
-    ).order_by('-created_at')[:50])
-
-    return JsonResponse({'memories': memories})
+    ], 'memories', default_limit=50)
 
 
 @require_http_methods(["GET"])
 def list_messages(request):
-    """获取消息记录列表"""
+    """获取消息记录列表（按消息时间分页，参数见 _keyset_list_response）"""
     message_type = request.GET.get('type', None)
     user_id = request.GET.get('user_id', None)
     queryset = MessageRecord.objects.all()
@@ -206,18 +406,63 @@ def list_messages(request):
     if message_type:
         queryset = queryset.filter(message_type=message_type)
 
-    messages = list(queryset.values(
+    return _keyset_list_response(request, queryset, 'timestamp', [
         'id', 'user__user_id', 'message_type', 'sender', 'receiver',
         'content', 'timestamp', 'created_at'
-    ).order_by('-timestamp')[:100])
+    ], 'messages', default_limit=100)
+
+
+# ==================== AI Call API ====================
+
+@require_http_methods(["GET"])
+def ai_call_stats(request):
+    """
+    AI 调用统计：按调用方 / 用户 / 天汇总调用次数、失败数、token 用量、延迟分位数和费用
+
+    参数：days（最近几天，默认 7）、group_by（caller / user / caller_day / user_day，默认 caller）、user_id
+    """
+    from datetime import timedelta
+    from .services.ai_call_log_service import get_ai_call_log_service
+    from .models import AICallLog
+
+    group_by = request.GET.get('group_by', 'caller')
+    user_id = request.GET.get('user_id')
+
+    try:
+        days = int(request.GET.get('days', 7))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'days 必须是整数'}, status=400)
+    if days < 1:
+        return JsonResponse({'success': False, 'error': 'days 必须大于 0'}, status=400)
+
+    service = get_ai_call_log_service()
+    if group_by not in service.GROUPINGS:
+        return JsonResponse({
+            'success': False,
+            'error': f"group_by 只能是 {' / '.join(service.GROUPINGS)}"
+        }, status=400)
+
+    queryset = AICallLog.objects.all()
+    if user_id:
+        queryset = queryset.filter(user__user_id=user_id)
 
-    return JsonResponse({'messages': messages})
+    since = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+
+    return JsonResponse({
+        'success': True,
+        'days': days,
+        'group_by': group_by,
+        'since': since,
+        'stats': service.summarize(queryset, since=since, group_by=group_by),
+    }, encoder=DjangoJSONEncoder)
 
 
 # ==================== Webhook API ====================
 
 @csrf_exempt
 @require_http_methods(["POST", "GET"])
+@metrics.observe_response(metrics.WEBHOOK_INGEST_SECONDS)
+@tracing.traced_view('webhook.ingest')
 def webhook_incoming(request):
     """
     Webhook 消息接收端点
@@ -402,7 +647,7 @@ def webhook_test(request):
 
 @require_http_methods(["GET"])
 def list_emotions(request):
-    """获取情绪记录列表"""
+    """获取情绪记录列表（默认最近 hours 小时，按创建时间分页，参数见 _keyset_list_response）"""
     user_id = request.GET.get('user_id', None)
     emotion_type = request.GET.get('emotion_type', None)
     hours = request.GET.get('hours', 24)
@@ -423,16 +668,15 @@ def list_emotions(request):
     if emotion_type:
         queryset = queryset.filter(emotion_type=emotion_type)
 
-    # 按时间过滤
-    cutoff = tz.now() - timedelta(hours=hours)
-    queryset = queryset.filter(created_at__gte=cutoff)
+    # 按时间过滤（指定 since 时以 since 为准）
+    if not request.GET.get('since'):
+        cutoff = tz.now() - timedelta(hours=hours)
+        queryset = queryset.filter(created_at__gte=cutoff)
 
-    emotions = list(queryset.values(
+    return _keyset_list_response(request, queryset, 'created_at', [
         'id', 'user__user_id', 'emotion_type', 'intensity',
         'trigger_source', 'trigger_content', 'description', 'created_at'
-    ).order_by('-created_at')[:100])
-
-    return JsonResponse({'emotions': emotions})
+    ], 'emotions', default_limit=100)
 
 
 @require_http_methods(["GET"])
@@ -474,6 +718,59 @@ def get_emotion_status(request):
     })
 
 
+@require_http_methods(["GET"])
+def get_emotion_trend(request):
+    """获取用户长周期情绪趋势（读取按小时/按天的情绪汇总表）"""
+    user_id = request.GET.get('user_id', None)
+    days = request.GET.get('days', 30)
+    granularity = request.GET.get('granularity', 'day')
+
+    try:
+        days = int(days)
+    except ValueError:
+        days = 30
+
+    if granularity not in ('hour', 'day'):
+        return JsonResponse({
+            'success': False,
+            'error': 'granularity 只能是 hour 或 day'
+        }, status=400)
+
+    if not user_id:
+        return JsonResponse({
+            'success': False,
+            'error': '用户ID不能为空'
+        }, status=400)
+
+    try:
+        chat_user = ChatUser.objects.get(user_id=user_id)
+    except ChatUser.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': '用户不存在'
+        }, status=404)
+
+    from datetime import timedelta
+    from django.utils import timezone as tz
+    from .services.rollup_service import get_rollup_service
+
+    since = tz.localtime(tz.now() - timedelta(days=days))
+    since = since.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        since = since.replace(hour=0)
+
+    rollup_service = get_rollup_service()
+
+    return JsonResponse({
+        'success': True,
+        'user_id': user_id,
+        'days': days,
+        'granularity': granularity,
+        'trend': rollup_service.get_trend(chat_user, since=since, period=granularity),
+        'emotion_stats': rollup_service.get_emotion_stats(chat_user, since=since),
+    })
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def manual_emotion_record(request):
@@ -509,8 +806,8 @@ def manual_emotion_record(request):
         # 获取或创建用户
         chat_user = ChatUser.get_or_create_by_webhook(user_id=str(user_id))
 
-        # 创建情绪记录
-        emotion_record = EmotionRecord.objects.create(
+        # 创建情绪记录（同一事务中更新物化情绪状态）
+        emotion_record = EmotionRecord.record(
             user=chat_user,
             emotion_type=emotion_type,
             intensity=intensity,
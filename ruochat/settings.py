@@ -48,6 +48,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.profiling.ProfilingMiddleware',
+    'core.querystats.QueryStatsMiddleware',
 ]
 
 ROOT_URLCONF = 'ruochat.urls'
@@ -131,10 +133,89 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4-turbo-preview')
 OPENAI_API_BASE = os.getenv('OPENAI_API_BASE', '')  # 自定义 API Base URL
 
+# AI 调用录制/回放配置（离线压测与回归对比）
+AI_CASSETTE_MODE = os.getenv('AI_CASSETTE_MODE', 'off')  # off / record（录制真实调用）/ replay（回放录制结果，不访问网络）
+AI_CASSETTE_DIR = os.getenv('AI_CASSETTE_DIR', str(BASE_DIR / 'cassettes'))  # 录制文件目录
+AI_CASSETTE_REPLAY_LATENCY = os.getenv('AI_CASSETTE_REPLAY_LATENCY', 'False') == 'True'  # 回放时是否按录制耗时等待
+AI_CASSETTE_REPLAY_MISS = os.getenv('AI_CASSETTE_REPLAY_MISS', 'error')  # 回放未命中时：error（报错）/ live（调用真实接口）
+
+# AI 调用记录配置（每次 LLM 调用的 token 用量和耗时，异步批量写入 ai_call_log 表）
+AI_CALL_LOG_ENABLED = os.getenv('AI_CALL_LOG_ENABLED', 'True') == 'True'  # 是否记录 AI 调用
+AI_CALL_LOG_BATCH_SIZE = int(os.getenv('AI_CALL_LOG_BATCH_SIZE', '50'))  # 缓冲达到此条数时提交后台批量写入
+AI_CALL_LOG_FLUSH_SECONDS = int(os.getenv('AI_CALL_LOG_FLUSH_SECONDS', '10'))  # 最长缓冲时间（秒），定时任务按此间隔写入剩余记录
+AI_CALL_LOG_MAX_BUFFER = int(os.getenv('AI_CALL_LOG_MAX_BUFFER', '10000'))  # 缓冲上限，写入跟不上时丢弃新记录
+AI_PRICE_INPUT_PER_MTOK = float(os.getenv('AI_PRICE_INPUT_PER_MTOK', '0'))  # 每百万输入 token 价格（用于统计费用，0 表示不统计）
+AI_PRICE_CACHED_INPUT_PER_MTOK = float(os.getenv('AI_PRICE_CACHED_INPUT_PER_MTOK', '0'))  # 每百万缓存命中输入 token 价格
+AI_PRICE_OUTPUT_PER_MTOK = float(os.getenv('AI_PRICE_OUTPUT_PER_MTOK', '0'))  # 每百万输出 token 价格
+
 # Webhook 配置（Synology Chat 或其他服务）
 WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # 发送消息的 Webhook URL
 WEBHOOK_TOKEN = os.getenv('WEBHOOK_TOKEN', '')  # 验证 token（可选）
 
+# 记忆库容量配置
+MEMORY_MAX_PER_USER = int(os.getenv('MEMORY_MAX_PER_USER', '200'))  # 每个用户最多保留的记忆条数（0 表示不限制）
+MEMORY_EVICTION_POLICY = os.getenv('MEMORY_EVICTION_POLICY', 'weight_strength')  # 淘汰策略：weight_strength / lfu / oldest
+
+# 记忆整合配置（夜间分批将零散记忆整合为一条）
+MEMORY_CONSOLIDATION_MIN_MEMORIES = int(os.getenv('MEMORY_CONSOLIDATION_MIN_MEMORIES', '30'))  # 用户记忆达到此数量才整合
+MEMORY_CONSOLIDATION_BATCH_USERS = int(os.getenv('MEMORY_CONSOLIDATION_BATCH_USERS', '20'))  # 每批处理的用户数
+MEMORY_CONSOLIDATION_MAX_CLUSTERS = int(os.getenv('MEMORY_CONSOLIDATION_MAX_CLUSTERS', '5'))  # 每个用户每批最多整合的簇数
+
+# 对话摘要配置（最近消息窗口之外的历史折叠为滚动摘要）
+CONVERSATION_SUMMARY_EVERY = int(os.getenv('CONVERSATION_SUMMARY_EVERY', '20'))  # 窗口外累计多少条消息折叠一次
+CONVERSATION_SUMMARY_KEEP_RECENT = int(os.getenv('CONVERSATION_SUMMARY_KEEP_RECENT', '10'))  # 不参与折叠的最近消息数
+CONVERSATION_SUMMARY_MAX_BATCH = int(os.getenv('CONVERSATION_SUMMARY_MAX_BATCH', '100'))  # 单次折叠的最大消息数
+
+# 情绪衰减配置（当前情绪随时间向基线情绪回落）
+EMOTION_BASELINE_TYPE = os.getenv('EMOTION_BASELINE_TYPE', 'calm')  # 基线情绪类型
+EMOTION_BASELINE_INTENSITY = int(os.getenv('EMOTION_BASELINE_INTENSITY', '3'))  # 基线情绪强度
+EMOTION_DECAY_HALF_LIFE_HOURS = float(os.getenv('EMOTION_DECAY_HALF_LIFE_HOURS', '6'))  # 偏离基线部分的半衰期（小时）
+EMOTION_DECAY_CHUNK_SIZE = int(os.getenv('EMOTION_DECAY_CHUNK_SIZE', '5000'))  # 每批处理的用户数
+EMOTION_ROLLUP_SAFETY_SECONDS = int(os.getenv('EMOTION_ROLLUP_SAFETY_SECONDS', '300'))  # 情绪汇总只聚合创建超过此秒数的记录（需大于最长的写入事务）
+
+# 消息记录分区与归档配置（仅 PostgreSQL）
+MESSAGE_PARTITION_MONTHS_AHEAD = int(os.getenv('MESSAGE_PARTITION_MONTHS_AHEAD', '3'))  # 提前创建未来几个月的分区
+MESSAGE_ARCHIVE_KEEP_MONTHS = int(os.getenv('MESSAGE_ARCHIVE_KEEP_MONTHS', '6'))  # 归档命令默认保留的月数
+MESSAGE_ARCHIVE_DIR = os.getenv('MESSAGE_ARCHIVE_DIR', str(BASE_DIR / 'archive'))  # 归档文件导出目录
+
+# 定时任务配置
+SCHEDULER_INACTIVE_USER_DAYS = int(os.getenv('SCHEDULER_INACTIVE_USER_DAYS', '0'))  # 超过此天数未发消息的用户不再生成每日计划和自主消息（0 表示不限制）
+SCHEDULER_HEARTBEAT_TIMEOUT = int(os.getenv('SCHEDULER_HEARTBEAT_TIMEOUT', '120'))  # 调度器心跳超过此秒数未更新时 /healthz 视为不健康
+
+# 系统统计配置
+SYSTEM_STATS_REFRESH_MINUTES = int(os.getenv('SYSTEM_STATS_REFRESH_MINUTES', '5'))  # 统计快照刷新间隔（分钟）
+SYSTEM_STATS_ESTIMATE_MIN_ROWS = int(os.getenv('SYSTEM_STATS_ESTIMATE_MIN_ROWS', '100000'))  # 大表行数超过此值时使用 pg_class.reltuples 估算（仅 PostgreSQL）
+
+# 监控指标配置（/metrics，Prometheus 文本格式；多 worker 部署需设置环境变量 PROMETHEUS_MULTIPROC_DIR）
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # 抓取 /metrics 需携带的 Bearer token（为空则不校验）
+METRICS_CACHE_SECONDS = int(os.getenv('METRICS_CACHE_SECONDS', '15'))  # 回复任务队列指标的缓存秒数
+
+# 请求追踪配置（消息从接收到回复发送的各阶段耗时，异步批量写入 trace_span 表）
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'True') == 'True'  # 是否追踪
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '1.0'))  # 采样比例（0~1），按收到的消息采样
+TRACE_BATCH_SIZE = int(os.getenv('TRACE_BATCH_SIZE', '200'))  # 缓冲达到此条数时提交后台批量写入
+TRACE_FLUSH_SECONDS = int(os.getenv('TRACE_FLUSH_SECONDS', '10'))  # 最长缓冲时间（秒），定时任务按此间隔写入剩余 span
+TRACE_MAX_BUFFER = int(os.getenv('TRACE_MAX_BUFFER', '20000'))  # 缓冲上限，写入跟不上时丢弃新 span
+TRACE_RETENTION_DAYS = int(os.getenv('TRACE_RETENTION_DAYS', '7'))  # span 保留天数（0 表示不清理）
+
+# 性能剖析配置（剖析请求和定时任务，结果写入 PROFILING_DIR；也可由管理后台临时开启或用 X-Profile 请求头触发）
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'  # 是否按比例剖析全部请求和任务
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0.1'))  # 剖析比例（0~1）
+PROFILING_MODE = os.getenv('PROFILING_MODE', 'sampling')  # sampling（采样，speedscope JSON）/ cprofile（确定性，pstats）
+PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILING_SAMPLE_INTERVAL_MS', '5'))  # 采样间隔（毫秒）
+PROFILING_MIN_DURATION_MS = float(os.getenv('PROFILING_MIN_DURATION_MS', '0'))  # 只保存耗时超过此值的剖析结果
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / 'logs' / 'profiles'))  # 剖析结果目录
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', '200'))  # 最多保留的剖析文件数（按时间淘汰最旧的）
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')  # X-Profile 请求头等于此值时剖析该请求（为空则只允许已登录的管理员）
+
+# 数据库查询统计（每个请求 / 每次定时任务执行的查询数和耗时写入 /metrics，超出预算时记录警告；预算为 0 表示不限）
+QUERY_STATS_ENABLED = os.getenv('QUERY_STATS_ENABLED', 'True') == 'True'  # 是否统计查询
+QUERY_STATS_TOP_N = int(os.getenv('QUERY_STATS_TOP_N', '5'))  # 超出预算时日志中列出的最慢语句条数
+QUERY_BUDGET_REQUEST_COUNT = int(os.getenv('QUERY_BUDGET_REQUEST_COUNT', '50'))  # 每个请求的查询数预算
+QUERY_BUDGET_REQUEST_MS = float(os.getenv('QUERY_BUDGET_REQUEST_MS', '500'))  # 每个请求的数据库耗时预算（毫秒）
+QUERY_BUDGET_JOB_COUNT = int(os.getenv('QUERY_BUDGET_JOB_COUNT', '1000'))  # 每次定时任务执行的查询数预算
+QUERY_BUDGET_JOB_MS = float(os.getenv('QUERY_BUDGET_JOB_MS', '10000'))  # 每次定时任务执行的数据库耗时预算（毫秒）
+
 # APScheduler 配置
 SCHEDULER_CONFIG = {
     'apscheduler.jobstores.default': {
@@ -3,8 +3,11 @@ URL configuration for RuoChat2 project.
 """
 from django.contrib import admin
 from django.urls import path, include
+from core import views as core_views
 
 urlpatterns = [
+    path('healthz', core_views.healthz, name='healthz'),
+    path('metrics', core_views.metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
     path('api/', include('core.urls')),
 ]
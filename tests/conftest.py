@@ -0,0 +1,15 @@
+"""
+功能测试公共夹具
+
+运行：
+    pip install -r requirements-dev.txt
+    pytest tests
+"""
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _stop_scheduler():
+    """应用启动时会拉起调度器，测试中由用例自行调用被测逻辑"""
+    from core.scheduler import stop_scheduler
+    stop_scheduler()
@@ -0,0 +1,180 @@
+"""
+ChatUser 冗余计数器：每条维护路径（信号、回复任务状态方法、后台编辑/删除、记忆淘汰、init_system、import_user）
+执行后，计数器都应与 reconcile_counters 按实际数据重算的结果一致
+"""
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+
+import pytest
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.management import call_command
+from django.test import RequestFactory, override_settings
+
+from core import clock
+from core.models import ChatUser, MemoryLibrary, MessageRecord, ReplyTask
+
+pytestmark = pytest.mark.django_db
+
+
+def assert_counters_match(*users):
+    drifted = ChatUser.reconcile_counters(ChatUser.objects.filter(pk__in=[u.pk for u in users]), dry_run=True)
+    assert drifted == [], {str(user): changes for user, changes in drifted}
+
+
+@pytest.fixture
+def user():
+    return ChatUser.objects.create(user_id='800000001', username='counter_test', nickname='计数测试')
+
+
+@pytest.fixture
+def other_user():
+    return ChatUser.objects.create(user_id='800000002', username='counter_other', nickname='计数测试2')
+
+
+@pytest.fixture
+def admin_request():
+    request = RequestFactory().post('/admin/')
+    request.user = User(username='admin', is_staff=True, is_superuser=True)
+    request.session = {}
+    request._messages = FallbackStorage(request)
+    return request
+
+
+def add_message(user, message_type='received', minutes_ago=0):
+    return MessageRecord.objects.create(
+        user=user,
+        message_type=message_type,
+        sender='user' if message_type == 'received' else 'ai',
+        receiver='ai' if message_type == 'received' else 'user',
+        content='你好',
+        timestamp=clock.now() - timedelta(minutes=minutes_ago),
+    )
+
+
+def add_memory(user, title='记忆', **fields):
+    return MemoryLibrary.objects.create(user=user, title=title, content='内容', memory_type='user_memory', **fields)
+
+
+def add_task(user, status='pending'):
+    return ReplyTask.objects.create(
+        user=user, trigger_type='user', content='回复', scheduled_time=clock.now(), status=status,
+    )
+
+
+def test_signals(user):
+    add_message(user, 'received', minutes_ago=5)
+    add_message(user, 'sent', minutes_ago=3)
+    # 时间较早的消息不回退最近收发时间
+    add_message(user, 'received', minutes_ago=60)
+    add_memory(user)
+    add_task(user, 'pending')
+    add_task(user, 'completed')
+
+    user.refresh_from_db()
+    assert (user.message_count, user.memory_count, user.pending_reply_count) == (3, 1, 1)
+    assert_counters_match(user)
+
+
+def test_reply_task_status_methods(user):
+    tasks = [add_task(user) for _ in range(4)]
+
+    tasks[0].mark_executing()
+    tasks[0].mark_completed()
+    tasks[1].mark_executing()
+    tasks[1].mark_failed('timeout')
+    tasks[1].mark_pending()
+    assert_counters_match(user)
+
+    ReplyTask.update_status(ReplyTask.objects.filter(id__in=[tasks[2].id, tasks[3].id]), 'cancelled')
+    assert_counters_match(user)
+
+    ReplyTask.update_status(ReplyTask.objects.filter(user=user), 'pending')
+    user.refresh_from_db()
+    assert user.pending_reply_count == 4
+    assert_counters_match(user)
+
+
+def test_admin_edit_reply_task_status(user, admin_request):
+    model_admin = admin.site._registry[ReplyTask]
+    task = add_task(user)
+
+    for previous, status in (('pending', 'completed'), ('completed', 'failed'), ('failed', 'pending')):
+        task.status = status
+        form = SimpleNamespace(changed_data=['status'], initial={'status': previous})
+        model_admin.save_model(admin_request, task, form, change=True)
+        assert_counters_match(user)
+
+
+@pytest.mark.parametrize('model', [MessageRecord, MemoryLibrary, ReplyTask])
+def test_admin_delete(model, user, other_user, admin_request):
+    model_admin = admin.site._registry[model]
+    for owner in (user, other_user):
+        add_message(owner)
+        add_message(owner, 'sent')
+        add_memory(owner)
+        add_memory(owner, '记忆2')
+        add_task(owner)
+        add_task(owner, 'completed')
+
+    model_admin.delete_model(admin_request, model.objects.filter(user=user).first())
+    assert_counters_match(user, other_user)
+
+    model_admin.delete_queryset(admin_request, model.objects.all())
+    assert_counters_match(user, other_user)
+
+
+def test_admin_clear_expired_memories(user, admin_request):
+    model_admin = admin.site._registry[MemoryLibrary]
+    add_memory(user, '已过期', forget_time=clock.now() - timedelta(days=1))
+    add_memory(user, '未过期', forget_time=clock.now() + timedelta(days=1))
+
+    model_admin.clear_expired_memories(admin_request, MemoryLibrary.objects.filter(user=user))
+    assert MemoryLibrary.objects.filter(user=user).count() == 1
+    assert_counters_match(user)
+
+
+@override_settings(MEMORY_MAX_PER_USER=3)
+def test_memory_limit_eviction(user):
+    from core.services import memory_service
+
+    memory_service._memory_service_instance = None
+    try:
+        service = memory_service.get_memory_service()
+        for i in range(5):
+            service.create_memory(user, title=f'记忆{i}', content='内容', memory_type='user_memory')
+    finally:
+        memory_service._memory_service_instance = None
+
+    assert MemoryLibrary.objects.filter(user=user).count() == 3
+    assert_counters_match(user)
+
+
+def test_init_system_examples(user):
+    add_memory(user, '已有记忆')
+
+    call_command('init_system', '--with-examples', f'--user-id={user.user_id}', stdout=StringIO())
+    assert_counters_match(user)
+
+    call_command('init_system', '--with-examples', '--force', f'--user-id={user.user_id}',
+                 stdout=StringIO())
+    assert_counters_match(user)
+
+
+def test_import_user(user, tmp_path):
+    for minutes_ago in (30, 20, 10):
+        add_message(user, 'received', minutes_ago=minutes_ago)
+        add_message(user, 'sent', minutes_ago=minutes_ago - 1)
+    add_memory(user)
+    add_task(user)
+    add_task(user, 'completed')
+
+    archive = tmp_path / 'user.zip'
+    call_command('export_user', user.user_id, f'--output={archive}', stdout=StringIO())
+    call_command('import_user', str(archive), '--user-id=800000099', stdout=StringIO())
+
+    imported = ChatUser.objects.get(user_id='800000099')
+    assert (imported.message_count, imported.memory_count, imported.pending_reply_count) == (6, 1, 1)
+    assert_counters_match(user, imported)
@@ -0,0 +1,111 @@
+"""
+message_record 分区迁移（0009）：在 0008 结构的普通表上写入数据后前滚迁移，
+检查行数、主键序列、索引和外键（仅 PostgreSQL，其他数据库上该迁移直接跳过）
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.utils import timezone
+
+pytestmark = [
+    pytest.mark.django_db(transaction=True),
+    pytest.mark.skipif(connection.vendor != 'postgresql', reason='分区迁移仅在 PostgreSQL 上执行'),
+]
+
+BEFORE = ('core', '0008_emotionrollup')
+PARTITION = ('core', '0009_partition_message_record')
+TABLE = 'message_record'
+
+
+def _migrate(target):
+    MigrationExecutor(connection).migrate([target])
+    return MigrationExecutor(connection).loader.project_state(target).apps
+
+
+def _indexes():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+            [TABLE]
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _foreign_keys():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [TABLE]
+        )
+        return set(cursor.fetchall())
+
+
+@pytest.fixture
+def legacy_apps():
+    """回退到 0008，把 message_record 重建为未分区的普通表；结束后迁移回最新状态"""
+    apps = _migrate(BEFORE)
+    MessageRecord = apps.get_model('core', 'MessageRecord')
+    with connection.schema_editor() as editor:
+        # 测试库建库时已执行过 0009，回退不会还原分区表
+        editor.delete_model(MessageRecord)
+        editor.create_model(MessageRecord)
+    try:
+        yield apps
+    finally:
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+def test_partition_message_record(legacy_apps):
+    ChatUser = legacy_apps.get_model('core', 'ChatUser')
+    MessageRecord = legacy_apps.get_model('core', 'MessageRecord')
+
+    user = ChatUser.objects.create(user_id='900000001', username='partition_test', nickname='分区测试')
+    start = timezone.make_aware(datetime(2024, 11, 15, 12, 0))
+    MessageRecord.objects.bulk_create([
+        MessageRecord(
+            user=user,
+            message_type='received' if i % 2 else 'sent',
+            content=f'消息{i}',
+            sender='partition_test',
+            timestamp=start + timedelta(days=i * 7),
+        )
+        for i in range(20)
+    ])
+    # 删除一部分，使 MAX(id) 与行数不同
+    MessageRecord.objects.filter(content__in=['消息0', '消息19']).delete()
+    expected_ids = set(MessageRecord.objects.values_list('id', flat=True))
+    max_id = max(expected_ids)
+    indexes_before = _indexes() - {f'{TABLE}_pkey'}
+    foreign_keys_before = _foreign_keys()
+    assert indexes_before and foreign_keys_before
+
+    apps = _migrate(PARTITION)
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE])
+        assert cursor.fetchone()
+        cursor.execute("SELECT to_regclass('message_record_legacy')")
+        assert cursor.fetchone()[0] is None
+        # 数据覆盖 2024-11 至 2025-03，每个月一个分区
+        cursor.execute(
+            "SELECT COUNT(*) FROM pg_inherits WHERE inhparent = to_regclass(%s) "
+            "AND inhrelid::regclass::text BETWEEN 'message_record_p2024_11' AND 'message_record_p2025_03'",
+            [TABLE]
+        )
+        assert cursor.fetchone()[0] == 5
+
+    MessageRecord = apps.get_model('core', 'MessageRecord')
+    assert set(MessageRecord.objects.values_list('id', flat=True)) == expected_ids
+
+    # 主键序列从原表的 MAX(id) 之后继续
+    record = MessageRecord.objects.create(
+        user_id=user.id, message_type='received', content='新消息', sender='partition_test', timestamp=timezone.now(),
+    )
+    assert record.id == max_id + 1
+
+    assert _indexes() - {f'{TABLE}_pkey'} == indexes_before
+    assert _foreign_keys() == foreign_keys_before